@@ -0,0 +1,12 @@
+# bench/__init__.py
+"""
+End-to-end benchmark tools: a local wxauto stand-in server and a load generator
+"""
+
+from .fake_wxauto import FakeWXAutoServer
+from .echo_processor import EchoProcessor
+
+__all__ = [
+    'FakeWXAutoServer',
+    'EchoProcessor'
+]
@@ -0,0 +1,87 @@
+# db_bench.py
+"""
+SQLiteDatabase 微基准
+
+对比 query()（COUNT(*) + SELECT + Pydantic）与 exists() / get_one() 的单次调用开销，
+逐条 insert() 与 insert_many() 的写入开销，以及 OFFSET 分页与键值分页的翻页开销。
+
+用法:
+    python -m bench.db_bench --rows 10000 --calls 2000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Callable
+
+from db.base import QueryParams
+
+def measure(func: Callable[[int], object], calls: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    started_at = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - started_at) / calls * 1e6
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SQLiteDatabase 快速查询接口的微基准")
+    parser.add_argument("--rows", type=int, default=10000, help="测试表中的记录数")
+    parser.add_argument("--calls", type=int, default=2000, help="每项测试的调用次数")
+    parser.add_argument("--page-size", type=int, default=50, help="分页测试的每页条数")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="wechat_bot_db_bench_")
+    env_file = os.path.join(work_dir, ".env")
+    with open(env_file, "w", encoding="utf-8") as f:
+        f.write(f"SQLLITE_DB_PATH={os.path.join(work_dir, 'bench.db')}\n")
+
+    from db.sqlite import SQLiteDatabase
+
+    try:
+        db = SQLiteDatabase(env_file)
+        db.create_table("kv", {"id": "TEXT PRIMARY KEY", "value": "TEXT"})
+        db.create_table("kv_single", {"id": "TEXT PRIMARY KEY", "value": "TEXT"})
+
+        rows = [{"id": f"key-{i}", "value": f"value-{i}"} for i in range(args.rows)]
+        writes = min(args.calls, args.rows)
+        results = []
+
+        results.append(("insert() x1", measure(lambda i: db.insert("kv_single", rows[i]), writes)))
+        started_at = time.perf_counter()
+        db.insert_many("kv", rows)
+        results.append(("insert_many() per row", (time.perf_counter() - started_at) / len(rows) * 1e6))
+
+        def key(i):
+            return f"key-{(i * 7919) % args.rows}"
+
+        results.append(("query() lookup", measure(lambda i: db.query("kv", QueryParams(filters={"id": key(i)})), args.calls)))
+        results.append(("get_one() lookup", measure(lambda i: db.get_one("kv", {"id": key(i)}), args.calls)))
+        results.append(("exists() lookup", measure(lambda i: db.exists("kv", {"id": key(i)}), args.calls)))
+
+        pages = max(1, min(args.calls, args.rows // args.page_size))
+
+        def offset_page(i):
+            return db.query("kv", QueryParams(skip=(i % pages) * args.page_size, limit=args.page_size, sort_by="id"))
+
+        state = {"after": None}
+
+        def keyset_page(i):
+            items, state["after"] = db.query_page("kv", after=state["after"], limit=args.page_size)
+            return items
+
+        results.append(("query() OFFSET page", measure(offset_page, pages)))
+        results.append(("query_page() keyset page", measure(keyset_page, pages)))
+        results.append(("iter_rows() full scan / row",
+                        measure(lambda i: sum(1 for _ in db.iter_rows("kv", as_dict=False)), 3) / args.rows))
+
+        print(f"rows={args.rows} calls={args.calls} page_size={args.page_size}")
+        for name, micros in results:
+            print(f"{name:<30}{micros:>12.1f} us")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# echo_processor.py
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EchoProcessor:
+    """
+    压测用的处理器
+
+    不依赖任何外部服务：附件先下载再回复，其余消息直接回复一条文本，
+    用于测量消息管道本身（轮询、分发、下载、发送）的吞吐和延迟。
+    """
+
+    def __init__(self, work_time: float = 0.0):
+        """
+        Args:
+            work_time (float): 每条消息模拟的处理耗时（秒）
+        """
+        self._work_time = work_time
+
+    def description(self) -> str:
+        return "压测回显处理器"
+
+    def priority(self) -> int:
+        return 0
+
+    def _reply(self, chat_name, msg_type, summary, wxauto_client):
+        if self._work_time > 0:
+            time.sleep(self._work_time)
+        result = wxauto_client.send_text_message(who=chat_name, msg=f"echo {msg_type}: {summary}")
+        return result.get("success", False)
+
+    def _reply_attachment(self, msg, wxauto_client):
+        result = wxauto_client.download_bytes(msg.get("file_id"))
+        if not result.get("success"):
+            logger.error(f"下载附件失败: {result.get('error')}")
+            return False
+        return self._reply(msg.get("chat_name"), msg.get("msg_type"), f"{result.get('file_size')} bytes", wxauto_client)
+
+    def process_text(self, msg, wxauto_client):
+        return self._reply(msg.get("chat_name"), "text", msg.get("text_content", "")[:20], wxauto_client)
+
+    def process_voice(self, msg, wxauto_client):
+        return self._reply(msg.get("chat_name"), "voice", msg.get("voice_text", "")[:20], wxauto_client)
+
+    def process_url(self, msg, wxauto_client):
+        return self._reply(msg.get("chat_name"), "link", msg.get("url", ""), wxauto_client)
+
+    def process_image(self, msg, wxauto_client):
+        return self._reply_attachment(msg, wxauto_client)
+
+    def process_file(self, msg, wxauto_client):
+        return self._reply_attachment(msg, wxauto_client)
@@ -0,0 +1,272 @@
+# fake_wxauto.py
+import json
+import time
+import uuid
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from email import message_from_bytes
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 附件的默认大小（字节）
+DEFAULT_ATTACHMENT_SIZE = 64 * 1024
+
+# 各种消息类型默认的文件名
+DEFAULT_FILENAMES = {
+    "image": "bench.png",
+    "file": "bench.pdf",
+}
+
+class FakeWXAutoServer:
+    """
+    本地的 wxauto HTTP API 替身，用于在没有真实微信的情况下压测
+
+    - 实现 getnextnewmessage / send / sendfile / upload / download / delete / isonline
+    - 通过 inject_message 注入任意聊天、任意类型的合成消息，记录注入时间用于计算端到端延迟
+    - latency 为每个接口配置固定的服务耗时，模拟真实 wxauto 的处理速度
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, api_key: str = "bench",
+                 latency: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0 表示随机端口
+            api_key (str): 客户端需要携带的 Bearer token
+            latency (dict): {接口名称: 服务耗时秒数}，接口名称与 WXAuto 的指标名称一致
+        """
+        self.api_key = api_key
+        self.latency = dict(latency or {})
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()  # {chat_name: (chat_type, [raw message, ...])}
+        self._files = {}               # {file_id: (filename, bytes)}
+        self._injected_at = {}         # {message_id: 注入时间}
+        self._sent = []                # [(时间, 接口, who, 内容摘要)]
+        self._counts = {}              # {接口名称: 请求次数}
+        self._ids = itertools.count(1)
+        self._run_id = uuid.uuid4().hex[:8]
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True, name="FakeWXAuto")
+        self._thread.start()
+        logger.info(f"FakeWXAutoServer 已启动: {self.url}")
+
+    def stop(self):
+        """停止服务"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        logger.info("FakeWXAutoServer 已停止")
+
+    def add_file(self, content: bytes, filename: str) -> str:
+        """保存一个文件，返回 file_id"""
+        file_id = f"{self._run_id}-f{next(self._ids)}"
+        with self._lock:
+            self._files[file_id] = (filename, content)
+        return file_id
+
+    def inject_message(self, chat_name: str, msg_type: str, content: Optional[str] = None,
+                       chat_type: str = "friend", attachment: Optional[bytes] = None,
+                       filename: Optional[str] = None) -> str:
+        """
+        注入一条合成消息，下一次 getnextnewmessage 时返回
+
+        Args:
+            chat_name (str): 聊天名称
+            msg_type (str): text / image / file / voice / link
+            content (str): 文本内容、语音识别结果或链接地址
+            chat_type (str): friend 或 group
+            attachment (bytes): 图片和文件的内容，默认 DEFAULT_ATTACHMENT_SIZE 字节的占位数据
+            filename (str): 图片和文件的文件名
+
+        Returns:
+            str: 消息 id
+        """
+        message_id = f"{self._run_id}-m{next(self._ids)}"
+        content = content if content is not None else f"bench {message_id}"
+        msg = {
+            "id": message_id,
+            "type": msg_type,
+            "attr": "friend",
+            "chat_name": chat_name,
+            "chat_type": chat_type,
+            "content": content,
+        }
+
+        if msg_type in ("image", "file"):
+            data = attachment if attachment is not None else b"\0" * DEFAULT_ATTACHMENT_SIZE
+            name = filename or DEFAULT_FILENAMES[msg_type]
+            msg["file_id"] = self.add_file(data, name)
+            msg["file_info"] = {"filename": name, "size": len(data)}
+            msg["download_success"] = True
+        elif msg_type == "voice":
+            msg["voice_to_text"] = content
+            msg["voice_convert_success"] = True
+        elif msg_type == "link":
+            msg["url"] = content
+            msg["get_url_success"] = True
+
+        with self._lock:
+            _, messages = self._pending.setdefault(chat_name, (chat_type, []))
+            messages.append(msg)
+            self._injected_at[message_id] = time.time()
+        return message_id
+
+    def injected_at(self, message_id: str) -> Optional[float]:
+        """获取消息的注入时间"""
+        with self._lock:
+            return self._injected_at.get(message_id)
+
+    def pending(self) -> int:
+        """还没有被取走的消息数"""
+        with self._lock:
+            return sum(len(messages) for _, messages in self._pending.values())
+
+    def sent_messages(self) -> List[tuple]:
+        """获取机器人发出的所有消息 [(时间, 接口, who, 内容摘要)]"""
+        with self._lock:
+            return list(self._sent)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取各接口的请求次数和服务端状态"""
+        with self._lock:
+            return {
+                "requests": dict(self._counts),
+                "pending_messages": sum(len(messages) for _, messages in self._pending.values()),
+                "stored_files": len(self._files),
+                "sent": len(self._sent),
+            }
+
+    def _next_batch(self) -> Dict[str, Any]:
+        """按聊天轮转，每次取出一个聊天的全部待取消息"""
+        with self._lock:
+            while self._pending:
+                chat_name, (chat_type, messages) = self._pending.popitem(last=False)
+                if messages:
+                    return {"chat_name": chat_name, "chat_type": chat_type, "msg": messages}
+        return {}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: Any, content_type: str = "application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _begin(self, endpoint: str) -> bool:
+                """记录请求、校验 token 并模拟服务耗时"""
+                with server._lock:
+                    server._counts[endpoint] = server._counts.get(endpoint, 0) + 1
+                delay = server.latency.get(endpoint, 0)
+                if delay > 0:
+                    time.sleep(delay)
+                if self.headers.get("Authorization") != f"Bearer {server.api_key}":
+                    self._read_body()
+                    self._reply(401, {"success": False, "message": "unauthorized"})
+                    return False
+                return True
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _read_json(self) -> Dict[str, Any]:
+                body = self._read_body()
+                return json.loads(body) if body else {}
+
+            def do_POST(self):
+                if self.path == "/v1/wechat/getnextnewmessage":
+                    if self._begin("getnextnewmessage"):
+                        self._read_json()
+                        self._reply(200, {"success": True, "data": server._next_batch()})
+                elif self.path == "/v1/wechat/send":
+                    if self._begin("send"):
+                        payload = self._read_json()
+                        with server._lock:
+                            server._sent.append((time.time(), "send", payload.get("who"), str(payload.get("msg"))[:50]))
+                        self._reply(200, {"success": True})
+                elif self.path == "/v1/wechat/sendfile":
+                    if self._begin("sendfile"):
+                        payload = self._read_json()
+                        with server._lock:
+                            stored = server._files.get(payload.get("file_id"))
+                            if stored:
+                                server._sent.append((time.time(), "sendfile", payload.get("who"), stored[0]))
+                        if stored:
+                            self._reply(200, {"success": True})
+                        else:
+                            self._reply(200, {"success": False, "message": "file not found"})
+                elif self.path == "/api/v1/files/upload":
+                    if self._begin("upload"):
+                        filename, content = self._parse_upload()
+                        file_id = server.add_file(content, filename)
+                        self._reply(200, {"file_id": file_id, "filename": filename, "size": len(content)})
+                elif self.path == "/v1/wechat/isonline":
+                    if self._begin("isonline"):
+                        self._read_json()
+                        self._reply(200, {"success": True, "data": {"online": True}})
+                else:
+                    self._read_body()
+                    self._reply(404, {"success": False, "message": "not found"})
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 5 and parts[:3] == ["api", "v1", "files"] and parts[4] == "download":
+                    if self._begin("download"):
+                        with server._lock:
+                            stored = server._files.get(parts[3])
+                        if stored:
+                            self._reply(200, stored[1], content_type="application/octet-stream")
+                        else:
+                            self._reply(404, {"detail": "File not found"})
+                else:
+                    self._reply(404, {"success": False, "message": "not found"})
+
+            def do_DELETE(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 4 and parts[:3] == ["api", "v1", "files"]:
+                    if self._begin("delete"):
+                        with server._lock:
+                            stored = server._files.pop(parts[3], None)
+                        if stored:
+                            self._reply(200, {"message": "文件删除成功"})
+                        else:
+                            self._reply(404, {"detail": "File not found"})
+                else:
+                    self._reply(404, {"success": False, "message": "not found"})
+
+            def _parse_upload(self):
+                """解析 multipart/form-data 中的 file 字段"""
+                body = self._read_body()
+                header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+                message = message_from_bytes(header + body, policy=HTTP)
+                for part in message.iter_parts():
+                    if part.get_param("name", header="content-disposition") == "file":
+                        return part.get_filename() or "upload.bin", part.get_payload(decode=True) or b""
+                return "upload.bin", b""
+
+        return Handler
@@ -0,0 +1,274 @@
+# load_generator.py
+"""
+端到端压测
+
+启动 FakeWXAutoServer，把 MainLoopProcessor 指向它，按固定速率注入合成消息，
+统计每个处理器的吞吐以及 p50/p95/p99 端到端延迟（消息注入到处理器处理完成）。
+
+用法:
+    python -m bench.load_generator --rate 20 --duration 30 --chats 4 --mix text=6,image=1,file=1,voice=1,link=1
+    python -m bench.load_generator --processors echo,chat_processor --env .env --latency send=0.05,download=0.02
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+from bench.fake_wxauto import FakeWXAutoServer
+from bench.echo_processor import EchoProcessor
+from metrics import Histogram
+from process_router import BOT_MENTION
+
+logger = logging.getLogger(__name__)
+
+# 压测回显处理器的注册名称，命令行中可以简写为 echo
+ECHO_PROCESSOR = "bench_echo_processor"
+
+# 默认的消息类型比例
+DEFAULT_MIX = "text=6,image=1,file=1,voice=1,link=1"
+
+# 延迟统计保留的样本数
+LATENCY_WINDOW = 100000
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """解析 'name=number,name=number'"""
+    weights = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        name, number = item.split("=", 1)
+        weights[name.strip()] = float(number)
+    return weights
+
+class LatencyRecorder:
+    """
+    ProcessRouter 的回调，按处理器统计端到端延迟
+
+    端到端延迟从消息注入 FakeWXAutoServer 开始，到路由器处理完这条消息为止，
+    包含轮询间隔、排队等待和处理器本身的耗时（含处理器发出的回复）。
+    """
+
+    def __init__(self, server: FakeWXAutoServer):
+        self._server = server
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._stats = {}  # {processor_name: {"count", "end_to_end", "processing"}}
+        self.completed = 0
+        self.last_completed_at = None
+
+    def on_message(self, chat_name: str, msg: Dict[str, Any], processor_name: Optional[str], elapsed: float):
+        injected_at = self._server.injected_at(msg.get("message_id"))
+        if injected_at is None:
+            return
+        now = time.time()
+        name = processor_name or "unhandled"
+        with self._cond:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = {
+                    "count": 0,
+                    "end_to_end": Histogram(window=LATENCY_WINDOW),
+                    "processing": Histogram(window=LATENCY_WINDOW),
+                }
+                self._stats[name] = stats
+            stats["count"] += 1
+            self.completed += 1
+            self.last_completed_at = now
+            self._cond.notify_all()
+        stats["end_to_end"].observe(now - injected_at)
+        stats["processing"].observe(elapsed)
+
+    def wait_for(self, expected: int, timeout: float) -> bool:
+        """等待处理完 expected 条消息"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.completed < expected:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        report = {}
+        for name, item in sorted(stats.items()):
+            end_to_end = item["end_to_end"].snapshot()
+            processing = item["processing"].snapshot()
+            report[name] = {
+                "count": item["count"],
+                "end_to_end": {key: end_to_end[key] for key in ("avg", "p50", "p95", "p99", "max")},
+                "processing": {key: processing[key] for key in ("avg", "p50", "p95", "p99", "max")},
+            }
+        return report
+
+def write_env_file(path: str, base_env: Optional[str], overrides: Dict[str, str]):
+    """以 base_env 为基础生成压测用的环境配置文件，覆盖 wxauto 地址和数据库路径"""
+    lines = []
+    if base_env and os.path.exists(base_env):
+        with open(base_env, "r", encoding="utf-8") as f:
+            for line in f:
+                key = line.split("=", 1)[0].strip()
+                if key not in overrides:
+                    lines.append(line.rstrip("\n"))
+    lines.extend(f"{key}={value}" for key, value in overrides.items())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def build_schedule(count: int, chats: List[str], mix: Dict[str, float], seed: int) -> List[tuple]:
+    """生成 [(chat_name, msg_type), ...]"""
+    rng = random.Random(seed)
+    types = list(mix.keys())
+    weights = [mix[msg_type] for msg_type in types]
+    return [(rng.choice(chats), rng.choices(types, weights)[0]) for _ in range(count)]
+
+def synthetic_content(msg_type: str, index: int, chat_type: str) -> str:
+    if msg_type == "link":
+        return f"https://example.com/bench/{index}"
+    if msg_type == "text" and chat_type == "group":
+        return f"{BOT_MENTION} bench {index}"
+    return f"bench {index}"
+
+def run_benchmark(args) -> Dict[str, Any]:
+    """运行一次压测并返回报告"""
+    mix = parse_weights(args.mix)
+    unknown = set(mix) - {"text", "image", "file", "voice", "link"}
+    if unknown:
+        raise ValueError(f"未知的消息类型: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="wechat_bot_bench_")
+    server = FakeWXAutoServer(latency=parse_weights(args.latency))
+    server.start()
+    env_file = os.path.join(work_dir, ".env")
+    write_env_file(env_file, args.env, {
+        "WXAUTO_API_URL": server.url,
+        "WXAUTO_API_KEY": server.api_key,
+        "SQLLITE_DB_PATH": os.path.join(work_dir, "bench.db"),
+    })
+
+    # 导入 main_loop 会注册所有处理器，依赖完整的运行环境
+    from config import ConfigManager
+    from main_loop import MainLoopProcessor
+
+    ConfigManager(env_file).init_table()
+    processor = MainLoopProcessor(env_file=env_file)
+    processor.process_router.register_processor(ECHO_PROCESSOR, EchoProcessor(args.work_time))
+
+    processor_names = [ECHO_PROCESSOR if name == "echo" else name for name in args.processors.split(",") if name]
+    missing = [name for name in processor_names if name not in processor.process_router.processors]
+    if missing:
+        raise ValueError(f"处理器未注册: {', '.join(missing)}")
+
+    config_manager = ConfigManager(env_file)
+    chats = [f"bench-chat-{i}" for i in range(args.chats)]
+    for chat_name in chats:
+        config_manager.add_chatname(chat_name)
+        config_manager.update_chatname(chat_name, processor_names)
+
+    recorder = LatencyRecorder(server)
+    processor.process_router.add_listener(recorder.on_message)
+
+    loop_thread = threading.Thread(target=processor.main_loop, kwargs={"check_interval": args.poll_interval},
+                                   daemon=True, name="BenchMainLoop")
+    loop_thread.start()
+
+    total = int(args.rate * args.duration)
+    schedule = build_schedule(total, chats, mix, args.seed)
+    started_at = time.time()
+    try:
+        # 开环注入：按计划时间发送，不等待处理结果
+        for index, (chat_name, msg_type) in enumerate(schedule):
+            delay = started_at + index / args.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            server.inject_message(chat_name, msg_type, synthetic_content(msg_type, index, args.chat_type),
+                                  chat_type=args.chat_type, attachment=b"\0" * args.attachment_size)
+        injected_in = time.time() - started_at
+
+        drained = recorder.wait_for(total, args.drain_timeout)
+        if not drained:
+            logger.warning(f"等待超时，只处理完 {recorder.completed}/{total} 条消息")
+    finally:
+        processor.stop()
+        loop_thread.join(timeout=max(args.poll_interval, 1) * 2)
+        bot_metrics = processor.get_metrics()
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = (recorder.last_completed_at or time.time()) - started_at
+    return {
+        "injected": total,
+        "completed": recorder.completed,
+        "inject_seconds": round(injected_in, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "offered_rate": args.rate,
+        "messages_per_second": round(recorder.completed / elapsed, 3) if elapsed > 0 else None,
+        "processors": recorder.snapshot(),
+        "server": server.get_metrics(),
+        "bot": bot_metrics,
+    }
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"注入 {report['injected']} 条，处理完 {report['completed']} 条，"
+        f"用时 {report['elapsed_seconds']}s，吞吐 {report['messages_per_second']} 条/秒"
+        f"（目标 {report['offered_rate']} 条/秒）",
+        "",
+        f"{'processor':<24}{'count':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'proc p50':>10}",
+    ]
+    for name, item in report["processors"].items():
+        end_to_end = item["end_to_end"]
+        lines.append(
+            f"{name:<24}{item['count']:>8}{_ms(end_to_end['p50']):>10}{_ms(end_to_end['p95']):>10}"
+            f"{_ms(end_to_end['p99']):>10}{_ms(end_to_end['max']):>10}{_ms(item['processing']['p50']):>10}"
+        )
+    lines.append("")
+    lines.append(f"wxauto 请求次数: {json.dumps(report['server']['requests'], ensure_ascii=False)}")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="使用本地 wxauto 替身对消息处理管道做端到端压测")
+    parser.add_argument("--rate", type=float, default=10, help="每秒注入的消息数")
+    parser.add_argument("--duration", type=float, default=10, help="注入持续的秒数")
+    parser.add_argument("--chats", type=int, default=4, help="合成聊天的数量")
+    parser.add_argument("--chat-type", choices=["friend", "group"], default="friend", help="合成聊天的类型")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="消息类型比例，如 text=6,image=1,file=1,voice=1,link=1")
+    parser.add_argument("--processors", default="echo",
+                        help="每个合成聊天路由到的处理器，逗号分隔，echo 表示压测回显处理器")
+    parser.add_argument("--latency", default="",
+                        help="wxauto 各接口的服务耗时（秒），如 send=0.05,sendfile=0.2,download=0.02")
+    parser.add_argument("--work-time", type=float, default=0.0, help="回显处理器每条消息模拟的处理耗时（秒）")
+    parser.add_argument("--attachment-size", type=int, default=64 * 1024, help="图片和文件的大小（字节）")
+    parser.add_argument("--poll-interval", type=float, default=3, help="主循环的最大轮询间隔（秒）")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="注入结束后等待处理完成的秒数")
+    parser.add_argument("--env", default=None, help="基础环境配置文件，处理器需要的密钥从这里读取")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出完整报告")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录（数据库和配置文件）")
+    parser.add_argument("--verbose", action="store_true", help="输出机器人的 INFO 日志")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    report = run_benchmark(args)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        print(format_report(report))
+    return 0 if report["completed"] == report["injected"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
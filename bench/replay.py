@@ -0,0 +1,336 @@
+# replay.py
+"""
+离线回放录制的消息流量
+
+读取 TrafficRecorder 的录制目录，按录制时的路由表重建路由，
+把批次依次交给 ProcessRouter 处理。wxauto 客户端替换为 ReplayWXAuto，
+附件从录制文件中读取，发出的消息只记录不发送；其他外部接口
+（DeepSeek、百度 OCR、高德、股票、开门、定位、电视、打印机）替换为固定返回值，
+其余网络请求一律拒绝，时钟和随机数种子固定，保证回放结果可重复。
+
+用法:
+    python -m bench.replay capture_dir                       # 按录制时的速度回放
+    python -m bench.replay capture_dir --speed 0 --save run.json
+    python -m bench.replay capture_dir --speed 0 --baseline run.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import importlib
+import contextlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from bench.load_generator import write_env_file
+from intent_classifier import NO_INTENT
+from traffic_capture import TrafficArchive
+from webapi.wxauto import SendHandle
+
+logger = logging.getLogger(__name__)
+
+# 1x1 透明 PNG，作为地图等图片接口的固定返回值
+PLACEHOLDER_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6300010000000500010d0a2db40000000049454e44ae426082"
+)
+
+# (模块, 类, 方法, 替身)，模块导入失败时（例如 Windows 上没有 cups）跳过
+WEBAPI_STUBS = [
+    ("webapi.deepseek", "DeepSeekAPI", "ask_question", lambda self, prompt, *args, **kwargs: NO_INTENT),
+    ("webapi.baidu_ocr", "BaiduOCR", "recognize_handwriting",
+     lambda self, image_path, **kwargs: self._fake_process_image(image_path, **kwargs)),
+    ("webapi.amap", "AmapAPI", "get_amap_static_image_bytes", lambda self, *args, **kwargs: PLACEHOLDER_PNG),
+    ("webapi.tencent_stock", "TencentStockAPI", "get_stock_price",
+     lambda self, symbol: {"name": "回放", "symbol": symbol, "price": 10.0}),
+    ("webapi.tencent_stock", "TencentStockAPI", "get_stock_code", lambda self, stock_name: "600000"),
+    ("webapi.open_door", "OpenDoorAPI", "open_door", lambda self: (True, "回放模式，未实际开门")),
+    ("device.qb_location", "QBLocation", "get_location", lambda self: []),
+    ("device.mitv", "MiTV", "connect", lambda self: True),
+    ("device.mitv", "MiTV", "get_screen_state", lambda self: "ON"),
+    ("device.mitv", "MiTV", "send_keyevent", lambda self, keycode: True),
+    ("device.print", "Printer", "print_pdf", lambda self, pdf_path, color=True: (True, 1)),
+    ("device.print", "Printer", "get_job_status", lambda self, job_id: {"state_name": "completed"}),
+]
+
+# 回放时的固定时钟和随机数种子，处理器里按当前时间或随机挑选的回复每次回放都一样
+REPLAY_NOW = datetime(2024, 1, 2, 10, 0, 0)
+REPLAY_SEED = 0
+
+# 读取 datetime.now() 的处理器模块，回放时替换模块里的 datetime
+CLOCK_PINNED_MODULES = ["processor.stock_processor"]
+
+class _PinnedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls.fromtimestamp(REPLAY_NOW.timestamp(), tz)
+
+    @classmethod
+    def today(cls):
+        return cls.now()
+
+def _refuse_request(self, method, url, *args, **kwargs):
+    raise requests.exceptions.ConnectionError(f"回放模式禁止访问外部网络: {method} {url}")
+
+@contextlib.contextmanager
+def stub_webapis():
+    """把外部接口替换为固定返回值，固定时钟和随机数种子，并拒绝其余所有 requests 请求"""
+    patched = []
+    random_state = random.getstate()
+    try:
+        random.seed(REPLAY_SEED)
+        for module_name in CLOCK_PINNED_MODULES:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError as e:
+                logger.info(f"跳过 {module_name}: {str(e)}")
+                continue
+            patched.append((module, "datetime", module.datetime))
+            module.datetime = _PinnedDatetime
+        for module_name, class_name, method_name, stub in WEBAPI_STUBS:
+            try:
+                cls = getattr(importlib.import_module(module_name), class_name)
+            except ImportError as e:
+                logger.info(f"跳过 {module_name}.{class_name}: {str(e)}")
+                continue
+            patched.append((cls, method_name, cls.__dict__[method_name]))
+            setattr(cls, method_name, stub)
+        patched.append((requests.Session, "request", requests.Session.__dict__["request"]))
+        requests.Session.request = _refuse_request
+        yield
+    finally:
+        for cls, method_name, original in reversed(patched):
+            setattr(cls, method_name, original)
+        random.setstate(random_state)
+
+class ReplayWXAuto:
+    """
+    回放用的 wxauto 客户端
+
+    附件从录制文件中读取，发送、上传、删除都只在内存中记录，
+    异步发送接口同步执行并返回已完成的 SendHandle。
+    """
+
+    def __init__(self, archive: TrafficArchive):
+        self._archive = archive
+        self._blobs = {}     # {file_id: [偏移, 大小, sha256]}
+        self._uploads = {}   # {file_id: (filename, sha256)}
+        self.sent = []       # [{"chat_name", "kind", "content"}]
+        self._started_at = time.time()
+
+    def load_blobs(self, blobs: Dict[str, list]):
+        self._blobs.update(blobs)
+
+    def _record(self, who, kind, content):
+        self.sent.append({"t": round(time.time() - self._started_at, 3), "chat_name": who,
+                          "kind": kind, "content": content})
+
+    @staticmethod
+    def _read_content(file_path=None, content=None) -> bytes:
+        if content is not None:
+            return content.read() if hasattr(content, "read") else bytes(content)
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def send_text_message(self, who, msg, wxname="", exact=False, clear=True, at=""):
+        self._record(who, "text", msg)
+        return {"success": True, "data": {"success": True}}
+
+    def send_file_message(self, who, file_path=None, wxname="", exact=False, description="", uploader="",
+                          filename=None, content=None):
+        try:
+            content = self._read_content(file_path, content)
+        except OSError as e:
+            return {"success": False, "error": f"File not found: {str(e)}"}
+        name = filename or (os.path.basename(file_path) if file_path is not None else "file")
+        self._record(who, "file", f"{name}:{hashlib.sha256(content).hexdigest()[:16]}")
+        return {"success": True, "data": {"success": True}}
+
+    def _completed(self, result):
+        handle = SendHandle()
+        handle._set_result(result)
+        return handle
+
+    def send_text_message_async(self, who, msg, wxname="", exact=False, clear=True, at="", coalesce=False):
+        return self._completed(self.send_text_message(who, msg, wxname, exact, clear, at))
+
+    def send_file_message_async(self, who, file_path=None, wxname="", exact=False, description="", uploader="",
+                                delete_after=False, filename=None, content=None):
+        result = self.send_file_message(who, file_path, wxname, exact, description, uploader, filename, content)
+        if delete_after and file_path is not None and os.path.exists(file_path):
+            os.remove(file_path)
+        return self._completed(result)
+
+    def upload_file(self, file_path=None, description="", uploader="", filename=None, content=None):
+        content = self._read_content(file_path, content)
+        file_id = f"replay-{len(self._uploads) + 1}"
+        self._uploads[file_id] = (filename, hashlib.sha256(content).hexdigest())
+        return {"success": True, "data": {"file_id": file_id, "filename": filename}}
+
+    def download_bytes(self, file_id, spill_threshold=None, spill_dir=None):
+        blob = self._blobs.get(file_id)
+        if not blob:
+            return {"success": False, "error": f"File not found: {file_id}"}
+        data = self._archive.read_blob(blob[0], blob[1])
+        return {"success": True, "data": data, "file_size": len(data)}
+
+    def download_file(self, file_id, file_path):
+        result = self.download_bytes(file_id)
+        if not result.get("success"):
+            return result
+        with open(file_path, "wb") as f:
+            f.write(result["data"])
+        return {"success": True, "file_path": file_path, "file_size": result["file_size"]}
+
+    def delete_file(self, file_id):
+        return {"success": True, "message": "文件删除成功"}
+
+    def delete_file_async(self, file_id):
+        pass
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"sent": len(self.sent), "uploads": len(self._uploads)}
+
+def replay(archive_dir: str, speed: float = 1.0, env: Optional[str] = None, keep: bool = False) -> Dict[str, Any]:
+    """
+    回放一个录制目录
+
+    Args:
+        archive_dir (str): 录制目录
+        speed (float): 回放速度倍数，1 为录制时的速度，0 为尽可能快
+        env (str): 基础环境配置文件
+        keep (bool): 保留临时目录
+
+    Returns:
+        dict: 回放报告
+    """
+    archive = TrafficArchive(archive_dir)
+    work_dir = tempfile.mkdtemp(prefix="wechat_bot_replay_")
+    env_file = os.path.join(work_dir, ".env")
+    write_env_file(env_file, env, {
+        "SQLLITE_DB_PATH": os.path.join(work_dir, "replay.db"),
+        "WXAUTO_CAPTURE_DIR": "",
+    })
+
+    try:
+        with stub_webapis():
+            # 导入 main_loop 会注册所有处理器，依赖完整的运行环境
+            from config import ConfigManager
+            from main_loop import MainLoopProcessor
+
+            config_manager = ConfigManager(env_file)
+            config_manager.init_table()
+            for chat_name, processors in archive.routing().items():
+                config_manager.add_chatname(chat_name)
+                config_manager.update_chatname(chat_name, processors)
+
+            router = MainLoopProcessor(env_file=env_file).process_router
+            client = ReplayWXAuto(archive)
+
+            batches = 0
+            messages = 0
+            started_at = time.time()
+            for t, batch, blobs in archive.batches():
+                if speed > 0:
+                    delay = started_at + t / speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                client.load_blobs(blobs)
+                router.route_message_batch(batch, client)
+                batches += 1
+                messages += len(batch.get("messages", []))
+            elapsed = time.time() - started_at
+
+            return {
+                "archive": os.path.abspath(archive_dir),
+                "speed": speed,
+                "batches": batches,
+                "messages": messages,
+                "elapsed_seconds": round(elapsed, 3),
+                "messages_per_second": round(messages / elapsed, 3) if elapsed > 0 else None,
+                "processors": router.get_metrics(),
+                "sent": client.sent,
+            }
+    finally:
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """对比两次回放的处理器耗时和发出的消息"""
+    lines = [f"{'processor':<24}{'p50 base':>10}{'p50 now':>10}{'p95 base':>10}{'p95 now':>10}{'change':>9}"]
+    for name in sorted(set(report["processors"]) | set(baseline["processors"])):
+        now = report["processors"].get(name, {}).get("latency", {})
+        base = baseline["processors"].get(name, {}).get("latency", {})
+        change = "-"
+        if now.get("p95") is not None and base.get("p95"):
+            change = f"{(now['p95'] - base['p95']) / base['p95'] * 100:+.0f}%"
+        lines.append(f"{name:<24}{_ms(base.get('p50')):>10}{_ms(now.get('p50')):>10}"
+                     f"{_ms(base.get('p95')):>10}{_ms(now.get('p95')):>10}{change:>9}")
+
+    def outputs(sent):
+        return [(item["chat_name"], item["kind"], item["content"]) for item in sent]
+
+    now_outputs = outputs(report["sent"])
+    base_outputs = outputs(baseline["sent"])
+    if now_outputs == base_outputs:
+        lines.append(f"发出的消息一致，共 {len(now_outputs)} 条")
+    else:
+        diff = next((i for i, pair in enumerate(zip(now_outputs, base_outputs)) if pair[0] != pair[1]),
+                    min(len(now_outputs), len(base_outputs)))
+        lines.append(f"发出的消息不一致：基线 {len(base_outputs)} 条，本次 {len(now_outputs)} 条，第 {diff + 1} 条开始不同")
+    return lines
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"回放 {report['batches']} 个批次 {report['messages']} 条消息，用时 {report['elapsed_seconds']}s，"
+        f"吞吐 {report['messages_per_second']} 条/秒，发出 {len(report['sent'])} 条消息",
+        "",
+        f"{'processor':<24}{'calls':>8}{'handled':>9}{'errors':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}",
+    ]
+    for name, item in sorted(report["processors"].items()):
+        latency = item["latency"]
+        lines.append(f"{name:<24}{item['calls']:>8}{item['handled']:>9}{item['errors']:>8}"
+                     f"{_ms(latency['p50']):>10}{_ms(latency['p95']):>10}{_ms(latency['p99']):>10}")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="离线回放录制的消息流量")
+    parser.add_argument("archive", help="录制目录（WXAUTO_CAPTURE_DIR）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数，0 表示尽可能快")
+    parser.add_argument("--env", default=None, help="基础环境配置文件")
+    parser.add_argument("--save", default=None, help="把回放报告保存为 JSON，作为之后对比的基线")
+    parser.add_argument("--baseline", default=None, help="与之前保存的回放报告对比")
+    parser.add_argument("--keep", action="store_true", help="保留临时目录")
+    parser.add_argument("--verbose", action="store_true", help="输出机器人的 INFO 日志")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    report = replay(args.archive, speed=args.speed, env=args.env, keep=args.keep)
+    print(format_report(report))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        print("\n".join(compare(report, baseline)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,16 +2,38 @@ from db.sqlite import SQLiteDatabase
 from db.base import QueryResult, QueryParams
 import logging
 import json
+import threading
+from datetime import datetime, timedelta
+from types import MappingProxyType
 from env import EnvConfig
-from typing import List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Mapping
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 class ConfigManager:
+    # 进程内共享的路由表缓存 {数据库路径: (版本号, {chat_name: (processor_name, ...)})}，
+    # 版本号和路由表放在同一个元组里一次赋值整体替换，读取时也只读一次，不会读到不配对的版本
+    _routing = {}
+    _routing_lock = threading.Lock()
+
+    # 进程内共享的 kv 表缓存 {数据库路径: {key: value}}，写入时整体替换，读取不加锁
+    _kv_tables = {}
+    _kv_lock = threading.Lock()
+    _kv_subscribers = {}  # {数据库路径: [(key 或 None, callback(key, value))]}
+
+    # 提醒变更的订阅者 [callback(reminder_id, reminder 或 None)]
+    _reminder_subscribers = []
+
     def __init__(self, env_file=".env") -> None:
         self._db = SQLiteDatabase(env_file)
-        logger.info("ConfigManager initialized")
+        logger.debug("ConfigManager initialized")
+
+    def transaction(self):
+        """
+        事务上下文，块内同一线程的所有写操作合并为一次提交
+        """
+        return self._db.transaction()
 
     def init_table(self):
         self._init_kv_table()
@@ -43,6 +65,8 @@ class ConfigManager:
             "timestamp": "TEXT NOT NULL",               # 时间戳
             "name": "TEXT NOT NULL",                 # 日志消息
         })
+        # 同一时间同一个人只记录一次，旧库中的重复记录在建索引前清理掉
+        self._db.create_index("dsm_log", ["timestamp", "name"], unique=True, dedupe=True)
 
     def _init_processsors_table(self):
         self._db.create_table("processors", {
@@ -85,17 +109,9 @@ class ConfigManager:
             "description" : processor_description
         }
 
-        param = QueryParams(
-            filters={"id": processor_name},
-        )
-
-        result = self._db.query("processors", param)
-        if result.total > 0:
-            logger.info(f"处理器 {processor_name} 已经存在, 更新处理器信息")
-            self._db.update("processors", processor_name, current_processor)
-        else:
-            logger.info(f"处理器 {processor_name} 不存在, 插入处理器信息")
-            self._db.insert("processors", current_processor)
+        # 一条 INSERT ... ON CONFLICT DO UPDATE，不再先查询再写入
+        self._db.upsert_many("processors", [current_processor])
+        logger.info(f"处理器 {processor_name} 信息已更新")
 
     def get_all_processors(self):
         query_all_param = QueryParams()
@@ -104,14 +120,42 @@ class ConfigManager:
         return result.items
 
     def find_processor(self, chat_name: str) -> List:
-        processors = []
-        query_param = QueryParams(filters={"chat_name": chat_name})
-        result = self._db.query("chatname_processors", query_param)
-        if result.total > 0:
-            processors_str = result.items[0].get("processors")
-            processors = json.loads(processors_str)
+        _, routing_table = self.get_routing_table()
+        return list(routing_table.get(chat_name, ()))
 
-        return processors
+    def get_routing_table(self) -> Tuple[int, Mapping[str, Tuple[str, ...]]]:
+        """
+        获取内存中的路由表，首次调用时从数据库加载
+
+        Returns:
+            Tuple[int, Mapping]: (版本号, 只读的 {chat_name: 处理器名称元组})
+        """
+        routing = ConfigManager._routing.get(self._db.db_path)
+        if routing is None:
+            return self.reload_routing_table()
+        return routing
+
+    def reload_routing_table(self) -> Tuple[int, Mapping[str, Tuple[str, ...]]]:
+        """
+        从数据库重新加载整个路由表，并原子替换内存中的缓存
+        """
+        with ConfigManager._routing_lock:
+            result = self._db.query("chatname_processors", QueryParams(limit=-1))
+            table = {}
+            for item in result.items:
+                try:
+                    processors = json.loads(item.get("processors") or "[]")
+                except json.JSONDecodeError:
+                    logger.error(f"解析 {item.get('chat_name')} 的处理器列表失败: {item.get('processors')}")
+                    processors = []
+                table[item.get("chat_name")] = tuple(processors)
+
+            previous = ConfigManager._routing.get(self._db.db_path)
+            version = previous[0] + 1 if previous else 1
+            routing = (version, MappingProxyType(table))
+            ConfigManager._routing[self._db.db_path] = routing
+            logger.info(f"路由表已加载，共 {len(table)} 个聊天，版本 {version}")
+            return routing
 
     def get_all_chatname_processors(self):
         query_all_param = QueryParams()
@@ -137,6 +181,7 @@ class ConfigManager:
         else:
             logger.info(f"{chat_name} 已经存在, 更新")
             self._db.update("chatname_processors", chat_name, chatname_processors)
+            self.reload_routing_table()
             return True, "更新成功" 
         
     def add_chatname(self, chat_name: str) -> Tuple[bool, str]:
@@ -146,22 +191,20 @@ class ConfigManager:
             "processors" : "[]"
         }
 
-        param = QueryParams(
-            filters={"chat_name": chat_name},
-        )
-
-        result = self._db.query("chatname_processors", param)
-        if result.total > 0:
+        # 已存在时 DO NOTHING，根据写入的行数判断
+        inserted = self._db.upsert_many("chatname_processors", [chatname_processors], update_fields=[])
+        if inserted == 0:
             logger.info(f"{chat_name} 已经存在, 忽略添加")
             return False, "名称已经存在"
         else:
             logger.info(f"{chat_name} 不存在, 添加")
-            self._db.insert("chatname_processors", chatname_processors)
+            self.reload_routing_table()
             return True, "添加成功"
 
     def del_chatname(self, chat_name: str) -> Tuple[bool, str]:
         result = self._db.delete("chatname_processors", chat_name)
         if (result):
+            self.reload_routing_table()
             logger.info(f"{chat_name} 删除成功")
             return True, "删除成功"
         else:
@@ -172,6 +215,26 @@ class ConfigManager:
         query_all_param = QueryParams()
         result = self._db.query("reminders", query_all_param)
         return result.items
+
+    def get_reminder(self, reminder_id: int):
+        return self._db.get_one("reminders", {"id": reminder_id})
+
+    @classmethod
+    def subscribe_reminders(cls, callback):
+        """
+        订阅提醒的增删改，变更后在写入线程中调用 callback(reminder_id, reminder)，删除时 reminder 为 None
+        """
+        cls._reminder_subscribers.append(callback)
+
+    def _notify_reminder_changed(self, reminder_id: int, deleted: bool = False):
+        if not ConfigManager._reminder_subscribers:
+            return
+        reminder = None if deleted else self.get_reminder(reminder_id)
+        for callback in list(ConfigManager._reminder_subscribers):
+            try:
+                callback(reminder_id, reminder)
+            except Exception as e:
+                logger.error(f"提醒 {reminder_id} 变更通知失败: {str(e)}")
         
     def add_reminder(self, reminder_data: dict) -> Tuple[bool, str]:
         """
@@ -201,8 +264,9 @@ class ConfigManager:
         data.update(reminder_data)
         
         try:
-            self._db.insert("reminders", data)
+            reminder_id = int(self._db.insert("reminders", data))
             logger.info(f"提醒 '{reminder_data['title']}' 添加成功")
+            self._notify_reminder_changed(reminder_id)
             return True, "添加成功"
         except Exception as e:
             logger.error(f"添加提醒失败: {str(e)}")
@@ -250,6 +314,7 @@ class ConfigManager:
         try:
             self._db.update("reminders", reminder_id, update_data)
             logger.info(f"提醒ID {reminder_id} 更新成功")
+            self._notify_reminder_changed(reminder_id)
             return True, "更新成功"
         except Exception as e:
             logger.error(f"更新提醒失败: {str(e)}")
@@ -258,6 +323,7 @@ class ConfigManager:
         result = self._db.delete("reminders", reminder_id)
         if (result):
             logger.info(f"{reminder_id} 删除成功")
+            self._notify_reminder_changed(reminder_id, deleted=True)
             return True, "删除成功"
         else:
             logger.info(f"{reminder_id} 删除失败")
@@ -280,23 +346,49 @@ class ConfigManager:
             logger.error(f"添加DSM日志记录失败: {str(e)}")
             return False, f"添加失败: {str(e)}"
 
+    def add_dsm_logs_if_new(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        在一个事务中写入DSM日志记录，已经存在的记录被唯一索引忽略
+
+        Args:
+            records: [{"timestamp": ..., "name": ...}, ...]
+
+        Returns:
+            List[Dict]: 新写入的记录，按传入顺序
+        """
+        rows = [{"timestamp": record.get("timestamp"), "name": record.get("name")} for record in records]
+        try:
+            inserted = self._db.insert_if_new("dsm_log", rows)
+            if inserted:
+                logger.info(f"DSM日志记录添加成功: {len(inserted)} 条")
+            return inserted
+        except Exception as e:
+            logger.error(f"添加DSM日志记录失败: {str(e)}")
+            return []
+
+    def prune_dsm_logs(self, keep_days: int = 30) -> int:
+        """
+        删除 keep_days 天以前的DSM日志记录
+
+        Returns:
+            int: 删除的条数
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        try:
+            deleted = self._db.delete_before("dsm_log", "timestamp", cutoff)
+            if deleted:
+                logger.info(f"清理了 {deleted} 条 {cutoff} 以前的DSM日志记录")
+            return deleted
+        except Exception as e:
+            logger.error(f"清理DSM日志记录失败: {str(e)}")
+            return 0
+
     def get_dsm_log(self, timestamp: str, name: str) -> bool:
         """
         判断DSM日志记录是否存在
         """
-        param = QueryParams(
-            filters={
-                "timestamp": timestamp,
-                "name": name
-            }
-        )
-
         try:
-            result = self._db.query("dsm_log",param)
-            if result.total > 0:
-                return True
-            else:
-                return False
+            return self._db.exists("dsm_log", {"timestamp": timestamp, "name": name})
         except Exception as e:
             logger.error(f"获取DSM日志记录失败: {str(e)}")
             return False
@@ -313,24 +405,72 @@ class ConfigManager:
             logger.error(f"删除DSM日志记录失败: {str(e)}")
             return False, f"删除失败: {str(e)}"
 
-    def get_value(self, key: str) -> str:
+    def get_value(self, key: str, default: str = "") -> str:
         """
-        获取配置项的值
+        获取配置项的值，从内存缓存读取，首次调用时加载整个 kv 表
         """
-        param = QueryParams(
-            filters={"id": key},
-        )
-        result = self._db.query("kv", param)
-        if result.total == 0:
-            return ""
-        else:
-            return result.items[0]["value"]
-        
+        kv_table = ConfigManager._kv_tables.get(self._db.db_path)
+        if kv_table is None:
+            kv_table = self.reload_kv_table()
+        value = kv_table.get(key)
+        return default if value is None else value
+
+    def reload_kv_table(self) -> Mapping[str, str]:
+        """
+        从数据库重新加载整个 kv 表，并原子替换内存中的缓存
+        """
+        with ConfigManager._kv_lock:
+            kv_table = MappingProxyType(self._load_kv_rows())
+            ConfigManager._kv_tables[self._db.db_path] = kv_table
+            logger.info(f"kv 表已加载，共 {len(kv_table)} 项")
+            return kv_table
+
+    def _load_kv_rows(self) -> Dict[str, str]:
+        return {row[0]: row[1] for row in self._db.iter_rows("kv", columns=["id", "value"], as_dict=False)}
+
     def put_value(self, key: str, value: str):
         """
-        设置配置项的值
+        设置配置项的值，先写数据库（不存在时插入），成功后更新缓存并通知订阅者
         """
-        self._db.update("kv", key, {"value": value})
+        value = str(value)
+        with ConfigManager._kv_lock:
+            self._db.upsert_many("kv", [{"id": key, "value": value}])
+            kv_table = ConfigManager._kv_tables.get(self._db.db_path)
+            if kv_table is None:
+                table = self._load_kv_rows()
+                changed = True
+            else:
+                table = dict(kv_table)
+                changed = table.get(key) != value
+                table[key] = value
+            ConfigManager._kv_tables[self._db.db_path] = MappingProxyType(table)
+            subscribers = list(ConfigManager._kv_subscribers.get(self._db.db_path, ())) if changed else []
+
+        for subscribed_key, callback in subscribers:
+            if subscribed_key is None or subscribed_key == key:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    logger.error(f"配置项 {key} 变更通知失败: {str(e)}")
+
+    def subscribe_value(self, callback: Callable[[str, str], None], key: Optional[str] = None):
+        """
+        订阅配置项的变更，值发生变化时在写入线程中调用 callback(key, value)
+
+        Args:
+            callback: 回调函数
+            key: 只订阅这个配置项，为 None 时订阅所有配置项
+        """
+        with ConfigManager._kv_lock:
+            ConfigManager._kv_subscribers.setdefault(self._db.db_path, []).append((key, callback))
+
+    def unsubscribe_value(self, callback: Callable[[str, str], None]):
+        """
+        取消 callback 的所有订阅
+        """
+        with ConfigManager._kv_lock:
+            subscribers = ConfigManager._kv_subscribers.get(self._db.db_path, [])
+            ConfigManager._kv_subscribers[self._db.db_path] = [item for item in subscribers if item[1] != callback]
 
     def del_qbexam(self, paperId: str) -> Tuple[bool, str]:
         result = self._db.delete("qb_exam", paperId)
@@ -345,17 +485,15 @@ class ConfigManager:
         """
         获取配置项的值
         """
-        param = QueryParams(
-            filters={"id": paperId},
-        )
-        result = self._db.query("qb_exam", param)
-        if result.total == 0:
+        row = self._db.get_one("qb_exam", {"id": paperId})
+        if row is None:
             return None
         else:
-            return result.items
+            return [row]
         
-    def put_qbexam(self, exam_report) -> Tuple[bool, str]:
-        data = {
+    @staticmethod
+    def _qbexam_row(exam_report) -> Dict[str, Any]:
+        return {
             "id" : str(exam_report["paperId"]),
             'examId' : str(exam_report['examId']),
             "paperName" : str(exam_report['paperName']),
@@ -364,18 +502,16 @@ class ConfigManager:
             "standardScore" : float(exam_report['standardScore']),
         }
 
-        param = QueryParams(
-            filters={"id": str(exam_report["paperId"])},
-        )
-
-        result = self._db.query("qb_exam", param)
-        if result.total > 0:
-            logger.info(f"考试 {exam_report["paperId"]} 已经存在, 更新")
-            self._db.update("qb_exam", str(exam_report["paperId"]), data)
-        else:
-            logger.info(f"考试 {exam_report["paperId"]} 不存在, 新增")
-            self._db.insert("qb_exam", data)
+    def put_qbexam(self, exam_report) -> Tuple[bool, str]:
+        return self.put_qbexams([exam_report])
 
+    def put_qbexams(self, exam_reports) -> Tuple[bool, str]:
+        """
+        在一个事务中新增或更新多门考试成绩
+        """
+        rows = [self._qbexam_row(report) for report in exam_reports]
+        self._db.upsert_many("qb_exam", rows)
+        logger.info(f"考试成绩已保存: {', '.join(row['id'] for row in rows)}")
         return True, "操作成功"
 
 
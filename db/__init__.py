@@ -3,11 +3,12 @@
 Processor package for handling different types of messages
 """
 
-from .sqlite import SQLiteDatabase
+from .sqlite import SQLiteDatabase, MessageInbox
 from .base import BaseDatabase, QueryResult, QueryParams, BaseDBModel
 
 __all__ = [
     'SQLiteDatabase',
+    'MessageInbox',
     'BaseDatabase',
     'QueryResult',
     'QueryParams',
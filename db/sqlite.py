@@ -1,55 +1,193 @@
 import os
 import sqlite3
+import threading
 import json
+import time
+import uuid
 import logging
+import contextlib
 from env import EnvConfig
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Type, TypeVar, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Type, TypeVar, Tuple, Union
 from db.base import BaseDBModel, BaseDatabase, QueryParams, QueryResult
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseDBModel)
 
+class ConnectionPool:
+    """进程内共享的SQLite连接池
+
+    每个数据库文件一个连接池，每个线程一个连接，连接只在创建它的线程中使用，
+    不需要再用锁把所有语句串行起来。连接创建时统一设置：
+    - journal_mode=WAL：读写互不阻塞
+    - synchronous=NORMAL：WAL 模式下每次提交不再 fsync
+    - busy_timeout：写锁被占用时等待而不是立刻报 database is locked
+    - mmap_size：读取走内存映射
+    """
+
+    _pools = {}  # {db_path: ConnectionPool}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000, mmap_size: int = 64 * 1024 * 1024) -> None:
+        self.db_path = db_path
+        self._busy_timeout_ms = busy_timeout_ms
+        self._mmap_size = mmap_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []  # [(thread, connection)]
+        self._opened = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        logger.info(f"数据库文件路径: {db_path}")
+
+    @classmethod
+    def get(cls, db_path: str) -> "ConnectionPool":
+        """获取某个数据库文件的共享连接池"""
+        db_path = os.path.abspath(db_path)
+        pool = cls._pools.get(db_path)
+        if pool is None:
+            with cls._pools_lock:
+                pool = cls._pools.get(db_path)
+                if pool is None:
+                    pool = cls(db_path)
+                    cls._pools[db_path] = pool
+        return pool
+
+    def connection(self) -> sqlite3.Connection:
+        """获取当前线程的连接，第一次调用时创建"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def _open(self) -> sqlite3.Connection:
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=self._busy_timeout_ms / 1000, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self._busy_timeout_ms)}")
+            conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+        except sqlite3.Error as e:
+            raise Exception(f"无法连接到数据库: {str(e)}")
+
+        with self._lock:
+            # 顺便关闭已经退出的线程留下的连接
+            alive = []
+            for thread, old_conn in self._connections:
+                if thread.is_alive():
+                    alive.append((thread, old_conn))
+                else:
+                    old_conn.close()
+            alive.append((threading.current_thread(), conn))
+            self._connections = alive
+            self._opened += 1
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        在当前线程的连接上开启事务，可以嵌套，最外层退出时提交，出错时回滚
+
+        事务期间同一线程上所有 SQLiteDatabase 句柄的写操作都不会单独提交
+        """
+        conn = self.connection()
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        else:
+            self._local.depth = depth
+            if depth == 0:
+                conn.commit()
+
+    def in_transaction(self) -> bool:
+        """当前线程是否在 transaction() 中"""
+        return getattr(self._local, "depth", 0) > 0
+
+    def release(self) -> None:
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections = [(thread, c) for thread, c in self._connections if c is not conn]
+        conn.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "open_connections": len(self._connections),
+                "opened": self._opened,
+            }
+
 class SQLiteDatabase(BaseDatabase):
-    """SQLite数据库实现"""
+    """SQLite数据库实现
+
+    只是连接池上的一个轻量句柄，可以随意创建，每个线程使用自己的连接。
+    """
     
     def __init__(self, env_file=".env") -> None:
         """初始化SQLite数据库连接"""
         self._config = EnvConfig(env_file)
         # 获取数据库文件的绝对路径
         db_path = self._config.get_db_config().get("path")
-        logger.info(f"数据库文件路径: {db_path}")
         self.db_path = os.path.abspath(db_path)
-        # 确保数据库目录存在
         self.db_dir = os.path.dirname(self.db_path)
-        if not os.path.exists(self.db_dir):
-            os.makedirs(self.db_dir)
         # 调用父类初始化
         super().__init__(self.db_path)
     
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        return self._pool.connection()
+
     def connect(self) -> None:
-        """建立数据库连接"""
-        try:
-            # 确保数据库文件存在
-            if not os.path.exists(self.db_path):
-                # 确保目录存在
-                if not os.path.exists(self.db_dir):
-                    os.makedirs(self.db_dir)
-                # 创建一个空的数据库文件
-                with open(self.db_path, 'w') as f:
-                    pass
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.row_factory = sqlite3.Row
-        except sqlite3.Error as e:
-            raise Exception(f"无法连接到数据库: {str(e)}")
-        except Exception as e:
-            raise Exception(f"创建数据库文件失败: {str(e)}")
+        """获取共享的连接池"""
+        self._pool = ConnectionPool.get(self.db_path)
     
     def disconnect(self) -> None:
-        """关闭数据库连接"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """关闭当前线程的连接"""
+        self._pool.release()
+
+    def transaction(self):
+        """
+        事务上下文，块内的所有写操作只在退出时提交一次
+
+        用法:
+            with db.transaction():
+                db.insert(...)
+                db.upsert_many(...)
+        """
+        return self._pool.transaction()
+
+    def _commit(self) -> None:
+        """不在 transaction() 中时立即提交"""
+        if not self._pool.in_transaction():
+            self.conn.commit()
+
+    @staticmethod
+    def _where(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """把 {字段: 值} 转换为 WHERE 子句和参数"""
+        if not filters:
+            return "", []
+        return " WHERE " + " AND ".join(f"{field}=?" for field in filters), list(filters.values())
     
     def create_table(self, table_name: str, fields: Dict[str, str]) -> None:
         """创建表
@@ -62,10 +200,37 @@ class SQLiteDatabase(BaseDatabase):
             fields_str = ', '.join([f"{k} {v}" for k, v in fields.items()])
             sql = f"CREATE TABLE IF NOT EXISTS {table_name} ({fields_str})"
             self.conn.execute(sql)
-            self.conn.commit()
+            self._commit()
         except sqlite3.Error as e:
             raise Exception(f"创建表失败: {str(e)}")
     
+    def create_index(self, table_name: str, columns: Sequence[str], unique: bool = False,
+                     dedupe: bool = False) -> None:
+        """创建索引
+
+        Args:
+            table_name: 表名
+            columns: 索引字段
+            unique: 是否唯一索引
+            dedupe: 创建唯一索引前先删除重复的记录，只保留 rowid 最小的一条
+        """
+        index_name = f"idx_{table_name}_{'_'.join(columns)}"
+        columns_str = ', '.join(columns)
+        try:
+            with self.transaction():
+                if unique and dedupe:
+                    deleted = self.conn.execute(
+                        f"DELETE FROM {table_name} WHERE rowid NOT IN "
+                        f"(SELECT MIN(rowid) FROM {table_name} GROUP BY {columns_str})"
+                    ).rowcount
+                    if deleted:
+                        logger.info(f"{table_name} 删除了 {deleted} 条重复记录")
+                self.conn.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns_str})"
+                )
+        except sqlite3.Error as e:
+            raise Exception(f"创建索引失败: {str(e)}")
+
     def insert(self, table_name: str, data: Dict[str, Any]) -> str:
         """插入数据
         
@@ -81,7 +246,7 @@ class SQLiteDatabase(BaseDatabase):
             placeholders = ','.join(['?' for _ in fields])
             sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
             cursor = self.conn.execute(sql, [data[field] for field in fields])
-            self.conn.commit()
+            self._commit()
             return str(cursor.lastrowid)
         except sqlite3.Error as e:
             raise Exception(f"插入数据失败: {str(e)}")
@@ -102,7 +267,7 @@ class SQLiteDatabase(BaseDatabase):
             set_clause = ','.join([f"{field}=?" for field in fields])
             sql = f"UPDATE {table_name} SET {set_clause} WHERE id=?"
             cursor = self.conn.execute(sql, [data[field] for field in fields] + [id])
-            self.conn.commit()
+            self._commit()
             return cursor.rowcount > 0
         except sqlite3.Error as e:
             raise Exception(f"更新数据失败: {str(e)}")
@@ -120,11 +285,37 @@ class SQLiteDatabase(BaseDatabase):
         try:
             sql = f"DELETE FROM {table_name} WHERE id=?"
             cursor = self.conn.execute(sql, [id])
-            self.conn.commit()
+            self._commit()
             return cursor.rowcount > 0
         except sqlite3.Error as e:
             raise Exception(f"删除数据失败: {str(e)}")
     
+    def delete_all(self, table_name: str) -> int:
+        """删除表中的所有数据
+
+        Returns:
+            int: 删除的条数
+        """
+        try:
+            cursor = self.conn.execute(f"DELETE FROM {table_name}")
+            self._commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"删除数据失败: {str(e)}")
+
+    def delete_before(self, table_name: str, column: str, cutoff: Any) -> int:
+        """删除 column < cutoff 的数据
+
+        Returns:
+            int: 删除的条数
+        """
+        try:
+            cursor = self.conn.execute(f"DELETE FROM {table_name} WHERE {column} < ?", [cutoff])
+            self._commit()
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"删除数据失败: {str(e)}")
+    
     def get_by_id(self, table_name: str, id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取数据
         
@@ -143,6 +334,152 @@ class SQLiteDatabase(BaseDatabase):
         except sqlite3.Error as e:
             raise Exception(f"获取数据失败: {str(e)}")
     
+    def exists(self, table_name: str, filters: Optional[Dict[str, Any]] = None) -> bool:
+        """判断是否存在符合条件的记录，只执行一条 SELECT 1 ... LIMIT 1"""
+        where_clause, values = self._where(filters)
+        try:
+            sql = f"SELECT 1 FROM {table_name}{where_clause} LIMIT 1"
+            return self.conn.execute(sql, values).fetchone() is not None
+        except sqlite3.Error as e:
+            raise Exception(f"查询数据失败: {str(e)}")
+
+    def get_one(self, table_name: str, filters: Optional[Dict[str, Any]] = None,
+                columns: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """获取第一条符合条件的记录，不统计总数，不存在时返回None"""
+        where_clause, values = self._where(filters)
+        columns_str = ", ".join(columns) if columns else "*"
+        try:
+            sql = f"SELECT {columns_str} FROM {table_name}{where_clause} LIMIT 1"
+            row = self.conn.execute(sql, values).fetchone()
+            return dict(row) if row else None
+        except sqlite3.Error as e:
+            raise Exception(f"查询数据失败: {str(e)}")
+
+    def iter_rows(self, table_name: str, filters: Optional[Dict[str, Any]] = None,
+                  columns: Optional[Sequence[str]] = None, order_by: Optional[str] = None,
+                  as_dict: bool = True, batch_size: int = 500) -> Iterator[Union[Dict[str, Any], tuple]]:
+        """逐批读取符合条件的记录，不统计总数，不一次性加载全部结果
+
+        Args:
+            order_by: 排序子句，如 "id DESC"
+            as_dict: True 返回字典，False 返回元组
+            batch_size: 每次从游标取出的行数
+        """
+        where_clause, values = self._where(filters)
+        columns_str = ", ".join(columns) if columns else "*"
+        order_clause = f" ORDER BY {order_by}" if order_by else ""
+        try:
+            cursor = self.conn.execute(f"SELECT {columns_str} FROM {table_name}{where_clause}{order_clause}", values)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row) if as_dict else tuple(row)
+        except sqlite3.Error as e:
+            raise Exception(f"查询数据失败: {str(e)}")
+
+    def query_page(self, table_name: str, key: str = "id", after: Any = None, limit: int = 100,
+                   filters: Optional[Dict[str, Any]] = None, descending: bool = False) -> Tuple[List[Dict[str, Any]], Any]:
+        """按键值分页（keyset pagination），翻页开销与页码无关
+
+        Args:
+            key: 排序和分页使用的唯一字段，需要有索引
+            after: 上一页返回的最后一个键值，None 表示第一页
+            limit: 每页条数
+            descending: 是否倒序
+
+        Returns:
+            Tuple[List[Dict], Any]: (本页记录, 下一页的 after，没有更多时为None)
+        """
+        where_clause, values = self._where(filters)
+        if after is not None:
+            where_clause += (" AND " if where_clause else " WHERE ") + f"{key} {'<' if descending else '>'} ?"
+            values.append(after)
+        order_clause = f" ORDER BY {key} {'DESC' if descending else 'ASC'}"
+        try:
+            sql = f"SELECT * FROM {table_name}{where_clause}{order_clause} LIMIT ?"
+            items = [dict(row) for row in self.conn.execute(sql, values + [limit + 1]).fetchall()]
+        except sqlite3.Error as e:
+            raise Exception(f"查询数据失败: {str(e)}")
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1][key]
+        return items, None
+
+    def insert_many(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> int:
+        """在一个事务中批量插入，所有记录的字段与第一条相同
+
+        Returns:
+            int: 插入的条数
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        fields = list(rows[0].keys())
+        placeholders = ','.join(['?' for _ in fields])
+        sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
+        try:
+            with self.transaction():
+                cursor = self.conn.executemany(sql, [[row[field] for field in fields] for row in rows])
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"插入数据失败: {str(e)}")
+
+    def insert_if_new(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在一个事务中逐条 INSERT OR IGNORE，与唯一索引冲突的记录被忽略
+
+        Returns:
+            List[Dict]: 实际插入的记录
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        fields = list(rows[0].keys())
+        placeholders = ','.join(['?' for _ in fields])
+        sql = f"INSERT OR IGNORE INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
+        inserted = []
+        try:
+            with self.transaction():
+                for row in rows:
+                    if self.conn.execute(sql, [row[field] for field in fields]).rowcount > 0:
+                        inserted.append(row)
+            return inserted
+        except sqlite3.Error as e:
+            raise Exception(f"插入数据失败: {str(e)}")
+
+    def upsert_many(self, table_name: str, rows: Iterable[Dict[str, Any]], conflict: Sequence[str] = ("id",),
+                    update_fields: Optional[Sequence[str]] = None) -> int:
+        """在一个事务中批量插入或更新（INSERT ... ON CONFLICT DO UPDATE）
+
+        Args:
+            conflict: 冲突判断使用的字段，需要有主键或唯一索引
+            update_fields: 冲突时更新的字段，默认除冲突字段外的全部字段；
+                传空列表时冲突的记录保持不变（DO NOTHING）
+
+        Returns:
+            int: 插入或更新的条数
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        fields = list(rows[0].keys())
+        if update_fields is None:
+            update_fields = [field for field in fields if field not in conflict]
+        placeholders = ','.join(['?' for _ in fields])
+        if update_fields:
+            action = "DO UPDATE SET " + ','.join(f"{field}=excluded.{field}" for field in update_fields)
+        else:
+            action = "DO NOTHING"
+        sql = (f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders}) "
+               f"ON CONFLICT({','.join(conflict)}) {action}")
+        try:
+            with self.transaction():
+                cursor = self.conn.executemany(sql, [[row[field] for field in fields] for row in rows])
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"写入数据失败: {str(e)}")
+    
     def query(self, table_name: str, params: QueryParams) -> QueryResult:
         """查询数据，并返回符合 Pydantic 模型的结构化数据
 
@@ -193,6 +530,193 @@ class SQLiteDatabase(BaseDatabase):
         except sqlite3.Error as e:
             raise Exception(f"查询数据失败: {str(e)}")
 
+class MessageInbox:
+    """基于SQLite的持久化消息收件箱
+
+    消息在路由之前先在一个事务里写入 inbox 表，处理完成后标记为已完成，
+    进程重启时重放所有未完成的消息，从而保证至少处理一次。
+    message_id 上有唯一索引，重复的消息在写入时直接被忽略。
+    """
+
+    STATUS_PENDING = 0
+    STATUS_DONE = 1
+
+    def __init__(self, env_file=".env", retention_seconds: int = 7 * 86400,
+                 max_done_rows: int = 5000, prune_every: int = 500) -> None:
+        """
+        Args:
+            env_file: 环境配置文件路径
+            retention_seconds: 已完成消息的保留时间（秒）
+            max_done_rows: 最多保留的已完成消息条数
+            prune_every: 每写入多少条消息执行一次清理
+        """
+        self._config = EnvConfig(env_file)
+        self.db_path = os.path.abspath(self._config.get_db_config().get("path"))
+        self._retention_seconds = retention_seconds
+        self._max_done_rows = max_done_rows
+        self._prune_every = prune_every
+        self._appended_since_prune = 0
+        # 连接来自连接池，每个线程一个；这里的锁只保护清理计数
+        self._lock = threading.Lock()
+        self.connect()
+        self._init_table()
+        self.prune()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """当前线程的连接"""
+        return self._pool.connection()
+
+    def connect(self) -> None:
+        """获取共享的连接池（WAL模式）"""
+        self._pool = ConnectionPool.get(self.db_path)
+
+    def disconnect(self) -> None:
+        """关闭当前线程的连接"""
+        self._pool.release()
+
+    def _init_table(self) -> None:
+        try:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS inbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL,
+                    chat_name TEXT NOT NULL,
+                    chat_type TEXT,
+                    payload TEXT NOT NULL,
+                    status INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    done_at REAL
+                )
+            """)
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inbox_message_id ON inbox (message_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_inbox_status_seq ON inbox (status, seq)")
+            if not self._pool.in_transaction():
+                self.conn.commit()
+        except sqlite3.Error as e:
+            raise Exception(f"创建收件箱表失败: {str(e)}")
+
+    @staticmethod
+    def message_key(msg: Dict[str, Any]) -> str:
+        """获取消息在收件箱中的唯一键，没有 id 的消息生成一个随机键"""
+        msg_id = msg.get("id")
+        if msg_id is None:
+            msg_id = msg.setdefault("_inbox_key", f"noid-{uuid.uuid4()}")
+        return str(msg_id)
+
+    def append_batch(self, message_batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """在一个事务中写入消息批次
+
+        Args:
+            message_batch: 与 WXAuto.get_next_new_message 返回值结构相同的批次
+
+        Returns:
+            List[Dict[str, Any]]: 新写入的消息（已存在的重复消息被忽略）
+        """
+        chat_name = message_batch.get("chat_name")
+        chat_type = message_batch.get("chat_type")
+        now = time.time()
+        new_messages = []
+        try:
+            with self._pool.transaction() as conn:
+                for msg in message_batch.get("messages", []):
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO inbox (message_id, chat_name, chat_type, payload, status, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [self.message_key(msg), chat_name, chat_type,
+                         json.dumps(msg, ensure_ascii=False), self.STATUS_PENDING, now]
+                    )
+                    if cursor.rowcount > 0:
+                        new_messages.append(msg)
+        except sqlite3.Error as e:
+            raise Exception(f"写入收件箱失败: {str(e)}")
+
+        with self._lock:
+            self._appended_since_prune += len(new_messages)
+            need_prune = self._appended_since_prune >= self._prune_every
+            if need_prune:
+                # 在锁内清零，多个写入线程同时达到阈值时只清理一次
+                self._appended_since_prune = 0
+        if need_prune:
+            self.prune()
+        return new_messages
+
+    def mark_done(self, message_keys: List[str]) -> None:
+        """将消息标记为已处理"""
+        if not message_keys:
+            return
+        try:
+            with self._pool.transaction() as conn:
+                conn.executemany(
+                    "UPDATE inbox SET status=?, done_at=? WHERE message_id=?",
+                    [(self.STATUS_DONE, time.time(), key) for key in message_keys]
+                )
+        except sqlite3.Error as e:
+            raise Exception(f"更新收件箱失败: {str(e)}")
+
+    def discard(self, message_keys: List[str]) -> None:
+        """删除尚未处理的消息（入队失败时使用，以便来源重试）"""
+        if not message_keys:
+            return
+        try:
+            with self._pool.transaction() as conn:
+                conn.executemany(
+                    "DELETE FROM inbox WHERE message_id=? AND status=?",
+                    [(key, self.STATUS_PENDING) for key in message_keys]
+                )
+        except sqlite3.Error as e:
+            raise Exception(f"删除收件箱消息失败: {str(e)}")
+
+    def pending_batches(self) -> List[Dict[str, Any]]:
+        """获取所有未处理的消息，按写入顺序将同一聊天的相邻消息合并为批次"""
+        try:
+            rows = self.conn.execute(
+                "SELECT chat_name, chat_type, payload FROM inbox WHERE status=? ORDER BY seq",
+                [self.STATUS_PENDING]
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise Exception(f"读取收件箱失败: {str(e)}")
+
+        batches = []
+        for row in rows:
+            if not batches or batches[-1]["chat_name"] != row["chat_name"]:
+                batches.append({
+                    "success": True,
+                    "has_message": True,
+                    "chat_name": row["chat_name"],
+                    "chat_type": row["chat_type"],
+                    "messages": [],
+                })
+            batches[-1]["messages"].append(json.loads(row["payload"]))
+        return batches
+
+    def prune(self) -> int:
+        """清理过期的已完成消息，使收件箱保持较小的规模
+
+        Returns:
+            int: 删除的条数
+        """
+        with self._lock:
+            self._appended_since_prune = 0
+        try:
+            with self._pool.transaction() as conn:
+                cutoff = time.time() - self._retention_seconds
+                deleted = conn.execute(
+                    "DELETE FROM inbox WHERE status=? AND done_at < ?",
+                    [self.STATUS_DONE, cutoff]
+                ).rowcount
+                deleted += conn.execute(
+                    "DELETE FROM inbox WHERE status=? AND seq NOT IN "
+                    "(SELECT seq FROM inbox WHERE status=? ORDER BY seq DESC LIMIT ?)",
+                    [self.STATUS_DONE, self.STATUS_DONE, self._max_done_rows]
+                ).rowcount
+        except sqlite3.Error as e:
+            raise Exception(f"清理收件箱失败: {str(e)}")
+
+        if deleted:
+            logger.info(f"收件箱清理了 {deleted} 条已完成消息")
+        return deleted
+
 def get_all_processors(db_path: str = "database.db"):
     """获取所有处理器，用于下拉菜单"""
     
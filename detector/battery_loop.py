@@ -1,4 +1,3 @@
-import time
 import json
 import logging
 import threading
@@ -6,6 +5,7 @@ from datetime import datetime, time as dt_time
 from typing import List, Dict, Any
 from config import ConfigManager
 from device.qb_location import QBLocation
+from scheduler import IntervalSchedule, DailySchedule
 
 router_data = [
     {
@@ -21,40 +21,19 @@ class BatteryLoop:
         self._env_file = env_file
         self._running = False
         self.wxauto_client = wxauto_client
-        self._last_process_time = None
-        self._interval = 86400  # 默认每天检查一次（24小时）
+        self._interval = None  # 为 None 时每天在 _check_time 检查一次
         self._check_time = dt_time(20, 30)  # 每天20:30检查
         self._last_notified_devices = {}  # 记录上次通知的设备电量状态
         self._low_battery_threshold = 30  # 低电量阈值30%
     
+    def schedule(self):
+        if self._interval:
+            return IntervalSchedule(self._interval)
+        return DailySchedule(self._check_time.hour, self._check_time.minute)
+
     def process_loop(self, config_manager):
         """处理电量检测"""
-        current_time = time.time()
-        
-        # 检查是否到了每天的检查时间
         now = datetime.now()
-        should_check = False
-        
-        if self._last_process_time is None:
-            if now.time() >= self._check_time:
-                should_check = True  # 今天已过20:30，立即检查
-        else:
-            time_since_last = current_time - self._last_process_time
-            # 如果距离上次检查超过24小时，或者现在是20:30之后且今天还没检查过
-            if time_since_last >= self._interval:
-                should_check = True
-            elif now.time() >= self._check_time:
-                # 检查今天是否已经检查过
-                last_check_date = datetime.fromtimestamp(self._last_process_time).date()
-                if last_check_date < now.date():
-                    should_check = True
-        
-        if not should_check:
-            return
-        
-        # 更新上次执行时间
-        self._last_process_time = current_time
-
         logger.info(f"开始处理battery_loop任务，检查时间: {now.strftime('%Y-%m-%d %H:%M:%S')}")
 
         try:
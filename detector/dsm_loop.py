@@ -8,6 +8,7 @@ from config import ConfigManager
 from zhdate import ZhDate
 from webapi.dsmxp import DSMSmartDoorAPI
 from webapi.audio_player import AudioPlayer
+from scheduler import IntervalSchedule
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -40,11 +41,16 @@ class DsmLoop:
         self._running = False
         self.wxauto_client = wxauto_client
         self._dsmxp = DSMSmartDoorAPI(env_file)
-        self._last_process_time = time.time()
         self._interval = 180
         self._default_interval = 180
         self._restore_timer = None
+        self._last_prune_time = 0
+        self._prune_interval = 86400
+        self._retention_days = 30
     
+    def schedule(self):
+        return IntervalSchedule(self._interval)
+
     def set_interval(self, interval: int):
         old_interval = self._interval
         logger.info(f"间隔从 {old_interval}秒 临时调整为 {interval}秒，10分钟后恢复")
@@ -66,41 +72,39 @@ class DsmLoop:
     def process_loop(self, config_manager):
         """处理所有提醒"""
         current_time = time.time()
-        time_since_last = current_time - self._last_process_time
-        if time_since_last < self._interval:
-            return
-        
-        # 更新上次执行时间
-        self._last_process_time = current_time
-
         logger.info("开始处理dsm_loop 任务")
 
+        # 每天清理一次过期的开门记录；保留时间要远大于接口返回的范围（当天），否则旧记录会被当成新记录
+        if current_time - self._last_prune_time >= self._prune_interval:
+            self._last_prune_time = current_time
+            config_manager.prune_dsm_logs(self._retention_days)
+
         try:
             send_msg = False
             loglist = self._dsmxp.get_log()
-            
-            for log in loglist:
+
+            # 一个事务 INSERT OR IGNORE，唯一索引过滤掉已经记录过的，只通知新记录
+            new_logs = config_manager.add_dsm_logs_if_new(loglist)
+
+            for log in new_logs:
                 name = log.get("name")
                 timestamp = log.get("timestamp")
-                if not config_manager.get_dsm_log(timestamp, name):
-                    logger.info(f"发现新开门记录: {timestamp}")
-                    config_manager.add_dsm_log(timestamp, name)
-
-                    for route in router_data:
-                        if route["name"] == "*" or route["name"] == name:
-                            for detector in route["detectors"]:
-                                if detector["type"] == "notify":
-                                    msg = f"🎉🎉🎉 {name} 于 {timestamp.split(' ')[1]} 到家啦"
-                                    self.wxauto_client.send_text_message(detector["chatname"], msg)
-                                    if detector.get("text"):
-                                        AudioPlayer().speak(detector["text"])
-                                    send_msg = True
-                                    break
-                                elif detector["type"] == "audio_play":
+                logger.info(f"发现新开门记录: {timestamp}")
+                for route in router_data:
+                    if route["name"] == "*" or route["name"] == name:
+                        for detector in route["detectors"]:
+                            if detector["type"] == "notify":
+                                msg = f"🎉🎉🎉 {name} 于 {timestamp.split(' ')[1]} 到家啦"
+                                self.wxauto_client.send_text_message(detector["chatname"], msg)
+                                if detector.get("text"):
                                     AudioPlayer().speak(detector["text"])
-                                    send_msg = True
-                                    break
-                    
+                                send_msg = True
+                                break
+                            elif detector["type"] == "audio_play":
+                                AudioPlayer().speak(detector["text"])
+                                send_msg = True
+                                break
+                
             if send_msg and self._interval != self._default_interval:
                 self._interval = self._default_interval
                 logger.info(f"恢复 dsm_loop 检测间隔为默认值 {self._default_interval} 秒")
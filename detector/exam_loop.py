@@ -1,4 +1,3 @@
-import time
 import json
 import logging
 import threading
@@ -6,6 +5,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 from config import ConfigManager
 from webapi.zhixue import ZhixueAPI
+from scheduler import IntervalSchedule
 
 router_data = [
     {
@@ -24,20 +24,18 @@ class ExamLoop:
         self._env_file = env_file
         self._running = False
         self.wxauto_client = wxauto_client
-        self._last_process_time = time.time()
         self._interval = 300
         self._restore_timer = None
+
+    def schedule(self):
+        return IntervalSchedule(self._interval)
+
+    def timeout(self) -> float:
+        # 登录加上每场考试一次成绩查询，比其他检测器慢得多
+        return 180
     
     def process_loop(self, config_manager):
         """处理所有提醒"""
-        current_time = time.time()
-        time_since_last = current_time - self._last_process_time
-        if time_since_last < self._interval:
-            return
-        
-        # 更新上次执行时间
-        self._last_process_time = current_time
-
         logger.info("开始处理exam_loop 任务")
 
         try:
@@ -51,22 +49,26 @@ class ExamLoop:
                 logger.info(f"正在获取考试: {exam_name}")
                 report_data = zhixue.get_exam_report(exam_id)
 
+                # 先找出所有未记录的成绩，在一个事务中写入，再逐条通知
+                new_reports = []
                 for report in report_data:
-                    record = config_manager.get_qbexam(report.get("paperId"))
-                    notify = False
-                    if not record:
+                    if not config_manager.get_qbexam(report.get("paperId")):
                         logger.info(f"发现未记录的考试: {report.get("paperName")}")
-                        config_manager.put_qbexam(report)
-                        notify = True
+                        new_reports.append(report)
+                notify = bool(new_reports)
+                if new_reports:
+                    config_manager.put_qbexams(new_reports)
 
-                        for route in router_data:
-                            chatname = route.get("chatname")
-                            if chatname:
-                                msg = f"🎉🎉🎉 乔宝 {report.get("paperName")} 成绩出来啦，分数{report.get("userScore")}"
-                                if self.wxauto_client:
-                                    self.wxauto_client.send_text_message(chatname, msg)
-                                else:
-                                    logger.info(msg)
+                for report in new_reports:
+                    for route in router_data:
+                        chatname = route.get("chatname")
+                        if chatname:
+                            msg = f"🎉🎉🎉 乔宝 {report.get("paperName")} 成绩出来啦，分数{report.get("userScore")}"
+                            if self.wxauto_client:
+                                # 同一次检查出的多门成绩合并成一条消息发送
+                                self.wxauto_client.send_text_message_async(chatname, msg, coalesce=True)
+                            else:
+                                logger.info(msg)
 
                 if notify:
                     total_score = 0
@@ -81,7 +83,7 @@ class ExamLoop:
                         chatname = route.get("chatname")
                         if chatname:
                             if self.wxauto_client:
-                                self.wxauto_client.send_text_message(chatname, msg)
+                                self.wxauto_client.send_text_message_async(chatname, msg)
                             else:
                                 logger.info(msg)
                        
@@ -1,97 +1,185 @@
 import time
 import json
+import heapq
 import logging
-from datetime import datetime
-from typing import List, Dict, Any
+import threading
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional
 from config import ConfigManager
 from zhdate import ZhDate
+from scheduler import AtSchedule
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 计算下次提醒时间时最多向后查找的天数；农历三十不是每年都有，要覆盖几年
+MAX_LOOKAHEAD_DAYS = 366 * 4
+
+# 错过的提醒（例如进程卡住或机器休眠）在这段时间（秒）内补发，更早的直接跳过
+CATCH_UP_WINDOW = 3600
+
+@lru_cache(maxsize=4096)
+def _lunar_date(day: date) -> Optional[tuple]:
+    """公历日期对应的农历 (年, 月, 日, 是否闰月)，超出 zhdate 支持的范围时返回 None"""
+    try:
+        lunar = ZhDate.from_datetime(datetime(day.year, day.month, day.day))
+        return lunar.lunar_year, lunar.lunar_month, lunar.lunar_day, lunar.leap_month
+    except Exception as e:
+        logger.error(f"获取农历日期失败 {day}: {e}")
+        return None
+
+def _day_matches(reminder: Dict[str, Any], day: date) -> bool:
+    """提醒的年月日是否匹配这一天，年、月、日为 None 表示每年、每月、每天"""
+    if reminder.get('calendar_type', 'solar') == 'lunar':
+        lunar = _lunar_date(day)
+        if lunar is None:
+            return False
+        year, month, day_of_month, leap_month = lunar
+        # 指定了月份的农历提醒只在正常月份提醒，闰月不重复提醒
+        if leap_month and reminder.get('month') is not None:
+            return False
+    else:
+        year, month, day_of_month = day.year, day.month, day.day
+
+    return ((reminder.get('year') is None or reminder['year'] == year)
+            and (reminder.get('month') is None or reminder['month'] == month)
+            and (reminder.get('day') is None or reminder['day'] == day_of_month))
+
+def next_fire_time(reminder: Dict[str, Any], after: datetime) -> Optional[datetime]:
+    """
+    计算提醒在 after 之后的下一次提醒时间
+
+    Returns:
+        datetime: 下一次提醒时间，提醒未启用或以后不会再提醒时返回 None
+    """
+    if not reminder.get('enabled', True):
+        return None
+    hour = reminder.get('hour', 0)
+    minute = reminder.get('minute', 0)
+    day = after.date()
+    for _ in range(MAX_LOOKAHEAD_DAYS):
+        fire_at = datetime(day.year, day.month, day.day, hour, minute)
+        if fire_at > after and _day_matches(reminder, day):
+            return fire_at
+        day += timedelta(days=1)
+    return None
+
 class ReminderLoop:
+    """
+    提醒检测器
+
+    每个提醒的下次提醒时间（公历或农历）预先算好放进最小堆，调度器睡到最早的那个时间点再运行，
+    不再每分钟加载全部提醒逐条匹配。提醒被增删改时 ConfigManager 通知这里只更新对应的条目。
+    """
+
     def __init__(self, wxauto_client, env_file: str = ".env"):
         self._env_file = env_file
         self._running = False
         self.wxauto_client = wxauto_client
-        self._last_process_time = time.time()
-        self._interval = 60
+        self._lock = threading.Lock()
+        self._heap = []        # [(下次提醒时间戳, 提醒ID)]
+        self._entries = {}     # {提醒ID: (下次提醒时间戳, 提醒)}
+        self._loaded = False
+        self._reschedule = None
+        ConfigManager.subscribe_reminders(self._on_reminder_changed)
+
+    def bind_reschedule(self, reschedule):
+        """下次提醒时间变化时调用 reschedule() 让调度器重新计算"""
+        self._reschedule = reschedule
+
+    def schedule(self):
+        self._ensure_loaded()
+        if not self._loaded:
+            # 加载失败，一分钟后重试
+            return AtSchedule(None, idle=60)
+        with self._lock:
+            next_fire = self._heap[0][0] if self._heap else None
+        return AtSchedule(next_fire)
 
     def set_interval(self, interval: int):
         return
-    def _get_current_lunar_date(self) -> tuple:
-        """获取当前农历日期"""
-        try:
-            current_time = datetime.now()
-            lunar_date = ZhDate.from_datetime(current_time)
-            return lunar_date.lunar_year, lunar_date.lunar_month, lunar_date.lunar_day
-        except Exception as e:
-            logger.error(f"获取农历日期失败: {e}")
-            # 失败时返回公历日期作为fallback
-            current_time = datetime.now()
-            return current_time.year, current_time.month, current_time.day
-    
-    def _get_current_solar_date(self) -> tuple:
-        """获取当前公历日期"""
-        current_time = datetime.now()
-        return current_time.year, current_time.month, current_time.day
-    
-    def _should_trigger_reminder(self, reminder: Dict[str, Any]) -> bool:
-        """检查提醒是否应该触发"""
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
         try:
-            # 检查是否启用
-            if not reminder.get('enabled', True):
-                return False
-            
-            current_time = datetime.now()
-            current_hour = current_time.hour
-            current_minute = current_time.minute
-            
-            # 检查时间是否匹配
-            if current_hour != reminder.get('hour', 0) or current_minute != reminder.get('minute', 0):
-                return False
-            
-            # 获取日历信息
-            calendar_type = reminder.get('calendar_type', 'solar')
-            reminder_month = reminder.get('month')
-            reminder_day = reminder.get('day')
-            
-            # 根据日历类型获取当前日期
-            if calendar_type == 'solar':
-                current_year, current_month, current_day = self._get_current_solar_date()
-                calendar_name = "公历"
-            else:  # lunar
-                current_year, current_month, current_day = self._get_current_lunar_date()
-                calendar_name = "农历"
-            
-            logger.debug(f"{calendar_name}日期: {current_year}年{current_month}月{current_day}日")
-            
-            # 检查日期匹配
-            # 如果月份为 None，表示每月都提醒
-            if reminder_month is not None and current_month != reminder_month:
-                logger.debug(f"月份不匹配: 当前{current_month}月, 需要{reminder_month}月")
-                return False
-            
-            # 如果日期为 None，表示每天都提醒
-            if reminder_day is not None and current_day != reminder_day:
-                logger.debug(f"日期不匹配: 当前{current_day}日, 需要{reminder_day}日")
-                return False
-            
-            logger.info(f"提醒匹配: {reminder.get('title')} - {calendar_name}{current_month}月{current_day}日 {current_hour:02d}:{current_minute:02d}")
-            return True
-            
+            reminders = ConfigManager(self._env_file).get_all_reminders()
         except Exception as e:
-            logger.error(f"检查提醒时出错: {e}")
-            return False
-    
-    def _send_reminder(self, reminder: Dict[str, Any]):
+            logger.error(f"加载提醒失败: {e}")
+            return
+        now = datetime.now()
+        with self._lock:
+            self._heap = []
+            self._entries = {}
+            for reminder in reminders:
+                self._index(reminder, now)
+            self._loaded = True
+        logger.info(f"提醒索引已建立，共 {len(self._entries)} 个待提醒")
+
+    def _index(self, reminder: Dict[str, Any], after: datetime):
+        """计算提醒的下次提醒时间并放入堆中，调用方持有 self._lock"""
+        reminder_id = reminder.get('id')
+        self._entries.pop(reminder_id, None)
+        fire_at = next_fire_time(reminder, after)
+        if fire_at is None:
+            return
+        timestamp = fire_at.timestamp()
+        self._entries[reminder_id] = (timestamp, reminder)
+        heapq.heappush(self._heap, (timestamp, reminder_id))
+
+    def _on_reminder_changed(self, reminder_id, reminder: Optional[Dict[str, Any]]):
+        """ConfigManager 的回调，reminder 为 None 表示已删除"""
+        if not self._loaded:
+            return
+        with self._lock:
+            if reminder is None:
+                # 堆中残留的条目在弹出时丢弃
+                self._entries.pop(reminder_id, None)
+            else:
+                self._index(reminder, datetime.now())
+                logger.info(f"提醒索引已更新: {self._format_reminder_info(reminder)}")
+        if self._reschedule:
+            self._reschedule()
+
+    def _pop_due(self, now: float) -> Optional[tuple]:
+        """弹出一个已到期的提醒，返回 (提醒时间戳, 提醒)"""
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                timestamp, reminder_id = heapq.heappop(self._heap)
+                entry = self._entries.get(reminder_id)
+                # 已删除或已重新计算过的提醒
+                if entry is None or entry[0] != timestamp:
+                    continue
+                reminder = entry[1]
+                # 堆中的是停顿前最早错过的一次，补发窗口内最近的一次；窗口内没有时返回原时间，由调用方跳过
+                latest = self._latest_missed(reminder, now)
+                if latest is not None:
+                    timestamp = latest.timestamp()
+                # 从现在开始算下一次
+                self._index(reminder, datetime.fromtimestamp(now))
+                return timestamp, reminder
+            return None
+
+    @staticmethod
+    def _latest_missed(reminder: Dict[str, Any], now: float) -> Optional[datetime]:
+        """补发窗口 (now - CATCH_UP_WINDOW, now] 内最近的一次提醒时间，没有时返回 None"""
+        current = datetime.fromtimestamp(now)
+        latest = None
+        fire_at = next_fire_time(reminder, datetime.fromtimestamp(now - CATCH_UP_WINDOW))
+        while fire_at is not None and fire_at <= current:
+            latest = fire_at
+            fire_at = next_fire_time(reminder, fire_at)
+        return latest
+
+    def _send_reminder(self, reminder: Dict[str, Any], fire_at: datetime):
         """发送提醒"""
         try:
             title = reminder.get('title', '提醒')
             description = reminder.get('description', '')
             chatnames_str = reminder.get('chatnames', '[]')
             calendar_type = reminder.get('calendar_type', 'solar')
-            
+
             # 解析联系人列表
             chatnames = []
             if chatnames_str:
@@ -100,34 +188,33 @@ class ReminderLoop:
                 except json.JSONDecodeError:
                     logger.error(f"解析联系人列表失败: {chatnames_str}")
                     return
-            
+
             # 构建提醒消息
             calendar_text = "农历" if calendar_type == 'lunar' else "公历"
-            current_time = datetime.now().strftime("%H:%M")
-            
+            current_time = fire_at.strftime("%H:%M")
+
             message = f"🔔 {title}\n"
             message += f"⏰ 时间: {calendar_text} {current_time}\n"
-            
+
             if description:
                 message += f"📝 {description}\n"
-            
+
             # 添加日期信息
-            if calendar_type == 'solar':
-                year, month, day = self._get_current_solar_date()
-                message += f"📅 公历: {month}月{day}日"
+            lunar = _lunar_date(fire_at.date()) if calendar_type == 'lunar' else None
+            if lunar is None:
+                message += f"📅 公历: {fire_at.month}月{fire_at.day}日"
             else:
-                year, month, day = self._get_current_lunar_date()
-                message += f"📅 农历: {month}月{day}日"
-            
+                message += f"📅 农历: {lunar[1]}月{lunar[2]}日"
+
             logger.info(f"发送提醒: {message}")
             logger.info(f"发送给: {chatnames}")
-            
+
             for chatname in chatnames:
                 self.wxauto_client.send_text_message(who=chatname, msg=message)
-                
+
         except Exception as e:
             logger.error(f"发送提醒时出错: {e}")
-    
+
     def _format_reminder_info(self, reminder: Dict[str, Any]) -> str:
         """格式化提醒信息用于日志"""
         title = reminder.get('title', '未知')
@@ -135,35 +222,36 @@ class ReminderLoop:
         month = "每月" if reminder.get('month') is None else f"{reminder['month']}月"
         day = "每天" if reminder.get('day') is None else f"{reminder['day']}日"
         time_str = f"{reminder.get('hour', 0):02d}:{reminder.get('minute', 0):02d}"
-        
-        return f"{title} ({calendar_type} {month}{day} {time_str})"
-    
-    def process_loop(self, config_manager):
-        current_time = time.time()
-        time_since_last = current_time - self._last_process_time
-        if time_since_last < self._interval:
-            return
-        
-        # 更新上次执行时间
-        self._last_process_time = current_time
 
-        logger.info("开始处理reminder_loop 任务")
+        return f"{title} ({calendar_type} {month}{day} {time_str})"
 
-        """处理所有提醒"""
+    def process_loop(self, config_manager):
+        """发送所有已到期的提醒"""
+        self._ensure_loaded()
         try:
-            reminders = config_manager.get_all_reminders()
-            
             triggered_count = 0
-            for reminder in reminders:
+            while True:
+                now = time.time()
+                due = self._pop_due(now)
+                if due is None:
+                    break
+                timestamp, reminder = due
+                fire_at = datetime.fromtimestamp(timestamp)
                 reminder_info = self._format_reminder_info(reminder)
-                if self._should_trigger_reminder(reminder):
-                    logger.info(f"触发提醒: {reminder_info}")
-                    self._send_reminder(reminder)
-                    triggered_count += 1
-            
+                late = now - timestamp
+                if late > CATCH_UP_WINDOW:
+                    logger.warning(f"提醒已错过 {late / 60:.0f} 分钟，跳过: {reminder_info}")
+                    continue
+                logger.info(f"触发提醒: {reminder_info}")
+                self._send_reminder(reminder, fire_at)
+                triggered_count += 1
+
             if triggered_count > 0:
                 logger.info(f"本次检查触发了 {triggered_count} 个提醒")
-                    
+
         except Exception as e:
             logger.error(f"处理提醒时出错: {e}")
-    
\ No newline at end of file
+        finally:
+            # 堆顶变了，让调度器按新的最早时间睡眠
+            if self._reschedule:
+                self._reschedule()
@@ -1,9 +1,13 @@
 import time
 import json
 import logging
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from config import ConfigManager
+from metrics import Histogram
+from scheduler import Scheduler, IntervalSchedule, AtSchedule
 from detector.reminder_loop import ReminderLoop
 from detector.dsm_loop import DsmLoop
 from detector.exam_loop import ExamLoop
@@ -12,10 +16,27 @@ from detector.battery_loop import BatteryLoop
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 没有声明 schedule() 的检测器的默认运行间隔（秒）
+DEFAULT_INTERVAL = 60
+
+# 没有声明 timeout() 的检测器的默认超时（秒）
+DEFAULT_TIMEOUT = 60
+
 class DetectorLoop:
-    def __init__(self, wxauto_client, env_file: str = ".env"):
+    def __init__(self, wxauto_client, env_file: str = ".env", max_workers: Optional[int] = None):
+        """
+        Args:
+            wxauto_client: wxauto客户端实例
+            env_file (str): 环境配置文件
+            max_workers (int): 执行检测器的线程数，默认每个检测器一个，慢的检测器不会占用其他检测器的线程
+        """
         self._env_file = env_file
         self._running = False
+        self._scheduler = Scheduler()
+        self._max_workers = max_workers
+        self._executor = None
+        self._state_lock = threading.Lock()
+        self._states = {}  # {name: 运行状态和统计}
         self.processors = {}
         self.wxauto_client = wxauto_client
         self._init_processors(self._env_file)
@@ -37,43 +58,176 @@ class DetectorLoop:
         """设置处理器的运行间隔"""
         if name in self.processors:
             self.processors[name].set_interval(interval)
+            # 唤醒调度线程，按新的间隔重新计算下次运行时间
+            self._scheduler.reschedule(name)
             logger.info(f"设置处理器 {name} 的运行间隔为 {interval} 秒")
 
+    def run_now(self, name: str):
+        """让处理器尽快运行一次"""
+        self._scheduler.run_now(name)
+
     def register_processor(self, name: str, processor_instance):
-        """注册处理器"""
+        """注册处理器，按处理器的 schedule() 加入调度器"""
         self.processors[name] = processor_instance
+        if not hasattr(processor_instance, "process_loop"):
+            return
+
+        if hasattr(processor_instance, "schedule"):
+            schedule = processor_instance.schedule
+        else:
+            schedule = IntervalSchedule(DEFAULT_INTERVAL)
+        timeout = processor_instance.timeout() if hasattr(processor_instance, "timeout") else DEFAULT_TIMEOUT
+        # 按数据计算运行时间的检测器，数据变化时通过它让调度器重新计算
+        if hasattr(processor_instance, "bind_reschedule"):
+            processor_instance.bind_reschedule(lambda: self._scheduler.reschedule(name))
+
+        with self._state_lock:
+            self._states[name] = {
+                "timeout": timeout,
+                "running_since": None,
+                "timed_out": False,
+                "deferred": False,
+                "runs": 0,
+                "errors": 0,
+                "skipped": 0,
+                "timeouts": 0,
+                "last_duration": None,
+                "last_success": None,
+                "duration": Histogram(),
+            }
+        self._scheduler.add(name, lambda: self._dispatch(name, processor_instance),
+                            lambda: self._current_schedule(name, schedule))
+
+    def _current_schedule(self, name: str, schedule):
+        """
+        检测器当前的计划
+
+        AtSchedule 按检测器的数据计算时间，运行期间到期的数据还没处理完，按它算出的时间会在
+        min_gap 后再次触发并被跳过。所以运行期间先不计算，运行结束后在 _on_done 中重新计算。
+        """
+        plan = schedule() if callable(schedule) else schedule
+        if isinstance(plan, AtSchedule):
+            with self._state_lock:
+                state = self._states[name]
+                if state["running_since"] is not None:
+                    state["deferred"] = True
+                    return AtSchedule(None, idle=state["timeout"])
+        return plan
+
+    def _dispatch(self, name: str, processor):
+        """
+        在调度线程中调用，把检测器交给线程池执行后立即返回
+
+        同一个检测器上一次还没运行完时跳过这一次，保证不会同时运行两份。
+        """
+        with self._state_lock:
+            state = self._states[name]
+            if state["running_since"] is not None:
+                state["skipped"] += 1
+                logger.warning(f"检测器 {name} 上一次运行还没有结束（已运行 "
+                               f"{time.time() - state['running_since']:.0f}秒），跳过本次运行")
+                return
+            state["running_since"] = time.time()
+            state["timed_out"] = False
+
+        watchdog = threading.Timer(state["timeout"], self._on_timeout, args=(name,))
+        watchdog.daemon = True
+        try:
+            future = self._executor.submit(self._run_processor, processor)
+        except RuntimeError as e:
+            # 线程池已经关闭
+            with self._state_lock:
+                state["running_since"] = None
+            logger.error(f"检测器 {name} 提交失败: {e}")
+            return
+        watchdog.start()
+        future.add_done_callback(lambda f: self._on_done(name, f, watchdog))
+
+    def _run_processor(self, processor):
+        # ConfigManager 共享进程内的连接池，每次运行新建一个，不在线程间长期持有
+        processor.process_loop(ConfigManager(self._env_file))
+
+    def _on_timeout(self, name: str):
+        """
+        检测器运行超时
+
+        线程无法被强制结束，只记录超时；运行结束前不会再次启动同一个检测器，
+        而每个检测器最多占用一个线程，其他检测器不受影响。
+        """
+        with self._state_lock:
+            state = self._states[name]
+            if state["running_since"] is None:
+                return
+            state["timed_out"] = True
+            state["timeouts"] += 1
+        logger.error(f"检测器 {name} 运行超过 {state['timeout']}秒 仍未结束")
+
+    def _on_done(self, name: str, future, watchdog):
+        watchdog.cancel()
+        finished_at = time.time()
+        error = future.exception()
+        with self._state_lock:
+            state = self._states[name]
+            elapsed = finished_at - state["running_since"]
+            state["running_since"] = None
+            deferred, state["deferred"] = state["deferred"], False
+            state["runs"] += 1
+            state["last_duration"] = elapsed
+            if error is None:
+                state["last_success"] = finished_at
+            else:
+                state["errors"] += 1
+        state["duration"].observe(elapsed)
+        if deferred:
+            self._scheduler.reschedule(name)
+        if error is not None:
+            logger.error(f"检测器 {name} 出错: {error}")
+        elif state["timed_out"]:
+            logger.info(f"检测器 {name} 超时后完成，用时 {elapsed:.1f}秒")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取每个检测器的计划、运行状态、耗时和最近一次成功的时间"""
+        schedules = self._scheduler.get_metrics()
+        metrics = {}
+        with self._state_lock:
+            for name, state in self._states.items():
+                schedule = schedules.get(name, {})
+                metrics[name] = {
+                    "schedule": schedule.get("schedule"),
+                    "next_fire": schedule.get("next_fire"),
+                    "timeout": state["timeout"],
+                    "running_since": state["running_since"],
+                    "runs": state["runs"],
+                    "errors": state["errors"],
+                    "skipped": state["skipped"],
+                    "timeouts": state["timeouts"],
+                    "last_duration": state["last_duration"],
+                    "last_success": state["last_success"],
+                    "duration": state["duration"].snapshot(),
+                }
+        return metrics
     
-    def start_loop(self, check_interval: int = 60):
-        """启动检测器循环"""
+    def start_loop(self):
+        """启动检测器循环，阻塞到 stop_loop()"""
         self._running = True
-        logger.info(f"检测循环启动，检查间隔: {check_interval}秒")
+        max_workers = self._max_workers or max(1, len(self.processors))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Detector")
+        logger.info(f"检测循环启动，共 {len(self.processors)} 个检测器，{max_workers} 个线程")
 
-        config_manager = ConfigManager(self._env_file)
-      
         try:
-            while self._running:
-                try:
-                    # 循环处理所有注册的检测器
-                    for name, processor in self.processors.items():
-                        if hasattr(processor, "process_loop"):
-                            processor.process_loop(config_manager)
-
-                    time.sleep(check_interval)
-                    
-                except KeyboardInterrupt:
-                    logger.info("收到中断信号，停止检测器循环")
-                    break
-                except Exception as e:
-                    logger.error(f"检测器循环出错: {e}")
-                    time.sleep(check_interval)  # 出错后继续运行
-                    
+            self._scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，停止检测器循环")
         finally:
             self._running = False
+            # 不等待运行中的检测器，卡住的检测器不能拖住退出
+            self._executor.shutdown(wait=False, cancel_futures=True)
             logger.info("检测器循环已停止")
     
     def stop_loop(self):
         """停止检测器循环"""
         self._running = False
+        self._scheduler.stop()
         logger.info("正在停止检测器循环...")
 
 # 独立运行
@@ -92,7 +246,7 @@ if __name__ == "__main__":
     
     try:
         reminder_loop = DetectorLoop()
-        reminder_loop.start_loop(check_interval=60)  # 每分钟检查一次
+        reminder_loop.start_loop()
         
     except KeyboardInterrupt:
         logger.info("程序被用户中断")
@@ -47,7 +47,11 @@ class EnvConfig:
         return {
             'api_key': self.get('WXAUTO_API_KEY'),
             'api_url': self.get('WXAUTO_API_URL'),
-            'download_path': self.get('WXAUTO_DOWNLOAD_PATH')
+            'download_path': self.get('WXAUTO_DOWNLOAD_PATH'),
+            'timeouts': self.get('WXAUTO_TIMEOUTS'),
+            'pool_size': self.get('WXAUTO_POOL_SIZE'),
+            'spill_threshold': self.get('WXAUTO_SPILL_THRESHOLD'),
+            'capture_dir': self.get('WXAUTO_CAPTURE_DIR')
         }
 
     def get_mitv_config(self):
@@ -87,6 +91,11 @@ class EnvConfig:
             'token': self.get('DSM_TOKEN'),
         }
 
+    def get_ingest_config(self):
+        return {
+            'api_key': self.get('INGEST_API_KEY'),
+        }
+
 # Test function
 if __name__ == "__main__":
     # Configure logging
@@ -0,0 +1,68 @@
+# intent_classifier.py
+import logging
+from typing import Dict, Optional
+from webapi.deepseek import DeepSeekAPI
+
+logger = logging.getLogger(__name__)
+
+# DeepSeek 判断不是任何命令时的回复
+NO_INTENT = "不是命令"
+
+class IntentClassifier:
+    """
+    共享的意图识别
+
+    把一条消息路由到的所有处理器注册的命令合并成一个多选提示词，
+    每条消息最多调用一次 DeepSeek，识别结果写入消息字典的 intent 字段。
+    """
+
+    def __init__(self, env_file=".env"):
+        self._deepseek = DeepSeekAPI(env_file)
+
+    def _build_prompt(self, user_input: str, commands: Dict[str, str]) -> str:
+        cmd_options = "\n".join([f"{i+1}. {cmd}：{desc}" for i, (cmd, desc) in enumerate(commands.items())])
+
+        return f"""请分析用户的输入，判断是否是以下命令之一：
+
+{cmd_options}
+
+用户输入："{user_input}"
+
+请严格按照以下规则判断：
+- 如果用户意图匹配上述任一命令，请直接回复对应的完整命令文本（冒号前的部分）
+- 如果用户意图不明确或不是上述命令，回复："{NO_INTENT}"
+
+示例：
+用户输入："帮我开一下电视" -> 回复："打开电视"
+用户输入："乔宝在哪里" -> 回复："查询乔宝位置"
+用户输入："今天天气怎么样" -> 回复："{NO_INTENT}"
+
+请只回复命令文本或"{NO_INTENT}"，不要添加任何其他内容。"""
+
+    def classify(self, user_input: str, commands: Dict[str, str]) -> Optional[str]:
+        """
+        识别用户输入对应的命令
+
+        Args:
+            user_input (str): 用户输入的文本
+            commands (dict): {命令文本: 命令说明}
+
+        Returns:
+            str or None: 识别到的命令，没有识别到返回None
+        """
+        if not commands or not user_input or not user_input.strip():
+            return None
+
+        try:
+            response = self._deepseek.ask_question(self._build_prompt(user_input, commands))
+            if not response:
+                logger.error("DeepSeek API returned no response for intent classification")
+                return None
+
+            response = response.strip().strip('"“”')
+            logger.info(f"DeepSeek intent classification result: '{response}'")
+            return response if response in commands else None
+
+        except Exception as e:
+            logger.error(f"Error in intent classification: {str(e)}")
+            return None
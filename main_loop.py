@@ -12,6 +12,10 @@ from processor.urlsave_processor import UrlSaveProcessor
 from processor.stock_processor import StockProcessor
 from webserver import WebServer
 from detector_loop import DetectorLoop
+from message_poller import MessagePoller
+from message_dispatcher import ChatDispatcher
+from message_ingest import MessageIngestor
+from traffic_capture import TrafficRecorder
 import asyncio
 import threading
 
@@ -23,6 +27,7 @@ if not sys.platform == "win32":
 from env import EnvConfig
 from process_router import ProcessRouter
 from config import ConfigManager
+from db.sqlite import MessageInbox
 
 # Configure logging
 logging.basicConfig(
@@ -44,9 +49,25 @@ class MainLoopProcessor:
         self._config_manager = ConfigManager(env_file)
         self.wxauto = WXAuto(env_file)
         self.running = False
+        self._stop_event = threading.Event()
+        self.poller = MessagePoller(self.wxauto)
         
         # 初始化处理器路由
         self.process_router = self._init_process_router(env_file)
+
+        # 按通道和聊天分发到工作线程池，同一聊天按顺序处理，声明了 unordered 的命令不用等同一聊天的批量任务
+        self.dispatcher = ChatDispatcher(self._route_batch)
+
+        # 轮询和推送两种来源共用的消息入口，按消息 id 去重并持久化到收件箱
+        self.ingestor = MessageIngestor(self.dispatcher, inbox=MessageInbox(env_file),
+                                        lane_classifier=self.process_router.classify_lane)
+
+        # 配置了录制目录时，把轮询到的消息批次和附件录制下来，供 bench.replay 离线回放
+        capture_dir = self._config.get_wxauto_config().get('capture_dir')
+        self.capture = None
+        if capture_dir:
+            _, routing_table = self._config_manager.get_routing_table()
+            self.capture = TrafficRecorder(capture_dir, routing=routing_table)
         
         logger.info("MainLoopProcessor 初始化完成")
         
@@ -64,52 +85,66 @@ class MainLoopProcessor:
         logger.info("正在初始化处理器路由...")
         router = ProcessRouter()
         
-        # 注册所有处理器
-        router.register_processor("homework_processor", HomeworkProcessor(env_file))
-        logger.info("注册作业识别处理器...")
+        # 注册所有处理器，所有处理器信息在一个事务中写入数据库
+        with self._config_manager.transaction():
+            router.register_processor("homework_processor", HomeworkProcessor(env_file))
+            logger.info("注册作业识别处理器...")
 
-        router.register_processor("chat_processor", ChatProcessor(env_file))
-        logger.info("注册聊天处理器...")
+            router.register_processor("chat_processor", ChatProcessor(env_file))
+            logger.info("注册聊天处理器...")
 
-        router.register_processor("location_processor", LocationProcessor(env_file))
-        logger.info("注册定位处理器...")
+            router.register_processor("location_processor", LocationProcessor(env_file))
+            logger.info("注册定位处理器...")
 
-        router.register_processor("urlsave_processor", UrlSaveProcessor(env_file))
-        logger.info("公众号链接保存处理器...")
+            router.register_processor("urlsave_processor", UrlSaveProcessor(env_file))
+            logger.info("公众号链接保存处理器...")
 
-        router.register_processor("stock_processor", StockProcessor(env_file))
-        logger.info("注册股票处理器...")
+            router.register_processor("stock_processor", StockProcessor(env_file))
+            logger.info("注册股票处理器...")
 
-        if not sys.platform == "win32":
-            router.register_processor("print_processor", PrintProcessor(env_file))
-            logger.info("注册文件打印处理器...")
+            if not sys.platform == "win32":
+                router.register_processor("print_processor", PrintProcessor(env_file))
+                logger.info("注册文件打印处理器...")
 
-            router.register_processor("mitv_processor", MitvProcessor(env_file))
-            logger.info("注册电视处理器...")
+                router.register_processor("mitv_processor", MitvProcessor(env_file))
+                logger.info("注册电视处理器...")
 
-            router.register_processor("license_processor", LicenseProcessor(env_file))
-            logger.info("注册授权处理器...")
+                router.register_processor("license_processor", LicenseProcessor(env_file))
+                logger.info("注册授权处理器...")
         
         logger.info("所有处理器注册完成")
 
         self._config_manager.get_all_processors()
         return router
     
-    def main_loop(self, check_interval=3):
+    def main_loop(self, check_interval=3, adaptive=True):
         """
         主循环
         
         Args:
-            check_interval (int): 检查间隔秒数，默认3秒
+            check_interval (int): 检查间隔秒数，默认3秒；自适应模式下作为最大间隔
+            adaptive (bool): 是否启用自适应轮询（拉空消息后按到达速率动态调整间隔）
         """
         self.running = True
+        self._stop_event.clear()
         logger.info("=" * 50)
         logger.info("启动主循环处理器")
-        logger.info(f"检查间隔: {check_interval}秒")
+        logger.info(f"检查间隔: {check_interval}秒, 自适应轮询: {adaptive}")
         logger.info("=" * 50)
+
+        if adaptive:
+            self.poller = MessagePoller(self.wxauto, max_interval=check_interval)
+
+        # 重放上次退出前未处理完的消息
+        self.ingestor.replay_pending()
                 
         try:
             while self.running:
+                if adaptive:
+                    self.poller.drain(self._handle_batch, can_accept=self.dispatcher.has_capacity)
+                    self.poller.sleep(self._stop_event)
+                    continue
+
                 # 获取新消息
                 message_result = self.wxauto.get_next_new_message()
                 
@@ -119,7 +154,7 @@ class MainLoopProcessor:
                     logger.info(f"发现新消息，来自: {message_result.get('chat_name')}")
                 
                 # 使用路由处理器处理消息
-                self.process_router.route_message_batch(message_result, self.wxauto)
+                self._handle_batch(message_result)
                 
                 time.sleep(check_interval)
                 
@@ -131,11 +166,41 @@ class MainLoopProcessor:
             logger.error(traceback.format_exc())
         finally:
             self.running = False
+            self.dispatcher.shutdown(wait=False)
+
+    def _handle_batch(self, message_result):
+        """将轮询到的消息批次交给消息入口，去重后按聊天名称排队处理"""
+        if self.capture:
+            try:
+                self.capture.record(message_result, self.wxauto)
+            except Exception as e:
+                logger.error(f"录制消息批次失败: {str(e)}")
+        self.ingestor.ingest(message_result, source="poll")
+
+    def _route_batch(self, message_result):
+        """在工作线程中路由单个消息批次，完成后在收件箱中标记"""
+        try:
+            self.process_router.route_message_batch(message_result, self.wxauto)
+        finally:
+            # 路由出错也要标记，否则这些消息每次重启都会被重放，也永远不会被清理
+            self.ingestor.complete(message_result)
+
+    def get_metrics(self):
+        """获取主循环指标"""
+        return {
+            "poller": self.poller.get_metrics(),
+            "dispatcher": self.dispatcher.get_metrics(),
+            "ingest": self.ingestor.get_metrics(),
+            "router": self.process_router.get_metrics(),
+            "wxauto": self.wxauto.get_metrics(),
+            "capture": self.capture.get_metrics() if self.capture else None
+        }
         
     def stop(self):
         """停止主循环"""
         logger.info("正在停止主循环...")
         self.running = False
+        self._stop_event.set()
 
 
 def main():
@@ -164,7 +229,7 @@ def main():
         def run_detector_loop():
             """在新线程中运行提醒循环"""
             try:
-                detector_loop.start_loop(check_interval=1)  # 每秒检查一次
+                detector_loop.start_loop()
             except Exception as e:
                 logger.error(f"提醒循环启动失败: {e}")
         
@@ -174,7 +239,7 @@ def main():
         logger.info("提醒循环已启动")
 
         logger.info("正在启动 WebServer...")
-        webserver = WebServer(processor.wxauto, detector_loop, env_file=".env")
+        webserver = WebServer(processor.wxauto, detector_loop, env_file=".env", main_loop=processor)
         
         def run_webserver():
             """在新线程中运行 WebServer"""
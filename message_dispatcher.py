@@ -0,0 +1,241 @@
+# message_dispatcher.py
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# 队列深度分桶
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# 交互类消息（电视、开门、定位等需要秒级响应的命令）
+INTERACTIVE_LANE = "interactive"
+# 批量类消息（OCR、文档转换、网页保存等耗时任务）
+BULK_LANE = "bulk"
+
+# 每个通道的工作线程数
+DEFAULT_LANES = {
+    INTERACTIVE_LANE: 2,
+    BULK_LANE: 2,
+}
+
+class ChatDispatcher:
+    """
+    按通道和聊天名称分发消息批次的工作线程池
+
+    - 每个通道（interactive / bulk）有独立的有界线程池，耗时任务不会占满交互命令的线程
+    - 每个聊天有一个按顺序处理的队列，批次带着各自的通道排队，同一个聊天的批次严格按提交顺序串行处理，
+      任何时候最多只在一个通道中运行；队首批次换了通道时，交给那个通道的线程池继续处理
+    - 以 ordered=False 提交的批次（处理器声明不依赖同一聊天前面的消息，例如电视、定位命令）
+      进入该聊天在本通道的独立队列，不用等同一聊天排在前面的批量任务，它们之间仍按提交顺序处理
+    - 不同聊天之间在各自通道的线程池中并行处理
+    - 每个队列的排队深度有上限，满了以后 submit 会阻塞，轮询器据此退避
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], lanes: Optional[Dict[str, int]] = None,
+                 max_queue_depth: int = 20):
+        """
+        Args:
+            handler: 处理单个消息批次的回调
+            lanes (dict): {通道名称: 工作线程数}，默认 DEFAULT_LANES
+            max_queue_depth (int): 每个队列最多排队的批次数
+        """
+        self._handler = handler
+        self._lanes = dict(lanes or DEFAULT_LANES)
+        self._default_lane = BULK_LANE if BULK_LANE in self._lanes else next(iter(self._lanes))
+        self._max_queue_depth = max_queue_depth
+        self._executors = {
+            lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ChatWorker-{lane}")
+            for lane, workers in self._lanes.items()
+        }
+        self._cond = threading.Condition()
+        self._queues = {}      # {(chat_name, 通道或 None): deque[(enqueued_at, lane, batch)]}，None 为按顺序处理的队列
+        self._active = {}      # {队列: 正在处理它的通道}
+        self._stats = {}       # {chat_name: {...}}
+        self._lane_stats = {
+            lane: {"submitted": 0, "processed": 0, "wait_time": Histogram(), "process_time": Histogram()}
+            for lane in self._lanes
+        }
+        self._shutdown = False
+        logger.info(f"ChatDispatcher 初始化完成, 通道: {self._lanes}, 单队列上限: {max_queue_depth}")
+
+    def _get_stats(self, chat_name: str) -> Dict[str, Any]:
+        stats = self._stats.get(chat_name)
+        if stats is None:
+            stats = {
+                "submitted": 0,
+                "processed": 0,
+                "errors": 0,
+                "queue_depth": Histogram(QUEUE_DEPTH_BUCKETS),
+                "wait_time": Histogram(),
+                "process_time": Histogram(),
+            }
+            self._stats[chat_name] = stats
+        return stats
+
+    def submit(self, chat_name: str, batch: Dict[str, Any], timeout: Optional[float] = None,
+               lane: Optional[str] = None, ordered: bool = True) -> bool:
+        """
+        提交一个消息批次
+
+        Args:
+            chat_name (str): 聊天名称
+            batch (dict): 消息批次
+            timeout (float): 队列满时最多等待的秒数，None 表示一直等待
+            lane (str): 通道名称，None 或未知通道使用默认通道
+            ordered (bool): False 时不用等同一聊天在其他通道中排队的批次
+
+        Returns:
+            bool: 是否成功入队
+        """
+        if lane not in self._lanes:
+            if lane is not None:
+                logger.warning(f"未知的通道 '{lane}'，使用 '{self._default_lane}'")
+            lane = self._default_lane
+
+        key = (chat_name, None if ordered else lane)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            if self._shutdown:
+                logger.warning(f"分发器已关闭，丢弃来自 '{chat_name}' 的消息")
+                return False
+
+            queue = self._queues.setdefault(key, deque())
+            while len(queue) >= self._max_queue_depth:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"聊天 '{chat_name}' 的队列已满({len(queue)})，入队超时")
+                    return False
+                logger.info(f"聊天 '{chat_name}' 的队列已满({len(queue)})，等待处理")
+                self._cond.wait(remaining)
+                if self._shutdown:
+                    logger.warning(f"分发器已关闭，丢弃来自 '{chat_name}' 的消息")
+                    return False
+                queue = self._queues.setdefault(key, deque())
+
+            queue.append((time.time(), lane, batch))
+            stats = self._get_stats(chat_name)
+            stats["submitted"] += 1
+            stats["queue_depth"].observe(len(queue))
+            self._lane_stats[lane]["submitted"] += 1
+
+            if key not in self._active:
+                self._active[key] = lane
+                self._executors[lane].submit(self._drain_queue, lane, key)
+        return True
+
+    def _drain_queue(self, lane: str, key: tuple):
+        """在工作线程中按顺序处理某个队列在本通道的排队批次，遇到其他通道的批次时交给那个通道"""
+        chat_name = key[0]
+        lane_stats = self._lane_stats[lane]
+        while True:
+            with self._cond:
+                queue = self._queues.get(key)
+                if not queue:
+                    self._active.pop(key, None)
+                    self._queues.pop(key, None)
+                    self._cond.notify_all()
+                    return
+                next_lane = queue[0][1]
+                if next_lane != lane:
+                    # 交给下一个批次的通道继续处理，本线程不再处理这个聊天
+                    self._active[key] = next_lane
+                    try:
+                        self._executors[next_lane].submit(self._drain_queue, next_lane, key)
+                    except RuntimeError:
+                        logger.warning(f"分发器已关闭，聊天 '{chat_name}' 剩余 {len(queue)} 个批次未处理")
+                        self._active.pop(key, None)
+                    return
+                enqueued_at, _, batch = queue.popleft()
+                stats = self._get_stats(chat_name)
+                self._cond.notify_all()
+
+            started_at = time.time()
+            stats["wait_time"].observe(started_at - enqueued_at)
+            lane_stats["wait_time"].observe(started_at - enqueued_at)
+            try:
+                self._handler(batch)
+            except Exception as e:
+                logger.error(f"处理来自 '{chat_name}' 的消息时出错: {str(e)}")
+                with self._cond:
+                    stats["errors"] += 1
+            finally:
+                elapsed = time.time() - started_at
+                stats["process_time"].observe(elapsed)
+                lane_stats["process_time"].observe(elapsed)
+                with self._cond:
+                    stats["processed"] += 1
+                    lane_stats["processed"] += 1
+
+    def has_capacity(self) -> bool:
+        """所有队列都未满时返回 True"""
+        with self._cond:
+            for queue in self._queues.values():
+                if len(queue) >= self._max_queue_depth:
+                    return False
+            return True
+
+    def pending(self) -> int:
+        """当前排队中的批次总数"""
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self, wait: bool = True):
+        """关闭分发器"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        logger.info("ChatDispatcher 已关闭")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取每个通道和每个聊天的队列深度和等待时间直方图"""
+        with self._cond:
+            depths = {}
+            lane_depths = {lane: 0 for lane in self._lanes}
+            for (chat_name, _), queue in self._queues.items():
+                depths[chat_name] = depths.get(chat_name, 0) + len(queue)
+                for _, lane, _ in queue:
+                    lane_depths[lane] += 1
+            active = sorted(f"{lane}:{chat_name}" for (chat_name, _), lane in self._active.items())
+            stats = dict(self._stats)
+            lane_counts = {
+                lane: (lane_stats["submitted"], lane_stats["processed"])
+                for lane, lane_stats in self._lane_stats.items()
+            }
+
+        lanes = {}
+        for lane, workers in self._lanes.items():
+            submitted, processed = lane_counts[lane]
+            lanes[lane] = {
+                "max_workers": workers,
+                "pending": lane_depths[lane],
+                "submitted": submitted,
+                "processed": processed,
+                "wait_time": self._lane_stats[lane]["wait_time"].snapshot(),
+                "process_time": self._lane_stats[lane]["process_time"].snapshot(),
+            }
+
+        chats = {}
+        for chat_name, chat_stats in stats.items():
+            chats[chat_name] = {
+                "current_depth": depths.get(chat_name, 0),
+                "submitted": chat_stats["submitted"],
+                "processed": chat_stats["processed"],
+                "errors": chat_stats["errors"],
+                "queue_depth": chat_stats["queue_depth"].snapshot(),
+                "wait_time": chat_stats["wait_time"].snapshot(),
+                "process_time": chat_stats["process_time"].snapshot(),
+            }
+        return {
+            "max_queue_depth": self._max_queue_depth,
+            "pending": sum(depths.values()),
+            "active_chats": active,
+            "lanes": lanes,
+            "chats": chats,
+        }
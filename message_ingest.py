@@ -0,0 +1,188 @@
+# message_ingest.py
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MessageIngestor:
+    """
+    消息入口
+
+    轮询（poll）和推送（push）两种来源的消息批次都经过这里，
+    按消息 id 去重后再交给分发器排队处理。
+    配置了收件箱时，消息在入队前先持久化，处理完成后再标记完成。
+    配置了通道分类器时，一个批次按通道拆成连续的几段依次入队，消息的先后顺序不变。
+    """
+
+    def __init__(self, dispatcher, inbox=None, max_seen_ids: int = 10000,
+                 lane_classifier: Optional[Callable[[str, Dict[str, Any]], Tuple[str, bool]]] = None):
+        """
+        Args:
+            dispatcher: ChatDispatcher 实例
+            inbox: 可选，MessageInbox 实例
+            max_seen_ids (int): 最多记住的消息 id 数量，超过后淘汰最早的
+            lane_classifier: 可选，(chat_name, 原始消息) -> (通道名称, 是否需要按顺序处理)
+        """
+        self._dispatcher = dispatcher
+        self._inbox = inbox
+        self._lane_classifier = lane_classifier
+        self._max_seen_ids = max_seen_ids
+        self._seen_ids = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "poll": {"batches": 0, "messages": 0, "duplicates": 0, "rejected": 0},
+            "push": {"batches": 0, "messages": 0, "duplicates": 0, "rejected": 0},
+        }
+
+    def _reserve_new_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤掉已经见过的消息，并记住新消息的 id"""
+        new_messages = []
+        with self._lock:
+            for msg in messages:
+                msg_id = msg.get("id")
+                if msg_id is None:
+                    new_messages.append(msg)
+                    continue
+                if msg_id in self._seen_ids:
+                    self._seen_ids.move_to_end(msg_id)
+                    continue
+                self._seen_ids[msg_id] = True
+                new_messages.append(msg)
+
+            while len(self._seen_ids) > self._max_seen_ids:
+                self._seen_ids.popitem(last=False)
+        return new_messages
+
+    def _release_messages(self, messages: List[Dict[str, Any]]):
+        """入队失败时忘掉这些消息 id，以便来源重试"""
+        with self._lock:
+            for msg in messages:
+                msg_id = msg.get("id")
+                if msg_id is not None:
+                    self._seen_ids.pop(msg_id, None)
+
+    def _split_by_lane(self, batch: Dict[str, Any]) -> List[Tuple[Optional[str], bool, Dict[str, Any]]]:
+        """按通道把批次拆成连续的几段，返回 [(通道, 是否按顺序处理, 子批次), ...]，拼起来与原批次顺序相同"""
+        if not self._lane_classifier:
+            return [(None, True, batch)]
+
+        chat_name = batch.get("chat_name")
+        runs = []
+        for msg in batch.get("messages", []):
+            try:
+                lane, ordered = self._lane_classifier(chat_name, msg)
+            except Exception as e:
+                logger.error(f"判断消息通道出错: {str(e)}")
+                lane, ordered = None, True
+            if runs and runs[-1][0] == (lane, ordered):
+                runs[-1][1].append(msg)
+            else:
+                runs.append(((lane, ordered), [msg]))
+
+        parts = []
+        for (lane, ordered), messages in runs:
+            part = dict(batch)
+            part["messages"] = messages
+            part["lane"] = lane
+            parts.append((lane, ordered, part))
+        return parts
+
+    def ingest(self, message_batch: Dict[str, Any], source: str = "poll",
+               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        接收一个消息批次
+
+        Args:
+            message_batch (dict): 与 WXAuto.get_next_new_message 返回值结构相同的批次
+            source (str): 消息来源，poll 或 push
+            timeout (float): 分发队列满时最多等待的秒数，None 表示一直等待
+
+        Returns:
+            dict: {"accepted": 新消息数, "duplicates": 重复消息数, "queued": 是否入队}
+        """
+        with self._lock:
+            stats = self._stats.setdefault(source, {"batches": 0, "messages": 0, "duplicates": 0, "rejected": 0})
+
+        if not message_batch.get("success") or not message_batch.get("has_message"):
+            return {"accepted": 0, "duplicates": 0, "queued": False}
+
+        chat_name = message_batch.get("chat_name")
+        messages = message_batch.get("messages", [])
+        new_messages = self._reserve_new_messages(messages)
+        duplicates = len(messages) - len(new_messages)
+
+        batch = dict(message_batch)
+        batch["messages"] = new_messages
+        batch["source"] = source
+
+        if new_messages and self._inbox:
+            # 先落盘再入队，唯一索引兜底去重（例如进程重启后内存中的 id 已丢失）
+            persisted = self._inbox.append_batch(batch)
+            duplicates += len(new_messages) - len(persisted)
+            new_messages = persisted
+            batch["messages"] = new_messages
+
+        with self._lock:
+            stats["duplicates"] += duplicates
+
+        if duplicates:
+            logger.info(f"来自 '{chat_name}' 的 {duplicates} 条消息已处理过({source})，跳过")
+
+        if not new_messages:
+            return {"accepted": 0, "duplicates": duplicates, "queued": False}
+
+        accepted = 0
+        for lane, ordered, part in self._split_by_lane(batch):
+            if not self._dispatcher.submit(chat_name, part, timeout=timeout, lane=lane, ordered=ordered):
+                if self._inbox:
+                    self._inbox.discard([self._inbox.message_key(msg) for msg in part["messages"]])
+                self._release_messages(part["messages"])
+                with self._lock:
+                    stats["rejected"] += 1
+                continue
+
+            accepted += len(part["messages"])
+            with self._lock:
+                stats["batches"] += 1
+                stats["messages"] += len(part["messages"])
+
+        return {"accepted": accepted, "duplicates": duplicates, "queued": accepted > 0}
+
+    def complete(self, message_batch: Dict[str, Any]):
+        """批次处理完成后，在收件箱中标记为已完成"""
+        if self._inbox:
+            self._inbox.mark_done([self._inbox.message_key(msg) for msg in message_batch.get("messages", [])])
+
+    def replay_pending(self) -> int:
+        """
+        重放收件箱中未处理完的消息（启动时调用）
+
+        Returns:
+            int: 重放的消息批次数
+        """
+        if not self._inbox:
+            return 0
+
+        batches = self._inbox.pending_batches()
+        for batch in batches:
+            with self._lock:
+                for msg in batch["messages"]:
+                    if msg.get("id") is not None:
+                        self._seen_ids[msg.get("id")] = True
+            batch["source"] = "replay"
+            for lane, ordered, part in self._split_by_lane(batch):
+                self._dispatcher.submit(batch["chat_name"], part, lane=lane, ordered=ordered)
+
+        if batches:
+            logger.info(f"从收件箱重放了 {len(batches)} 个未处理完的消息批次")
+        return len(batches)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取各来源的入队与去重统计"""
+        with self._lock:
+            return {
+                "seen_ids": len(self._seen_ids),
+                "sources": {name: dict(stats) for name, stats in self._stats.items()},
+            }
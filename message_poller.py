@@ -0,0 +1,135 @@
+# message_poller.py
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class MessagePoller:
+    """
+    自适应消息轮询器
+
+    每一轮持续调用 get_next_new_message 直到接口报告没有新消息，
+    然后根据消息到达速率的 EWMA 计算下一次轮询前的休眠间隔：
+    消息越密集间隔越短，空闲时逐步退避到 max_interval。
+    """
+
+    def __init__(self, wxauto_client, min_interval: float = 0.2, max_interval: float = 3.0,
+                 alpha: float = 0.3, max_batches_per_drain: int = 50):
+        """
+        Args:
+            wxauto_client: wxauto客户端实例
+            min_interval (float): 最小轮询间隔（秒）
+            max_interval (float): 最大轮询间隔（秒）
+            alpha (float): EWMA 平滑系数，越大对最新速率越敏感
+            max_batches_per_drain (int): 单轮最多拉取的批次数，防止一直不休眠
+        """
+        self.wxauto_client = wxauto_client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._alpha = alpha
+        self._max_batches_per_drain = max_batches_per_drain
+
+        self._lock = threading.Lock()
+        self._arrival_rate = 0.0          # EWMA 到达速率（批次/秒）
+        self._interval = max_interval     # 当前轮询间隔
+        self._backlog = 0                 # 上一轮拉取到的批次数
+        self._last_drain_time = None
+        self._total_batches = 0
+        self._total_polls = 0
+        self._total_errors = 0
+
+    def drain(self, handle_batch: Callable[[Dict[str, Any]], Any],
+              can_accept: Optional[Callable[[], bool]] = None) -> int:
+        """
+        连续拉取消息直到没有新消息
+
+        Args:
+            handle_batch: 处理单个消息批次的回调
+            can_accept: 可选，返回 False 时停止拉取（下游已满，需要退避）
+
+        Returns:
+            int: 本轮拉取到的消息批次数
+        """
+        drained = 0
+        while drained < self._max_batches_per_drain:
+            if can_accept is not None and not can_accept():
+                logger.info("下游队列已满，暂停拉取消息")
+                break
+
+            message_result = self.wxauto_client.get_next_new_message()
+            with self._lock:
+                self._total_polls += 1
+
+            if not message_result.get("success"):
+                logger.warning(f"获取消息失败: {message_result.get('error')}")
+                with self._lock:
+                    self._total_errors += 1
+                break
+
+            if not message_result.get("has_message"):
+                break
+
+            logger.info(f"发现新消息，来自: {message_result.get('chat_name')}")
+            handle_batch(message_result)
+            drained += 1
+
+        self._update_interval(drained)
+        return drained
+
+    def _update_interval(self, drained: int):
+        """根据本轮拉取结果更新 EWMA 到达速率和下一次的轮询间隔"""
+        now = time.time()
+        with self._lock:
+            if self._last_drain_time is None:
+                elapsed = self._interval
+            else:
+                elapsed = max(now - self._last_drain_time, 1e-3)
+            self._last_drain_time = now
+
+            rate = drained / elapsed
+            self._arrival_rate = self._alpha * rate + (1 - self._alpha) * self._arrival_rate
+
+            if drained >= self._max_batches_per_drain:
+                # 没有拉空，说明还有积压，立刻继续
+                interval = 0.0
+            elif self._arrival_rate > 0:
+                interval = 1.0 / self._arrival_rate
+            else:
+                interval = self._max_interval
+
+            if interval > 0:
+                interval = min(max(interval, self._min_interval), self._max_interval)
+
+            self._interval = interval
+            self._backlog = drained
+            self._total_batches += drained
+
+    @property
+    def interval(self) -> float:
+        """当前轮询间隔（秒）"""
+        with self._lock:
+            return self._interval
+
+    def sleep(self, stop_event: Optional[threading.Event] = None):
+        """按当前间隔休眠，stop_event 被设置时提前返回"""
+        interval = self.interval
+        if interval <= 0:
+            return
+        if stop_event is not None:
+            stop_event.wait(interval)
+        else:
+            time.sleep(interval)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取轮询器指标"""
+        with self._lock:
+            return {
+                "interval": round(self._interval, 3),
+                "arrival_rate": round(self._arrival_rate, 3),
+                "backlog": self._backlog,
+                "total_batches": self._total_batches,
+                "total_polls": self._total_polls,
+                "total_errors": self._total_errors,
+            }
@@ -0,0 +1,74 @@
+# metrics.py
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+# 默认的耗时分桶（秒）
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+class Histogram:
+    """
+    线程安全的简单直方图
+
+    同时保留最近的若干个样本，用于计算 p50/p95/p99 等分位数。
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS, window: int = 1024):
+        self._buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._recent = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """记录一个样本"""
+        with self._lock:
+            index = len(self._buckets)
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    index = i
+                    break
+            self._counts[index] += 1
+            self._recent.append(value)
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return self._count
+
+    def percentile(self, q: float) -> Optional[float]:
+        """根据最近的样本计算分位数，q 取值 0-100"""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取直方图快照"""
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+            max_value = self._max
+        buckets = {}
+        for bound, n in zip(self._buckets, counts):
+            buckets[f"le_{bound}"] = n
+        buckets["inf"] = counts[-1]
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg": round(total / count, 6) if count else None,
+            "max": round(max_value, 6),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": buckets,
+        }
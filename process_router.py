@@ -2,49 +2,318 @@
 import logging
 import json
 import os
+import re
+import time
+import threading
+from types import MappingProxyType
 
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Callable, Optional
 from env import EnvConfig
 from config import ConfigManager
+from intent_classifier import IntentClassifier
+from message_dispatcher import INTERACTIVE_LANE, BULK_LANE
+from metrics import Histogram
 
 logger = logging.getLogger(__name__)
 
+# 群聊中 @ 机器人的文本
+BOT_MENTION = "@呼噜一号"
+
+# 消息类型 -> (处理方法名, 日志中的类型名称, 触发器匹配及日志摘要使用的字段)
+MESSAGE_HANDLERS = {
+    "image": ("process_image", "图片", "file_name"),
+    "voice": ("process_voice", "语音", "voice_text"),
+    "text": ("process_text", "文本", "text_content"),
+    "file": ("process_file", "文件", "file_name"),
+    "link": ("process_url", "链接", "url"),
+}
+
+# 处理器没有声明通道时，按消息类型推断
+DEFAULT_MESSAGE_LANES = {
+    "text": INTERACTIVE_LANE,
+    "voice": INTERACTIVE_LANE,
+    "image": BULK_LANE,
+    "file": BULK_LANE,
+    "link": BULK_LANE,
+}
+
+# 超过该大小的附件总是走批量通道
+LARGE_ATTACHMENT_BYTES = 1024 * 1024
+
+class TriggerMatcher:
+    """
+    某个聊天中某种消息类型的组合触发器
+
+    处理器可以实现 triggers() 声明廉价的触发条件，返回 {msg_type: spec}：
+    - 只有出现在字典中的消息类型才会交给该处理器
+    - spec["mention"]: "always" 总是需要 @机器人，"group" 仅群聊需要，仅对文本消息生效
+    - spec["patterns"]: 正则列表，匹配去掉 @机器人 后的内容，任一命中即可
+    - spec["mentioned_patterns"]: 正则列表，只在 @机器人 的文本消息中生效，和 patterns 任一命中即可
+    - spec["chat_types"]: 允许的聊天类型列表，如 ["group", "friend"]
+    没有实现 triggers() 的处理器不做任何过滤。
+
+    所有处理器的正则合并为一个组合正则先做一次预筛，没有任何命中时直接跳过
+    全部带正则的处理器。
+    """
+
+    def __init__(self, msg_type: str, entries: List[Tuple[Any, Dict[str, Any]]]):
+        """
+        Args:
+            msg_type (str): 消息类型
+            entries: [(处理方法, 触发条件 spec 或 None), ...]，已按 priority 排序
+        """
+        self._content_field = MESSAGE_HANDLERS[msg_type][2]
+        self._is_text = msg_type == "text"
+        self._entries = []
+        all_patterns = []
+        for handler, spec in entries:
+            if spec is None:
+                self._entries.append((handler, None, None, None, None))
+                continue
+            patterns = list(spec.get("patterns") or [])
+            mentioned_patterns = list(spec.get("mentioned_patterns") or [])
+            all_patterns.extend(patterns + mentioned_patterns)
+            regex = self._compile(patterns)
+            mentioned_regex = self._compile(mentioned_patterns)
+            chat_types = frozenset(spec.get("chat_types") or ())
+            self._entries.append((handler, spec.get("mention"), regex, mentioned_regex, chat_types))
+
+        self._combined = self._compile(all_patterns)
+        self.handlers = tuple(entry[0] for entry in self._entries)
+
+    @staticmethod
+    def _compile(patterns: List[str]):
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns)) if patterns else None
+
+    def match(self, msg: Dict[str, Any]) -> Tuple[Any, ...]:
+        """返回触发条件命中的处理方法"""
+        content = str(msg.get(self._content_field) or "")
+        chat_type = msg.get("chat_type")
+        mentioned = self._is_text and BOT_MENTION in content
+        if mentioned:
+            content = content.replace(BOT_MENTION, "").strip()
+
+        any_pattern = self._combined is not None and self._combined.search(content) is not None
+
+        matched = []
+        for handler, mention, regex, mentioned_regex, chat_types in self._entries:
+            if mention is None and regex is None and mentioned_regex is None and not chat_types:
+                matched.append(handler)
+                continue
+            if chat_types and chat_type not in chat_types:
+                continue
+            if self._is_text and not mentioned:
+                if mention == "always" or (mention == "group" and chat_type == "group"):
+                    continue
+            if regex is not None or mentioned_regex is not None:
+                if not any_pattern:
+                    continue
+                hit = regex is not None and regex.search(content) is not None
+                if not hit and mentioned and mentioned_regex is not None:
+                    hit = mentioned_regex.search(content) is not None
+                if not hit:
+                    continue
+            matched.append(handler)
+        return tuple(matched)
+
 class ProcessRouter:
     def __init__(self, env_file=".env"):
         self._config = EnvConfig(env_file)
         self._config_manager = ConfigManager(env_file)
+        self._intent_classifier = IntentClassifier(env_file)
         self.processors = {}
+        # (路由表版本, {chat_name: 排好序的处理器元组}, {(chat_name, msg_type): TriggerMatcher})
+        # 路由表或处理器变化时整体重建并原子替换
+        self._routing = (None, MappingProxyType({}), MappingProxyType({}))
+        self._routing_lock = threading.Lock()
+        # 每个处理器的处理次数和耗时，以及消息处理完成后的回调
+        self._stats_lock = threading.Lock()
+        self._processor_stats = {}
+        self._listeners = []
         logger.info("Initializing process router...")
   
     def register_processor(self, name: str, processor_instance):
         """注册处理器"""
         self.processors[name] = processor_instance
         self._config_manager.update_processor(name, processor_instance.description())
+        self._routing = (None,) + self._routing[1:]
+
+    def _get_routing(self):
+        """获取当前的路由缓存和分发表，路由表版本变化时重建"""
+        version, routing_table = self._config_manager.get_routing_table()
+        routing = self._routing
+        if version == routing[0]:
+            return routing
+
+        with self._routing_lock:
+            routing = self._routing
+            if version == routing[0]:
+                return routing
+
+            routes = {}
+            dispatch_table = {}
+            for chat_name, processor_names in routing_table.items():
+                valid_processors = []
+                for name in processor_names:
+                    if name in self.processors:
+                        valid_processors.append(self.processors[name])
+                    else:
+                        logger.warning(f"处理器未注册: {name}")
+
+                # 按照 priority 排序，大的在前面
+                valid_processors.sort(key=lambda processor: processor.priority(), reverse=True)
+                routes[chat_name] = tuple(valid_processors)
+
+                # 预先取出每种消息类型对应的处理方法并编译触发器，
+                # 没有该方法或没有声明该类型触发器的处理器不会出现在表中
+                for msg_type, (method_name, _, _) in MESSAGE_HANDLERS.items():
+                    entries = []
+                    for processor in valid_processors:
+                        if not hasattr(processor, method_name):
+                            continue
+                        spec = None
+                        if hasattr(processor, "triggers"):
+                            triggers = processor.triggers()
+                            if msg_type not in triggers:
+                                continue
+                            spec = triggers[msg_type] or {}
+                        entries.append((getattr(processor, method_name), spec))
+                    if entries:
+                        dispatch_table[(chat_name, msg_type)] = TriggerMatcher(msg_type, entries)
+
+            routing = (version, MappingProxyType(routes), MappingProxyType(dispatch_table))
+            self._routing = routing
+            logger.info(f"路由缓存已重建，版本 {version}，分发表 {len(dispatch_table)} 项")
+            return routing
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any], Optional[str], float], Any]):
+        """
+        注册消息处理完成后的回调
+
+        Args:
+            callback: (chat_name, 消息, 处理成功的处理器名称或 None, 路由耗时秒数) -> Any
+        """
+        self._listeners.append(callback)
+
+    def _record(self, processor_name: str, elapsed: float, handled: bool, failed: bool):
+        with self._stats_lock:
+            stats = self._processor_stats.get(processor_name)
+            if stats is None:
+                stats = {"calls": 0, "handled": 0, "errors": 0, "latency": Histogram()}
+                self._processor_stats[processor_name] = stats
+            stats["calls"] += 1
+            if handled:
+                stats["handled"] += 1
+            if failed:
+                stats["errors"] += 1
+        stats["latency"].observe(elapsed)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取每个处理器的调用次数、成功次数、错误次数和耗时直方图"""
+        with self._stats_lock:
+            stats = dict(self._processor_stats)
+        return {
+            name: {
+                "calls": item["calls"],
+                "handled": item["handled"],
+                "errors": item["errors"],
+                "latency": item["latency"].snapshot(),
+            }
+            for name, item in stats.items()
+        }
 
     def get_processors_for_chat(self, chat_name: str) -> List[Any]:
         """
         根据聊天名称和消息内容获取对应的处理器列表
         """
-        processor_names = []
-        processor_names = self._config_manager.find_processor(chat_name)
-        logger.info(f"精确匹配聊天名称 '{chat_name}' -> {processor_names}")
-        
-        # 去重并返回处理器实例
-        valid_processors = []
-        for name in processor_names:
-            if name in self.processors:
-                valid_processors.append(self.processors[name])
-            else:
-                logger.warning(f"处理器未注册: {name}")
+        valid_processors = self._get_routing()[1].get(chat_name, ())
         
         if not valid_processors:
             logger.info(f"没有找到匹配的处理器 for chat: {chat_name}")
-        
-        # 按照 priority 排序，大的在前面
-        valid_processors.sort(key=lambda processor: processor.priority(), reverse=True)
 
-        return valid_processors
+        return list(valid_processors)
+
+    def get_handlers(self, chat_name: str, msg_type: str) -> Tuple[Any, ...]:
+        """
+        获取某个聊天中某种消息类型的处理方法，已按处理器 priority 排序
+        """
+        matcher = self._get_routing()[2].get((chat_name, msg_type))
+        return matcher.handlers if matcher else ()
+
+    def match_handlers(self, chat_name: str, msg: Dict[str, Any]) -> Tuple[Any, ...]:
+        """
+        获取触发条件命中该消息的处理方法，已按处理器 priority 排序
+        """
+        matcher = self._get_routing()[2].get((chat_name, msg.get("msg_type")))
+        return matcher.match(msg) if matcher else ()
+
+    def classify_lane(self, chat_name: str, raw_msg: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        判断一条原始消息应该进入哪个处理通道，以及是否需要和同一聊天的其他消息按顺序处理
+
+        - 附件超过 LARGE_ATTACHMENT_BYTES 时走批量通道
+        - 命中的处理器通过 lane(msg_type) 声明通道，任一声明交互通道即走交互通道
+        - 都没有声明时按消息类型推断
+        - 默认按顺序处理；优先级最高的命中处理器通过 unordered(msg_type) 声明不依赖前面的消息时，
+          可以越过同一聊天排在前面的其他通道的批次
+
+        Returns:
+            tuple: (通道名称, 是否按顺序处理)
+        """
+        msg = self._extract_message(raw_msg)
+        if msg is None:
+            return INTERACTIVE_LANE, True
+
+        msg_type = msg["msg_type"]
+        handlers = self.match_handlers(chat_name, msg)
+        ordered = True
+        if handlers and hasattr(handlers[0].__self__, "unordered"):
+            ordered = not handlers[0].__self__.unordered(msg_type)
+
+        file_size = (raw_msg.get("file_info") or {}).get("size")
+        if isinstance(file_size, (int, float)) and file_size > LARGE_ATTACHMENT_BYTES:
+            return BULK_LANE, ordered
+
+        declared = set()
+        for handler in handlers:
+            processor = handler.__self__
+            if hasattr(processor, "lane"):
+                declared.add(processor.lane(msg_type))
+
+        if INTERACTIVE_LANE in declared:
+            return INTERACTIVE_LANE, ordered
+        if BULK_LANE in declared:
+            return BULK_LANE, ordered
+        return DEFAULT_MESSAGE_LANES.get(msg_type, BULK_LANE), ordered
+
+    def classify_intent(self, msg: Dict[str, Any], handlers: Tuple[Any, ...]):
+        """
+        合并这些处理器注册的命令，最多调用一次 DeepSeek 识别意图，
+        结果写入 msg["intent"]（没有识别到为 None）。
+        没有处理器注册命令时不设置 intent，处理器会回退到自己的识别逻辑。
+
+        Returns:
+            注册了识别到的命令的处理器，没有识别到返回 None
+        """
+        msg_type = msg.get("msg_type")
+        if msg_type not in ("text", "voice"):
+            return None
+
+        commands = {}
+        owners = {}
+        for handler in handlers:
+            processor = handler.__self__
+            if hasattr(processor, "intent_commands"):
+                processor_commands = processor.intent_commands(msg_type)
+                commands.update(processor_commands)
+                owners.update(dict.fromkeys(processor_commands, processor))
+        if not commands:
+            return None
+
+        content = str(msg.get(MESSAGE_HANDLERS[msg_type][2]) or "").replace(BOT_MENTION, "").strip()
+        msg["intent"] = self._intent_classifier.classify(content, commands)
+        return owners.get(msg["intent"])
     
     def extract_messages_by_type(self, message_batch: Dict[str, Any]) -> List:
         """
@@ -64,65 +333,75 @@ class ProcessRouter:
 
             logger.info(f"开始处理消息\n%s", json.dumps(msg, ensure_ascii=False,  indent=2))
 
-            msg_type = msg.get("type", "")
-            
-            if msg_type == "image" and msg.get("download_success") == True and msg.get("file_id") and msg.get("file_info"):
-                msglist.append({
-                    "msg_type" : "image",
-                    "chat_type": msg.get("chat_type"),
-                    "chat_name": msg.get("chat_name"),
-                    "file_id": msg.get("file_id"),
-                    "file_name": msg.get("file_info").get("filename"),
-                    "message_id": msg.get("id"),
-                    "content": msg.get("content", ""),
-                    "raw_message": msg
-                })
-            elif msg_type == "file" and msg.get("download_success") == True and msg.get("file_id") and msg.get("file_info"):
-                msglist.append({
-                    "msg_type" : "file",
-                    "chat_type": msg.get("chat_type"),
-                    "chat_name": msg.get("chat_name"),
-                    "file_id": msg.get("file_id"),
-                    "file_name": msg.get("file_info").get("filename"),
-                    "message_id": msg.get("id"),
-                    "content": msg.get("content", ""),
-                    "raw_message": msg
-                })
-                
-            elif msg_type == "voice" and msg.get("voice_convert_success") == True:
-                msglist.append({
-                    "msg_type" : "voice",
-                    "chat_type": msg.get("chat_type"),
-                    "chat_name": msg.get("chat_name"),
-                    "voice_text": msg.get("voice_to_text", ""),
-                    "message_id": msg.get("id"),
-                    "content": msg.get("content", ""),
-                    "raw_message": msg
-                })
-                
-            elif msg_type == "text":
-                msglist.append({
-                    "msg_type" : "text",
-                    "chat_type": msg.get("chat_type"),
-                    "chat_name": msg.get("chat_name"),
-                    "text_content": msg.get("content", ""),
-                    "message_id": msg.get("id"),
-                    "raw_message": msg
-                })
-
-            elif msg_type == "link" and msg.get("get_url_success") == True:
-                msglist.append({
-                    "msg_type" : "link",
-                    "chat_type": msg.get("chat_type"),
-                    "chat_name": msg.get("chat_name"),
-                    "text_content": msg.get("content", ""),
-                    "url": msg.get("url"),
-                    "message_id": msg.get("id"),
-                    "raw_message": msg
-                })
+            extracted = self._extract_message(msg)
+            if extracted:
+                msglist.append(extracted)
         
         return msglist
     
+    def _extract_message(self, msg: Dict[str, Any]):
+        """
+        把 wxauto 返回的原始消息转换为处理器使用的消息字典，不支持的消息返回 None
+        """
+        msg_type = msg.get("type", "")
+        
+        if msg_type == "image" and msg.get("download_success") == True and msg.get("file_id") and msg.get("file_info"):
+            return {
+                "msg_type" : "image",
+                "chat_type": msg.get("chat_type"),
+                "chat_name": msg.get("chat_name"),
+                "file_id": msg.get("file_id"),
+                "file_name": msg.get("file_info").get("filename"),
+                "message_id": msg.get("id"),
+                "content": msg.get("content", ""),
+                "raw_message": msg
+            }
+        elif msg_type == "file" and msg.get("download_success") == True and msg.get("file_id") and msg.get("file_info"):
+            return {
+                "msg_type" : "file",
+                "chat_type": msg.get("chat_type"),
+                "chat_name": msg.get("chat_name"),
+                "file_id": msg.get("file_id"),
+                "file_name": msg.get("file_info").get("filename"),
+                "message_id": msg.get("id"),
+                "content": msg.get("content", ""),
+                "raw_message": msg
+            }
+            
+        elif msg_type == "voice" and msg.get("voice_convert_success") == True:
+            return {
+                "msg_type" : "voice",
+                "chat_type": msg.get("chat_type"),
+                "chat_name": msg.get("chat_name"),
+                "voice_text": msg.get("voice_to_text", ""),
+                "message_id": msg.get("id"),
+                "content": msg.get("content", ""),
+                "raw_message": msg
+            }
+            
+        elif msg_type == "text":
+            return {
+                "msg_type" : "text",
+                "chat_type": msg.get("chat_type"),
+                "chat_name": msg.get("chat_name"),
+                "text_content": msg.get("content", ""),
+                "message_id": msg.get("id"),
+                "raw_message": msg
+            }
+
+        elif msg_type == "link" and msg.get("get_url_success") == True:
+            return {
+                "msg_type" : "link",
+                "chat_type": msg.get("chat_type"),
+                "chat_name": msg.get("chat_name"),
+                "text_content": msg.get("content", ""),
+                "url": msg.get("url"),
+                "message_id": msg.get("id"),
+                "raw_message": msg
+            }
+
+        return None
+
     def route_message_batch(self, message_batch: Dict[str, Any], wxauto_client) -> Dict[str, Any]:
         """
         路由消息批次到相应的处理器
@@ -136,58 +415,50 @@ class ProcessRouter:
         # 提取消息并按类型分类
         message_list = self.extract_messages_by_type(message_batch)
                 
-        # 处理图片消息
         for msg in message_list:
-            #logger.info(f"开始处理消息\n%s", json.dumps(msg["raw_message"], ensure_ascii=False, indent=2))
-            processors = self.get_processors_for_chat(chat_name)
-            for processor in processors:
-                if hasattr(processor, 'process_image') and msg.get('msg_type') == 'image':
-                    try:
-                        result = processor.process_image(msg, wxauto_client)
-                        if result:
-                            logger.info(f"{processor.__class__.__name__} 成功处理图片: {msg['text_content']}")
-                            break
-                    except Exception as e:
-                        logger.error(f"处理器 {processor.__class__.__name__} 处理图片错误: {str(e)}")
-        
-                if hasattr(processor, 'process_voice') and msg.get('msg_type') == 'voice':
-                    try:
-                        result = processor.process_voice(msg, wxauto_client)
-                        if result:
-                            logger.info(f"{processor.__class__.__name__} 成功处理语音: {msg['voice_text'][:50]}...")
-                            break
-                    except Exception as e:
-                        logger.error(f"处理器 {processor.__class__.__name__} 处理语音错误: {str(e)}")
-        
-                if hasattr(processor, 'process_text') and msg.get('msg_type') == 'text':
-                    try:
-                        result = processor.process_text(msg, wxauto_client)
-                        if result:
-                            logger.info(f"{processor.__class__.__name__} 成功处理文本: {msg['text_content'][:50]}...")
-                            break
-                    except Exception as e:
-                        logger.error(f"处理器 {processor.__class__.__name__} 处理文本错误: {str(e)}")
-
-                if hasattr(processor, 'process_file') and msg.get('msg_type') == 'file':
-                    try:
-                        result = processor.process_file(msg, wxauto_client)
-                        if result:
-                            logger.info(f"{processor.__class__.__name__} 成功处理文件: {msg['text_content']}")
-                            break   
-                    except Exception as e:
-                        logger.error(f"处理器 {processor.__class__.__name__} 处理文件错误: {str(e)}")   
-                
-                if hasattr(processor, 'process_url') and msg.get('msg_type') == 'link':
-                    try:
-                        result = processor.process_url(msg, wxauto_client)
-                        if result:
-                            logger.info(f"{processor.__class__.__name__} 成功链接: {msg['url']}")
-                            break   
-                    except Exception as e:
-                        logger.error(f"处理器 {processor.__class__.__name__} 处理链接错误: {str(e)}")   
+            msg_type = msg.get('msg_type')
+            _, type_name, summary_field = MESSAGE_HANDLERS[msg_type]
+            started_at = time.time()
+            handled_by = None
+            handlers = self.match_handlers(chat_name, msg)
+            classified = False
+            intent_owner = None
+            for index, handler in enumerate(handlers):
+                processor = handler.__self__
+                processor_name = processor.__class__.__name__
+                # 前面不需要意图的处理器已经处理掉的消息不调用 DeepSeek，
+                # 到第一个注册了命令的处理器时再为剩下的处理器识别一次
+                if not classified and hasattr(processor, "intent_commands"):
+                    classified = True
+                    intent_owner = self.classify_intent(msg, handlers[index:])
+                handler_started_at = time.time()
+                result = False
+                failed = False
+                try:
+                    result = handler(msg, wxauto_client)
+                    if result:
+                        summary = str(msg.get(summary_field) or "")[:50]
+                        logger.info(f"{processor_name} 成功处理{type_name}: {summary}")
+                except Exception as e:
+                    failed = True
+                    logger.error(f"处理器 {processor_name} 处理{type_name}错误: {str(e)}")
+                self._record(processor_name, time.time() - handler_started_at, bool(result), failed)
+                if result:
+                    handled_by = processor_name
+                    break
+                if processor is intent_owner:
+                    # 命令对应的处理器没有处理成功，不再当作命令，后面的处理器（如聊天）照常处理
+                    msg["intent"] = None
+                    intent_owner = None
+
+            for listener in self._listeners:
+                try:
+                    listener(chat_name, msg, handled_by, time.time() - started_at)
+                except Exception as e:
+                    logger.error(f"消息处理回调出错: {str(e)}")
         
-        # 清理文件
+        # 清理文件，由后台线程批量删除，不阻塞消息处理
         for msg in message_list:
             file_id = msg.get('file_id')
             if file_id:
-                wxauto_client.delete_file(file_id)
\ No newline at end of file
+                wxauto_client.delete_file_async(file_id)
\ No newline at end of file
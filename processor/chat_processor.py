@@ -3,6 +3,7 @@ import logging
 import time
 from datetime import datetime, timedelta
 from webapi.deepseek import DeepSeekAPI
+from message_dispatcher import BULK_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,17 @@ class ChatProcessor:
     
     def priority(self) -> int:
         return 0
+
+    def triggers(self) -> dict:
+        # 群聊中的文本需要 @机器人
+        return {
+            "text": {"mention": "group"},
+            "voice": {},
+        }
+
+    def lane(self, msg_type) -> str:
+        # DeepSeek 对话可能要几十秒，不能占用电视、定位等命令的交互线程
+        return BULK_LANE
     
     def process_voice(self, voice_msg, wxauto_client):
         """
@@ -40,6 +52,11 @@ class ChatProcessor:
             chat_name = voice_msg.get("chat_name")
             voice_text = voice_msg.get("voice_text")
             
+            # 已识别为其他处理器的命令，不作为对话处理；命令处理器没有处理成功时路由器会清除 intent
+            if voice_msg.get("intent"):
+                logger.info(f"voice message from {chat_name} recognized as command '{voice_msg.get('intent')}', skipping")
+                return False
+
             # 清理过期会话
             self._cleanup_expired_sessions()
             
@@ -75,6 +92,11 @@ class ChatProcessor:
                 if not "@呼噜一号" in text_content:
                     logger.info(f"text message from {chat_name}, not @bot skipping")
                     return False
+
+            # 已识别为其他处理器的命令，不作为对话处理；命令处理器没有处理成功时路由器会清除 intent
+            if text_msg.get("intent"):
+                logger.info(f"text message from {chat_name} recognized as command '{text_msg.get('intent')}', skipping")
+                return False
             
             # 清理过期会话
             self._cleanup_expired_sessions()
@@ -209,12 +231,13 @@ class ChatProcessor:
         current_time = time.time()
         expired_sessions = []
         
-        for chat_name, session in self.sessions.items():
+        # 不同聊天会在不同工作线程中并发处理，遍历快照
+        for chat_name, session in list(self.sessions.items()):
             time_diff = current_time - session["last_active"]
             if time_diff > self.session_timeout:
                 expired_sessions.append(chat_name)
         
         for chat_name in expired_sessions:
-            del self.sessions[chat_name]
+            self.sessions.pop(chat_name, None)
             logger.info(f"Cleaned up expired session for {chat_name}")
     
@@ -2,10 +2,9 @@
 import logging
 import json
 import os
-import shutil
-import tempfile
 from webapi.baidu_ocr import BaiduOCR
 from webapi.deepseek import DeepSeekAPI
+from message_dispatcher import BULK_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +21,9 @@ class HomeworkProcessor:
     def priority(self) -> int:
         return 10
 
+    def lane(self, msg_type) -> str:
+        return BULK_LANE
+
     def process_image(self, image_msg, wxauto_client):
         """
         处理图片消息 - 实现BaseProcessor接口
@@ -33,33 +35,35 @@ class HomeworkProcessor:
         Returns:
             bool: 处理成功返回True，失败返回False
         """
+        spill_path = None
         try:
             chat_name = image_msg.get("chat_name")
             file_name = image_msg.get("file_name")
             file_id = image_msg.get("file_id")
 
-            temp_dir = tempfile.mkdtemp()
-            file_path = os.path.join(temp_dir, file_name)
-
-            download_ret = wxauto_client.download_file(file_id, file_path)
+            # 图片直接下载到内存，只有超过阈值的大文件才会落盘
+            download_ret = wxauto_client.download_bytes(file_id)
             
             #{"success": False, "error": error_msg}
             if not download_ret.get('success'):
-                logger.error(f"Download failed for {file_path}: {download_ret.get('error')}")
+                logger.error(f"Download failed for {file_name}: {download_ret.get('error')}")
                 self._send_error_response(wxauto_client, chat_name, f"图片下载失败: {download_ret.get('error', '未知错误')}")
                 return False
+
+            spill_path = download_ret.get('file_path')
+            image = download_ret.get('data') if download_ret.get('data') is not None else spill_path
             
-            logger.info(f"HomeworkProcessor processing image from {chat_name}: {file_path}")
+            logger.info(f"HomeworkProcessor processing image from {chat_name}: {file_name}")
             
             # 使用百度OCR处理图片
-            ocr_result = self._ocr.recognize_handwriting(file_path)
+            ocr_result = self._ocr.recognize_handwriting(image)
             
             if not ocr_result.get('success'):
-                logger.error(f"OCR failed for {file_path}: {ocr_result.get('error')}")
+                logger.error(f"OCR failed for {file_name}: {ocr_result.get('error')}")
                 self._send_error_response(wxauto_client, chat_name, f"图片识别失败: {ocr_result.get('error', '未知错误')}")
                 return False
             
-            logger.info(f"OCR successful for {file_path}, found {len(ocr_result['results'])} text items")
+            logger.info(f"OCR successful for {file_name}, found {len(ocr_result['results'])} text items")
             
             # 提取所有文本
             all_text = " ".join([item['text'] for item in ocr_result['results']])
@@ -86,13 +90,13 @@ class HomeworkProcessor:
             return False
 
         finally:
-            # 确保清理临时目录
-            if temp_dir and os.path.exists(temp_dir):
+            # 大文件下载时落盘的临时文件
+            if spill_path and os.path.exists(spill_path):
                 try:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    logger.info(f"Cleaned up temporary directory: {temp_dir}")
+                    os.remove(spill_path)
+                    logger.info(f"Cleaned up temporary file: {spill_path}")
                 except Exception as e:
-                    logger.warning(f"Failed to clean up temp directory {temp_dir}: {e}")
+                    logger.warning(f"Failed to clean up temp file {spill_path}: {e}")
 
             
     def _organize_ocr_with_deepseek(self, ocr_results):
@@ -4,6 +4,7 @@ import os
 import subprocess
 import shutil
 import tempfile
+from message_dispatcher import BULK_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,9 @@ class LicenseProcessor:
     
     def priority(self) -> int:
         return 10
+
+    def lane(self, msg_type) -> str:
+        return BULK_LANE
     
     def process_file(self, file_msg, wxauto_client=None):
         """
@@ -1,13 +1,15 @@
 # cmd_processor.py
 import logging
-import uuid
-import os
 from webapi.deepseek import DeepSeekAPI
 from webapi.amap import AmapAPI
 from device.qb_location import QBLocation
+from message_dispatcher import INTERACTIVE_LANE
 
 logger = logging.getLogger(__name__)
 
+# 注册到统一意图识别中的命令
+LOCATION_COMMAND = "查询乔宝位置"
+
 class LocationProcessor:
     def __init__(self, env_file=".env"):
         self._deepseek = DeepSeekAPI(env_file)
@@ -23,6 +25,24 @@ class LocationProcessor:
     def priority(self) -> int:
         return 10
 
+    def triggers(self) -> dict:
+        # 必须 @机器人，且提到乔宝、定位或询问位置、在做什么时才调用 DeepSeek 判断意图
+        return {
+            "text": {"mention": "always", "patterns": [r"乔|煜|位置|定位|哪|干嘛|干什么|做什么|在干|在做"]},
+        }
+
+    def lane(self, msg_type) -> str:
+        return INTERACTIVE_LANE
+
+    def unordered(self, msg_type) -> bool:
+        # 定位查询不依赖同一聊天前面的消息，不用等排在前面的文档和图片
+        return True
+
+    def intent_commands(self, msg_type) -> dict:
+        if msg_type == "text":
+            return {LOCATION_COMMAND: "询问乔宝、煜乔或王煜乔当前的位置"}
+        return {}
+
     def process_text(self, text_msg, wxauto_client):
         """
         处理文本消息 - 使用DeepSeek识别文本中的命令意图
@@ -46,8 +66,11 @@ class LocationProcessor:
             processed_content = text_content.replace("@呼噜一号", "").strip()
             logger.info(f"Removed '@呼噜一号' from message, processed content: {processed_content}")
         
-            # 使用处理后的内容判断命令意图
-            is_command = self._recognize_command_intent(processed_content)
+            # 优先使用路由器统一识别的意图，否则自己调用DeepSeek判断
+            if "intent" in text_msg:
+                is_command = text_msg.get("intent") == LOCATION_COMMAND
+            else:
+                is_command = self._recognize_command_intent(processed_content)
 
             if is_command:
                 self._get_qb_location(chat_name, wxauto_client)
@@ -116,19 +139,15 @@ class LocationProcessor:
             address = location['address']
             wxauto_client.send_text_message(chat_name, f"乔宝位置：{address}")
 
-            save_path = "/output/wechat_downloads/" + str(uuid.uuid4()) + ".png"
-
-            # 使用字典键访问经纬度
+            # 使用字典键访问经纬度，地图图片直接从内存上传
             gcj02_location = location['gcj02_location']
-            self._amap_api.get_amap_static_image(
+            image_data = self._amap_api.get_amap_static_image_bytes(
                 longitude=gcj02_location['longitude'],
-                latitude=gcj02_location['latitude'],
-                save_path=save_path
+                latitude=gcj02_location['latitude']
             )
             
-            wxauto_client.send_file_message(chat_name, save_path)
-
-            os.remove(save_path)
+            if image_data:
+                wxauto_client.send_file_message(chat_name, content=image_data, filename="qb_location.png")
         else:
             self._send_error_response(wxauto_client, chat_name, "没有获取到位置信息")
             
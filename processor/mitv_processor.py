@@ -1,9 +1,11 @@
 # cmd_processor.py
+import re
 import logging
 import json
 import time
 from pathlib import Path
 from webapi.deepseek import DeepSeekAPI
+from message_dispatcher import INTERACTIVE_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,26 @@ class MitvProcessor:
     def priority(self) -> int:
         return 10
 
+    def triggers(self) -> dict:
+        # 文本只做精确匹配，语音提到电视时才调用 DeepSeek 识别命令
+        return {
+            "text": {"patterns": [r"^\s*(?:" + "|".join(map(re.escape, self._cmd_list)) + r")\s*$"]},
+            "voice": {"patterns": [r"电视"]},
+        }
+
+    def lane(self, msg_type) -> str:
+        return INTERACTIVE_LANE
+
+    def unordered(self, msg_type) -> bool:
+        # 电视命令不依赖同一聊天前面的消息，不用等排在前面的文档和图片
+        return True
+
+    def intent_commands(self, msg_type) -> dict:
+        # 文本只做精确匹配，只有语音需要识别意图
+        if msg_type == "voice":
+            return {cmd: f"{cmd}（控制小米电视）" for cmd in self._cmd_list}
+        return {}
+
     def process_voice(self, voice_msg, wxauto_client):
         """
         处理语音消息 - 使用DeepSeek识别语音中的命令意图
@@ -44,10 +66,13 @@ class MitvProcessor:
             
             logger.info(f"MitvProcessor processing voice from {chat_name}: {voice_text[:50]}...")
             
-            # 使用DeepSeek识别命令意图
-            command = self._recognize_command_intent(voice_text)
+            # 优先使用路由器统一识别的意图，否则自己调用DeepSeek识别
+            if "intent" in voice_msg:
+                command = voice_msg.get("intent")
+            else:
+                command = self._recognize_command_intent(voice_text)
             
-            if command:
+            if command in self._cmd_list:
                 # 执行识别到的命令
                 return self._execute_command(command, chat_name, wxauto_client)
             else:
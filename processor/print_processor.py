@@ -12,6 +12,7 @@ from utils.file_recognize import FileRecognizer
 from utils.image_binarize import ImageBinarrize
 from config import ConfigManager
 from device.print import Printer
+from message_dispatcher import BULK_LANE, INTERACTIVE_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +21,7 @@ class PrintProcessor:
         self._converter = FileConverter()
         self._printer = Printer(env_file)
         self._file_recognize = FileRecognizer()
-        self._photograph_print = False
         self._config_manager = ConfigManager(env_file)
-        self._load_config()
         self.processor_name = "print_processor"
         logger.info(f"PrintProcessor initialized")
     
@@ -31,12 +30,26 @@ class PrintProcessor:
     
     def priority(self) -> int:
         return 10
+
+    def triggers(self) -> dict:
+        return {
+            "text": {"mention": "group", "patterns": [r"^\s*(?:开启照片打印功能|关闭照片打印功能|显示配置)\s*$"]},
+            "image": {},
+            "file": {},
+        }
+
+    def lane(self, msg_type) -> str:
+        # 配置命令立即响应，文档转换和打印走批量通道
+        return INTERACTIVE_LANE if msg_type == "text" else BULK_LANE
     
-    def _save_config(self):
-        self._config_manager.put_value("printer_processor.photograph_print", str(self._photograph_print))
+    @property
+    def _photograph_print(self) -> bool:
+        # 配置项从 ConfigManager 的内存缓存读取，每条消息都读一次也没有数据库开销
+        return self._config_manager.get_value("printer_processor.photograph_print") == "True"
 
-    def _load_config(self):
-        self._photograph_print = self._config_manager.get_value("printer_processor.photograph_print") == "True"
+    @_photograph_print.setter
+    def _photograph_print(self, enabled: bool):
+        self._config_manager.put_value("printer_processor.photograph_print", str(enabled))
 
     def process_text(self, text_msg, wxauto_client):
         """
@@ -64,12 +77,10 @@ class PrintProcessor:
 
         if text_content == "开启照片打印功能":
             self._photograph_print = True
-            self._save_config()
             wxauto_client.send_text_message(who=chat_name, msg=f"照片打印功能已开启")
             return True
         elif text_content == "关闭照片打印功能":
             self._photograph_print = False
-            self._save_config()
             wxauto_client.send_text_message(who=chat_name, msg=f"照片打印功能已关闭")
             return True
         elif text_content == "显示配置":
@@ -95,28 +106,30 @@ class PrintProcessor:
             file_id = image_msg.get("file_id")
 
             temp_dir = tempfile.mkdtemp()
-            file_path = os.path.join(temp_dir, file_name)
-            binarize_file_path = os.path.join(temp_dir, "binarize_" + file_name)
+            name, ext = os.path.splitext(file_name)
 
-            download_ret = wxauto_client.download_file(file_id, file_path)
+            # 图片在内存中处理，只有生成的PDF需要落盘交给打印机；超过阈值的大图才会落盘到临时目录
+            download_ret = wxauto_client.download_bytes(file_id, spill_dir=temp_dir)
             
             #{"success": False, "error": error_msg}
             if not download_ret.get('success'):
-                logger.error(f"Download failed for {file_path}: {download_ret.get('error')}")
+                logger.error(f"Download failed for {file_name}: {download_ret.get('error')}")
                 self._send_error_response(wxauto_client, chat_name, f"图片下载失败: {download_ret.get('error', '未知错误')}")
                 return False
+
+            image = download_ret.get('data') if download_ret.get('data') is not None else download_ret.get('file_path')
             
-            logger.info(f"PrintProcessor processing image from {chat_name}: {file_path}")
+            logger.info(f"PrintProcessor processing image from {chat_name}: {file_name}")
 
             if self._photograph_print:
+                if not isinstance(image, bytes):
+                    with open(image, "rb") as f:
+                        image = f.read()
                 image_binarize = ImageBinarrize()
-                image_binarize.process_image(input_path=file_path, output_path=binarize_file_path)
-            else:
-                shutil.copy(file_path, binarize_file_path)
-
-            logger.info(f"PrintProcessor processing image binarize {chat_name}: {binarize_file_path}")
+                image = image_binarize.process_image_data(image, ext=ext or ".png")
+                logger.info(f"PrintProcessor processing image binarize {chat_name}: {file_name}")
 
-            pdf_path = self._converter.convert_image_to_pdf(binarize_file_path, output_dir=temp_dir)
+            pdf_path = self._converter.convert_image_to_pdf(image, output_dir=temp_dir, output_name=name)
 
             ret, job_id = self._printer.print_pdf(pdf_path)
 
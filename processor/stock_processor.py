@@ -1,15 +1,14 @@
 # homework.py
 import logging
-import os
 import base64
 import requests
 import re
-import tempfile
 import random
 from datetime import datetime, timedelta
 from webapi.tencent_stock import TencentStockAPI
 from webapi.deepseek import DeepSeekAPI
 from utils.stock_tools import StockTools
+from message_dispatcher import BULK_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +23,21 @@ class StockProcessor:
     
     def priority(self) -> int:
         return 20
+
+    def triggers(self) -> dict:
+        # 6位股票代码，或者带"股票"前缀的名称；@机器人 时也可以直接发简短的股票名称
+        # 其他闲聊不会走到这里，不会为每条消息都去查一次股票代码
+        return {
+            "text": {
+                "mention": "group",
+                "patterns": [r"^\s*\d{6}\s*$", r"^\s*股票\s*[\u4e00-\u9fa5A-Za-z0-9*]{2,8}\s*$"],
+                "mentioned_patterns": [r"^[\u4e00-\u9fa5A-Za-z0-9*\s]{2,12}$"],
+            },
+        }
+
+    def lane(self, msg_type) -> str:
+        # 预测、生成点评和图表都比较耗时
+        return BULK_LANE
     
     def _get_predict_date(self):
         """
@@ -56,7 +70,7 @@ class StockProcessor:
             if response:
                 response = response.strip()
                 logger.info(f"DeepSeek explain: '{response}'")
-                wxauto_client.send_text_message(who=chat_name, msg=response)
+                wxauto_client.send_text_message_async(who=chat_name, msg=response)
             else:
                 logger.error("DeepSeek API returned no explain")
                 return
@@ -159,6 +173,8 @@ class StockProcessor:
                 text_content = text_content.replace(" ", "")
                 text_content = text_content.strip()
 
+            # 去掉私聊中的 @呼噜一号 和"股票"前缀
+            text_content = re.sub(r"^\s*股票\s*", "", text_content.replace("@呼噜一号", "")).strip()
 
             # 检查text_content是否为6位数字
             if re.match(r'^\d{6}$', str(text_content)):
@@ -186,7 +202,7 @@ class StockProcessor:
 
             # 使用示例
             msg = self._get_internet_slang_msg(stock_name, stock_code, predict_date)
-            wxauto_client.send_text_message(who=chat_name, msg=msg)
+            wxauto_client.send_text_message_async(who=chat_name, msg=msg)
             
             # 构建预测请求
             predict_data = {
@@ -256,49 +272,30 @@ class StockProcessor:
        
     def _send_chart_image(self, wxauto_client, chat_name, chart_image_base64):
         """
-        发送图表图片 - 使用tempfile确保文件清理
+        发送图表图片 - 解码后直接从内存上传，不写临时文件
         """
         if not chart_image_base64 or not wxauto_client or not chat_name:
             return False
         
-        temp_file = None
         try:
             # 解码base64图片
             image_data = base64.b64decode(chart_image_base64)
             
-            # 创建临时文件 - 自动清理
-            with tempfile.NamedTemporaryFile(
-                suffix='.png', 
-                prefix='stock_chart_',
-                delete=False  # 先不自动删除，等发送完再删
-            ) as temp_file:
-                # 写入图片数据
-                temp_file.write(image_data)
-                temp_file.flush()  # 确保数据写入磁盘
-                temp_file_path = temp_file.name
-            
-            # 发送图片文件
-            send_result = wxauto_client.send_file_message(
+            # 发送图片
+            send_handle = wxauto_client.send_file_message_async(
                 who=chat_name,
-                file_path=temp_file_path,
+                content=image_data,
+                filename="stock_chart.png",
                 exact=True,
                 description="股票价格预测图表",
                 uploader="stock_processor"
             )
             
-            return send_result
+            return send_handle
             
         except Exception as e:
             logger.error(f"发送图表图片失败：{str(e)}")
             return False
-        
-        finally:
-            # 无论成功失败，都清理临时文件
-            if temp_file and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)  # 删除临时文件
-                except Exception as e:
-                    logger.error(f"清理临时文件失败：{str(e)}")
 
     def _send_error_response(self, wxauto_client, chat_name, error_message):
         """
@@ -311,7 +308,7 @@ class StockProcessor:
         """
         if wxauto_client and chat_name:
             try:
-                wxauto_client.send_text_message(who=chat_name, msg=error_message)
+                wxauto_client.send_text_message_async(who=chat_name, msg=error_message)
             except Exception as e:
                 logger.error(f"Failed to send error response: {str(e)}")
   
\ No newline at end of file
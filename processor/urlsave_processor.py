@@ -8,6 +8,7 @@ import tempfile
 import threading
 import time
 from utils.fixed_web_converter import FixedWebConverter
+from message_dispatcher import BULK_LANE
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,9 @@ class UrlSaveProcessor:
     
     def priority(self) -> int:
         return 10
+
+    def lane(self, msg_type) -> str:
+        return BULK_LANE
         
     def process_url(self, link_msg, wxauto_client):
         """
@@ -39,15 +43,16 @@ class UrlSaveProcessor:
 
             temp_dir = tempfile.mkdtemp()
 
-            wxauto_client.send_text_message(who=chat_name, msg=f"开始转换网页链接...")
+            # 通过发送队列异步发送，同一聊天内保持顺序
+            wxauto_client.send_text_message_async(who=chat_name, msg=f"开始转换网页链接...")
 
             converter = FixedWebConverter()
 
             docx_name = converter.convert_url_to_docx(url, temp_dir)
 
             if os.path.exists(docx_name):
-                wxauto_client.send_file_message(who=chat_name, file_path=docx_name)
-                wxauto_client.send_text_message(who=chat_name, msg=f"网页链接转换完成...")
+                wxauto_client.send_file_message_async(who=chat_name, file_path=docx_name, delete_after=True)
+                wxauto_client.send_text_message_async(who=chat_name, msg=f"网页链接转换完成...")
             else:
                 self._send_error_response(wxauto_client, chat_name, "转化docx文件失败，请检查链接是否正确")
                             
@@ -67,7 +72,7 @@ class UrlSaveProcessor:
         """
         if wxauto_client and chat_name:
             try:
-                wxauto_client.send_text_message(who=chat_name, msg=error_message)
+                wxauto_client.send_text_message_async(who=chat_name, msg=error_message)
             except Exception as e:
                 logger.error(f"Failed to send error response: {str(e)}")
   
\ No newline at end of file
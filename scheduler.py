@@ -0,0 +1,278 @@
+# scheduler.py
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 最长睡眠时间（秒），系统时间被调整后最多这么久就能重新按墙上时间计算
+MAX_WAIT = 60
+
+class IntervalSchedule:
+    """固定间隔：上次运行后 seconds 秒再运行"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_fire(self, last_run: Optional[float], now: float) -> float:
+        if last_run is None:
+            return now + self.seconds
+        # 间隔被调短时，已经超过新间隔的立即运行
+        return max(now, last_run + self.seconds)
+
+    def __repr__(self):
+        return f"IntervalSchedule({self.seconds})"
+
+class DailySchedule:
+    """每天固定时间运行"""
+
+    def __init__(self, hour: int, minute: int = 0):
+        self.hour = hour
+        self.minute = minute
+
+    def next_fire(self, last_run: Optional[float], now: float) -> float:
+        current = datetime.fromtimestamp(now)
+        candidate = current.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if candidate.timestamp() <= now:
+            candidate += timedelta(days=1)
+        return candidate.timestamp()
+
+    def __repr__(self):
+        return f"DailySchedule({self.hour:02d}:{self.minute:02d})"
+
+class AtSchedule:
+    """
+    在指定的时间点运行，由任务自己维护下一个时间点（例如按数据计算出的最早到期时间）
+
+    when 为 None 时表示暂时没有要做的事，idle 秒后再检查一次。
+    距上次运行不足 min_gap 秒时推迟，避免任务还没处理完到期的数据时被反复调度。
+    """
+
+    def __init__(self, when: Optional[float], min_gap: float = 1.0, idle: float = 3600):
+        self.when = when
+        self.min_gap = min_gap
+        self.idle = idle
+
+    def next_fire(self, last_run: Optional[float], now: float) -> float:
+        if self.when is None:
+            return now + self.idle
+        next_fire = self.when
+        if last_run is not None:
+            next_fire = max(next_fire, last_run + self.min_gap)
+        return max(next_fire, now)
+
+    def __repr__(self):
+        if self.when is None:
+            return "AtSchedule(None)"
+        return f"AtSchedule({datetime.fromtimestamp(self.when).strftime('%Y-%m-%d %H:%M:%S')})"
+
+class CronSchedule:
+    """
+    类似 crontab 的分钟级计划
+
+    每个字段支持 "*"、"5"、"1,15"、"9-17"、"*/10"、"0-30/5"，也可以直接传 int。
+    weekday 取 0-6，0 表示周日。day 和 weekday 都有限制时，和 crontab 一样满足其一即可。
+    """
+
+    def __init__(self, minute: Union[str, int] = "*", hour: Union[str, int] = "*", day: Union[str, int] = "*",
+                 month: Union[str, int] = "*", weekday: Union[str, int] = "*"):
+        self._spec = (minute, hour, day, month, weekday)
+        self._minutes = self._parse(minute, 0, 59)
+        self._hours = self._parse(hour, 0, 23)
+        self._days = self._parse(day, 1, 31)
+        self._months = self._parse(month, 1, 12)
+        self._weekdays = {value % 7 for value in self._parse(weekday, 0, 7)}
+        self._any_day = str(day) == "*"
+        self._any_weekday = str(weekday) == "*"
+
+    @staticmethod
+    def _parse(field: Union[str, int], low: int, high: int) -> frozenset:
+        values = set()
+        for part in str(field).split(","):
+            part = part.strip()
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"无效的计划字段: {field}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, current: datetime) -> bool:
+        day_ok = current.day in self._days
+        weekday_ok = (current.weekday() + 1) % 7 in self._weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_fire(self, last_run: Optional[float], now: float) -> float:
+        current = datetime.fromtimestamp(now).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # 按月、日、小时逐级跳过不匹配的区间，最多查找 5 年
+        limit = current + timedelta(days=366 * 5)
+        while current < limit:
+            if current.month not in self._months:
+                current = (current.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if current.hour not in self._hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+                continue
+            if current.minute not in self._minutes:
+                current += timedelta(minutes=1)
+                continue
+            return current.timestamp()
+        raise ValueError(f"计划 {self!r} 没有可以运行的时间")
+
+    def __repr__(self):
+        return f"CronSchedule({' '.join(str(field) for field in self._spec)})"
+
+class Scheduler:
+    """
+    基于最小堆的定时任务调度器
+
+    堆中保存每个任务的下次运行时间，调度线程在条件变量上睡到最早的时间点，
+    或者被 reschedule/run_now 提前唤醒，不再每秒轮询所有任务。
+    任务在调度线程中依次执行。schedule 可以是计划对象，也可以是返回计划对象的函数，
+    后者每次计算下次运行时间时都会重新调用，任务自己调整间隔后 reschedule 即可生效。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []   # [(下次运行时间, 序号, name)]
+        self._jobs = {}   # {name: {"func", "schedule", "next_fire", "last_run", "runs", "errors"}}
+        self._seq = 0
+        self._running = False
+
+    def _schedule_of(self, job):
+        schedule = job["schedule"]
+        return schedule() if callable(schedule) else schedule
+
+    def _push(self, name: str, next_fire: float):
+        """调用方持有 self._cond"""
+        job = self._jobs[name]
+        job["next_fire"] = next_fire
+        self._seq += 1
+        heapq.heappush(self._heap, (next_fire, self._seq, name))
+        self._cond.notify()
+
+    def add(self, name: str, func: Callable[[], Any], schedule):
+        """
+        添加任务
+
+        Args:
+            name (str): 任务名称
+            func: 任务函数，无参数
+            schedule: IntervalSchedule/DailySchedule/CronSchedule，或者返回它们的函数
+        """
+        with self._cond:
+            job = {"func": func, "schedule": schedule, "next_fire": None, "last_run": None, "runs": 0, "errors": 0}
+            self._jobs[name] = job
+            self._push(name, self._schedule_of(job).next_fire(None, time.time()))
+            logger.info(f"定时任务 {name} 已添加，计划 {self._schedule_of(job)!r}，"
+                        f"下次运行 {datetime.fromtimestamp(job['next_fire']).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    def remove(self, name: str):
+        """删除任务，堆中残留的条目在弹出时丢弃"""
+        with self._cond:
+            self._jobs.pop(name, None)
+
+    def reschedule(self, name: str):
+        """按任务当前的计划重新计算下次运行时间"""
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                return
+            self._push(name, self._schedule_of(job).next_fire(job["last_run"], time.time()))
+
+    def run_now(self, name: str):
+        """让任务尽快运行一次"""
+        with self._cond:
+            if name in self._jobs:
+                self._push(name, time.time())
+
+    def _pop_due(self) -> Optional[str]:
+        """睡到最早的任务到期并弹出它，停止时返回 None"""
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self._cond.wait(MAX_WAIT)
+                    continue
+                next_fire, _, name = self._heap[0]
+                job = self._jobs.get(name)
+                # 任务已删除或已被重新计划，丢弃过期的条目
+                if job is None or job["next_fire"] != next_fire:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = next_fire - time.time()
+                if delay > 0:
+                    self._cond.wait(min(delay, MAX_WAIT))
+                    continue
+                heapq.heappop(self._heap)
+                job["next_fire"] = None
+                return name
+            return None
+
+    def run(self):
+        """在当前线程中运行调度循环，直到 stop()"""
+        with self._cond:
+            self._running = True
+        while True:
+            name = self._pop_due()
+            if name is None:
+                break
+            with self._cond:
+                job = self._jobs.get(name)
+            if job is None:
+                continue
+
+            started_at = time.time()
+            try:
+                job["func"]()
+            except Exception as e:
+                job["errors"] += 1
+                logger.error(f"定时任务 {name} 出错: {e}")
+
+            with self._cond:
+                job["last_run"] = started_at
+                job["runs"] += 1
+                # 运行期间被 run_now/reschedule 过的任务已经有了新的运行时间
+                if self._jobs.get(name) is job and job["next_fire"] is None:
+                    try:
+                        self._push(name, self._schedule_of(job).next_fire(started_at, time.time()))
+                    except Exception as e:
+                        logger.error(f"定时任务 {name} 计算下次运行时间失败，已停止: {e}")
+
+    def stop(self):
+        """停止调度循环"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取每个任务的计划和运行次数"""
+        with self._cond:
+            return {
+                name: {
+                    "schedule": repr(self._schedule_of(job)),
+                    "next_fire": job["next_fire"],
+                    "last_run": job["last_run"],
+                    "runs": job["runs"],
+                    "errors": job["errors"],
+                }
+                for name, job in self._jobs.items()
+            }
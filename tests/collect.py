@@ -0,0 +1,13 @@
+# collect.py
+import os
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collect_directory(path, parent):
+    # 项目根目录有 __init__.py，当作包收集会导入整个机器人，这里只当作普通目录
+    if str(path) == ROOT_DIR:
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
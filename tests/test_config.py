@@ -0,0 +1,36 @@
+# test_config.py
+import pytest
+
+from config import ConfigManager
+
+@pytest.fixture
+def open_config(tmp_path, monkeypatch):
+    def open_config(name: str) -> ConfigManager:
+        monkeypatch.setenv("SQLLITE_DB_PATH", str(tmp_path / name))
+        config_manager = ConfigManager(str(tmp_path / ".env"))
+        config_manager.init_table()
+        return config_manager
+    return open_config
+
+def test_caches_are_per_database(open_config):
+    live = open_config("live.db")
+    bench = open_config("bench.db")
+
+    live.put_value("printer_processor.photograph_print", "True")
+    live.add_chatname("家庭群")
+    bench.add_chatname("压测群")
+
+    assert bench.get_value("printer_processor.photograph_print") == ""
+    assert live.get_value("printer_processor.photograph_print") == "True"
+    assert list(live.get_routing_table()[1]) == ["家庭群"]
+    assert list(bench.get_routing_table()[1]) == ["压测群"]
+
+def test_value_subscribers_are_per_database(open_config):
+    live = open_config("live.db")
+    bench = open_config("bench.db")
+    changes = []
+    live.subscribe_value(lambda key, value: changes.append((key, value)))
+
+    bench.put_value("mode", "bench")
+    live.put_value("mode", "live")
+    assert changes == [("mode", "live")]
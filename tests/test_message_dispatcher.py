@@ -0,0 +1,53 @@
+# test_message_dispatcher.py
+import threading
+
+import pytest
+
+from message_dispatcher import BULK_LANE, INTERACTIVE_LANE, ChatDispatcher
+
+@pytest.fixture
+def blocking_dispatcher():
+    release = threading.Event()
+    started = {}
+
+    def handler(batch):
+        started[batch["name"]].set()
+        if batch.get("block"):
+            release.wait(5)
+
+    dispatcher = ChatDispatcher(handler)
+
+    def submit(name, lane, block=False, ordered=True):
+        started[name] = threading.Event()
+        assert dispatcher.submit("家庭群", {"name": name, "block": block}, lane=lane, ordered=ordered)
+        return started[name]
+
+    yield submit, release
+    release.set()
+    dispatcher.shutdown()
+
+def test_unordered_batch_skips_bulk_work_in_same_chat(blocking_dispatcher):
+    submit, release = blocking_dispatcher
+    assert submit("ocr", BULK_LANE, block=True).wait(1)
+
+    # 同一聊天的 OCR 还在处理，声明了 unordered 的命令不用等它
+    assert submit("打开电视", INTERACTIVE_LANE, ordered=False).wait(1)
+    release.set()
+
+def test_ordered_batch_waits_for_other_lane_in_same_chat(blocking_dispatcher):
+    submit, release = blocking_dispatcher
+    assert submit("file", BULK_LANE, block=True).wait(1)
+    text_started = submit("text", INTERACTIVE_LANE)
+
+    assert not text_started.wait(0.2)
+    release.set()
+    assert text_started.wait(1)
+
+def test_same_lane_keeps_submission_order(blocking_dispatcher):
+    submit, release = blocking_dispatcher
+    assert submit("ocr", BULK_LANE, block=True).wait(1)
+    docx_started = submit("docx", BULK_LANE)
+
+    assert not docx_started.wait(0.2)
+    release.set()
+    assert docx_started.wait(1)
@@ -0,0 +1,38 @@
+# test_message_inbox.py
+import pytest
+
+from db.sqlite import MessageInbox, SQLiteDatabase
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLLITE_DB_PATH", str(tmp_path / "bot.db"))
+    return str(tmp_path / ".env")
+
+def batch(*ids):
+    return {"chat_name": "家庭群", "chat_type": "group", "messages": [{"id": msg_id} for msg_id in ids]}
+
+def test_inbox_writes_join_the_outer_transaction(env_file):
+    inbox = MessageInbox(env_file)
+    db = SQLiteDatabase(env_file)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            inbox.append_batch(batch("m1"))
+            raise RuntimeError("rollback")
+    assert inbox.pending_batches() == []
+
+    inbox.append_batch(batch("m1", "m2"))
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            inbox.mark_done(["m1"])
+            inbox.discard(["m2"])
+            inbox.prune()
+            raise RuntimeError("rollback")
+    assert [msg["id"] for msg in inbox.pending_batches()[0]["messages"]] == ["m1", "m2"]
+
+def test_duplicates_are_ignored(env_file):
+    inbox = MessageInbox(env_file)
+    assert len(inbox.append_batch(batch("m1", "m2"))) == 2
+    assert [msg["id"] for msg in inbox.append_batch(batch("m2", "m3"))] == ["m3"]
+    inbox.mark_done(["m1", "m2"])
+    assert [msg["id"] for msg in inbox.pending_batches()[0]["messages"]] == ["m3"]
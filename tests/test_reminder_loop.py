@@ -0,0 +1,151 @@
+# test_reminder_loop.py
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from config import ConfigManager
+from detector import reminder_loop
+import detector_loop
+from detector_loop import DetectorLoop
+from detector.reminder_loop import ReminderLoop, _day_matches, next_fire_time
+
+def lunar(**fields):
+    return {"calendar_type": "lunar", "hour": 9, "minute": 0, **fields}
+
+def solar(**fields):
+    return {"calendar_type": "solar", "hour": 8, "minute": 0, **fields}
+
+# next_fire_time
+
+def test_solar_daily():
+    assert next_fire_time(solar(), datetime(2026, 10, 1, 7, 0)) == datetime(2026, 10, 1, 8, 0)
+    assert next_fire_time(solar(), datetime(2026, 10, 1, 8, 0)) == datetime(2026, 10, 2, 8, 0)
+
+def test_disabled_reminder_never_fires():
+    assert next_fire_time(solar(enabled=False), datetime(2026, 10, 1)) is None
+
+def test_solar_year_is_honoured():
+    reminder = solar(year=2025, month=1, day=1)
+    assert next_fire_time(reminder, datetime(2024, 6, 1)) == datetime(2025, 1, 1, 8, 0)
+    assert next_fire_time(reminder, datetime(2025, 6, 1)) is None
+
+def test_lunar_year_is_honoured():
+    # 农历 2024 年正月初一是公历 2024-02-10
+    reminder = lunar(year=2024, month=1, day=1)
+    assert next_fire_time(reminder, datetime(2024, 1, 1)) == datetime(2024, 2, 10, 9, 0)
+    assert next_fire_time(reminder, datetime(2024, 3, 1)) is None
+
+def test_lunar_day_30_looks_ahead_several_years():
+    # 农历四月 2024、2025、2026 年都是小月，下一个四月三十在 2027 年
+    assert next_fire_time(lunar(month=4, day=30), datetime(2024, 1, 1)) == datetime(2027, 6, 4, 9, 0)
+
+def test_lunar_day_30_beyond_lookahead():
+    # 农历八月 2025 到 2028 年都没有三十
+    assert next_fire_time(lunar(month=8, day=30), datetime(2024, 12, 1)) is None
+
+def test_lunar_fixed_month_skips_leap_month():
+    # 2023 年有闰二月，闰二月十五是公历 2023-04-05，指定二月的提醒不在闰月重复
+    assert next_fire_time(lunar(month=2, day=15), datetime(2023, 3, 8)) == datetime(2024, 3, 24, 9, 0)
+    assert not _day_matches(lunar(month=2, day=15), date(2023, 4, 5))
+
+def test_lunar_monthly_fires_in_leap_month():
+    assert next_fire_time(lunar(day=15), datetime(2023, 3, 8)) == datetime(2023, 4, 5, 9, 0)
+
+# ReminderLoop
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    def send_text_message(self, who, msg):
+        self.sent.append((who, msg))
+
+@pytest.fixture
+def loop(monkeypatch):
+    monkeypatch.setattr(ConfigManager, "_reminder_subscribers", [])
+    reminder_loop_instance = ReminderLoop(FakeClient())
+    reminder_loop_instance._loaded = True
+    return reminder_loop_instance
+
+def index(loop, reminder, after):
+    with loop._lock:
+        loop._index(reminder, after)
+
+def run_at(loop, monkeypatch, now):
+    monkeypatch.setattr(reminder_loop, "time", SimpleNamespace(time=lambda: now.timestamp()))
+    loop.process_loop(None)
+
+def next_fire(loop, reminder_id):
+    return datetime.fromtimestamp(loop._entries[reminder_id][0])
+
+def test_due_reminder_is_sent_and_reindexed(loop, monkeypatch):
+    reminder = solar(id=1, title="吃药", chatnames=json.dumps(["家人"]))
+    index(loop, reminder, datetime(2026, 10, 1, 7, 0))
+    run_at(loop, monkeypatch, datetime(2026, 10, 1, 8, 0, 5))
+    assert [who for who, _ in loop.wxauto_client.sent] == ["家人"]
+    assert next_fire(loop, 1) == datetime(2026, 10, 2, 8, 0)
+
+def test_catch_up_sends_latest_missed_occurrence(loop, monkeypatch):
+    # 停顿前最早错过的是 10-01 08:00，补发窗口内最近的 10-02 08:00 只晚了 30 分钟
+    reminder = solar(id=1, title="吃药", chatnames=json.dumps(["家人"]))
+    index(loop, reminder, datetime(2026, 10, 1, 7, 0))
+    run_at(loop, monkeypatch, datetime(2026, 10, 2, 8, 30))
+    assert len(loop.wxauto_client.sent) == 1
+    assert "10月2日" in loop.wxauto_client.sent[0][1]
+    assert next_fire(loop, 1) == datetime(2026, 10, 3, 8, 0)
+
+def test_missed_beyond_catch_up_window_is_skipped(loop, monkeypatch):
+    reminder = solar(id=1, title="吃药", chatnames=json.dumps(["家人"]))
+    index(loop, reminder, datetime(2026, 10, 1, 7, 0))
+    run_at(loop, monkeypatch, datetime(2026, 10, 2, 9, 30))
+    assert loop.wxauto_client.sent == []
+    assert next_fire(loop, 1) == datetime(2026, 10, 3, 8, 0)
+
+def test_deleted_reminder_is_dropped(loop, monkeypatch):
+    index(loop, solar(id=1, chatnames=json.dumps(["家人"])), datetime(2026, 10, 1, 7, 0))
+    loop._on_reminder_changed(1, None)
+    run_at(loop, monkeypatch, datetime(2026, 10, 1, 8, 0, 5))
+    assert loop.wxauto_client.sent == []
+    assert loop._heap == []
+
+# DetectorLoop
+
+class SlowClient(FakeClient):
+    def send_text_message(self, who, msg):
+        # 比 AtSchedule 的 min_gap 还慢
+        time.sleep(1.5)
+        super().send_text_message(who, msg)
+
+def test_slow_send_is_not_skipped(loop, monkeypatch):
+    monkeypatch.setattr(DetectorLoop, "_init_processors", lambda self, env_file: None)
+    # ReminderLoop 不使用传入的 ConfigManager
+    monkeypatch.setattr(detector_loop, "ConfigManager", lambda env_file: None)
+    now = datetime.now()
+    loop.wxauto_client = SlowClient()
+    # 发送第一个提醒时，第二个还在堆顶等着
+    for reminder_id in (1, 2):
+        index(loop, solar(id=reminder_id, hour=now.hour, minute=now.minute, chatnames=json.dumps(["家人"])),
+              now - timedelta(minutes=1))
+
+    tomorrow = datetime(now.year, now.month, now.day, now.hour, now.minute) + timedelta(days=1)
+
+    detectors = DetectorLoop(loop.wxauto_client)
+    detectors.register_processor("reminder_loop", loop)
+    thread = threading.Thread(target=detectors.start_loop, daemon=True)
+    thread.start()
+    try:
+        deadline = time.time() + 5
+        while time.time() < deadline and detectors.get_metrics()["reminder_loop"]["next_fire"] != tomorrow.timestamp():
+            time.sleep(0.01)
+        metrics = detectors.get_metrics()["reminder_loop"]
+    finally:
+        detectors.stop_loop()
+        thread.join(5)
+
+    assert len(loop.wxauto_client.sent) == 2
+    assert metrics["skipped"] == 0
+    assert metrics["next_fire"] == tomorrow.timestamp()
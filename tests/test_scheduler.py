@@ -0,0 +1,165 @@
+# test_scheduler.py
+import time
+import threading
+import contextlib
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronSchedule, DailySchedule, IntervalSchedule, Scheduler
+
+def ts(*args) -> float:
+    return datetime(*args).timestamp()
+
+def fire(schedule, *now) -> datetime:
+    return datetime.fromtimestamp(schedule.next_fire(None, ts(*now)))
+
+# CronSchedule
+
+def test_cron_step():
+    assert fire(CronSchedule(minute="*/15"), 2024, 1, 1, 10, 7) == datetime(2024, 1, 1, 10, 15)
+    assert fire(CronSchedule(minute="*/15"), 2024, 1, 1, 10, 45) == datetime(2024, 1, 1, 11, 0)
+
+def test_cron_is_strictly_after_now():
+    assert fire(CronSchedule(minute=30, hour=9), 2024, 1, 1, 9, 30) == datetime(2024, 1, 2, 9, 30)
+
+def test_cron_range_with_step_rolls_to_next_day():
+    schedule = CronSchedule(minute="0-30/10", hour="9-17")
+    assert fire(schedule, 2024, 1, 1, 9, 25) == datetime(2024, 1, 1, 9, 30)
+    assert fire(schedule, 2024, 1, 1, 17, 35) == datetime(2024, 1, 2, 9, 0)
+
+def test_cron_list():
+    schedule = CronSchedule(minute=0, hour="1,15")
+    assert fire(schedule, 2024, 1, 1, 2, 0) == datetime(2024, 1, 1, 15, 0)
+    assert fire(schedule, 2024, 1, 1, 16, 0) == datetime(2024, 1, 2, 1, 0)
+
+def test_cron_month_rollover():
+    assert fire(CronSchedule(minute=0, hour=0, day=1), 2024, 1, 31, 12, 0) == datetime(2024, 2, 1)
+    assert fire(CronSchedule(minute=0, hour=0, day=1), 2024, 12, 15) == datetime(2025, 1, 1)
+    # 4 月没有 31 日
+    assert fire(CronSchedule(minute=0, hour=0, day=31), 2024, 4, 1) == datetime(2024, 5, 31)
+    # 2 月 29 日要等到闰年
+    assert fire(CronSchedule(minute=0, hour=0, day=29, month=2), 2023, 3, 1) == datetime(2024, 2, 29)
+
+def test_cron_weekday_only():
+    # 2024-01-01 是周一，0 和 7 都表示周日
+    assert fire(CronSchedule(minute=0, hour=8, weekday=0), 2024, 1, 1) == datetime(2024, 1, 7, 8, 0)
+    assert fire(CronSchedule(minute=0, hour=8, weekday=7), 2024, 1, 1) == datetime(2024, 1, 7, 8, 0)
+    assert fire(CronSchedule(minute=0, hour=8, weekday="1-5"), 2024, 1, 5, 9, 0) == datetime(2024, 1, 8, 8, 0)
+
+def test_cron_day_or_weekday():
+    # day 和 weekday 都有限制时满足其一即可：每月 1 日或者每周一
+    schedule = CronSchedule(minute=0, hour=0, day=1, weekday=1)
+    assert fire(schedule, 2024, 1, 1, 0, 0) == datetime(2024, 1, 8)
+    assert fire(schedule, 2024, 1, 29, 0, 0) == datetime(2024, 2, 1)
+    assert fire(schedule, 2024, 2, 1, 0, 0) == datetime(2024, 2, 5)
+
+def test_cron_invalid_field():
+    for kwargs in ({"minute": 60}, {"hour": "5-3"}, {"day": 0}, {"minute": "*/0"}, {"weekday": 8}):
+        with pytest.raises(ValueError):
+            CronSchedule(**kwargs)
+
+def test_cron_without_fire_time():
+    with pytest.raises(ValueError):
+        CronSchedule(minute=0, hour=0, day=31, month=2).next_fire(None, ts(2024, 1, 1))
+
+# DailySchedule
+
+def test_daily_later_today():
+    assert fire(DailySchedule(8), 2024, 1, 1, 7, 59) == datetime(2024, 1, 1, 8, 0)
+
+def test_daily_rolls_over_to_tomorrow():
+    assert fire(DailySchedule(8), 2024, 1, 1, 8, 0) == datetime(2024, 1, 2, 8, 0)
+    assert fire(DailySchedule(8, 30), 2024, 1, 1, 10, 0) == datetime(2024, 1, 2, 8, 30)
+
+def test_daily_rolls_over_month_and_year():
+    assert fire(DailySchedule(8), 2024, 1, 31, 9, 0) == datetime(2024, 2, 1, 8, 0)
+    assert fire(DailySchedule(8), 2024, 12, 31, 9, 0) == datetime(2025, 1, 1, 8, 0)
+
+# Scheduler
+
+@contextlib.contextmanager
+def running(scheduler: Scheduler):
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        scheduler.stop()
+        thread.join(5)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_run_now_runs_in_call_order():
+    scheduler = Scheduler()
+    runs = []
+    for name in ("a", "b", "c"):
+        scheduler.add(name, lambda name=name: runs.append(name), IntervalSchedule(3600))
+    scheduler.run_now("c")
+    scheduler.run_now("a")
+    with running(scheduler):
+        assert wait_for(lambda: len(runs) == 2)
+        time.sleep(0.1)
+    assert runs == ["c", "a"]
+
+def test_run_now_twice_runs_once():
+    scheduler = Scheduler()
+    runs = []
+    scheduler.add("job", lambda: runs.append("job"), IntervalSchedule(3600))
+    scheduler.run_now("job")
+    scheduler.run_now("job")
+    with running(scheduler):
+        assert wait_for(lambda: runs)
+        time.sleep(0.1)
+    assert runs == ["job"]
+    assert scheduler.get_metrics()["job"]["runs"] == 1
+
+def test_reschedule_replaces_stale_entry():
+    scheduler = Scheduler()
+    interval = [3600]
+    runs = []
+    scheduler.add("job", lambda: runs.append(time.time()), lambda: IntervalSchedule(interval[0]))
+    scheduler.add("other", lambda: runs.append("other"), IntervalSchedule(3600))
+    with running(scheduler):
+        time.sleep(0.05)
+        assert runs == []
+        interval[0] = 0.05
+        scheduler.reschedule("job")
+        assert wait_for(lambda: len(runs) >= 3)
+        # 调长间隔后，之前按短间隔算出的条目作废
+        interval[0] = 3600
+        scheduler.reschedule("job")
+        count = len(runs)
+        time.sleep(0.2)
+        assert len(runs) <= count + 1
+    assert "other" not in runs
+
+def test_removed_job_does_not_run():
+    scheduler = Scheduler()
+    runs = []
+    scheduler.add("removed", lambda: runs.append("removed"), IntervalSchedule(0.05))
+    scheduler.add("kept", lambda: runs.append("kept"), IntervalSchedule(0.05))
+    scheduler.remove("removed")
+    scheduler.run_now("removed")
+    with running(scheduler):
+        assert wait_for(lambda: len(runs) >= 2)
+    assert set(runs) == {"kept"}
+
+def test_failing_job_keeps_its_schedule():
+    scheduler = Scheduler()
+    calls = []
+
+    def job():
+        calls.append(1)
+        raise RuntimeError("boom")
+
+    scheduler.add("job", job, IntervalSchedule(0.02))
+    with running(scheduler):
+        assert wait_for(lambda: len(calls) >= 3)
+    assert scheduler.get_metrics()["job"]["errors"] >= 3
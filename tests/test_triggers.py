@@ -0,0 +1,36 @@
+# test_triggers.py
+from process_router import TriggerMatcher
+from processor.location_processor import LocationProcessor
+from processor.stock_processor import StockProcessor
+
+def matcher(processor_class) -> TriggerMatcher:
+    spec = processor_class.triggers(None)["text"]
+    return TriggerMatcher("text", [(processor_class.process_text, spec)])
+
+def matches(matcher, text, chat_type="friend") -> bool:
+    return bool(matcher.match({"text_content": text, "chat_type": chat_type}))
+
+def test_stock_ignores_private_chatter():
+    stock = matcher(StockProcessor)
+    for text in ("你好", "吃了吗", "今天天气不错"):
+        assert not matches(stock, text)
+
+def test_stock_code_and_prefixed_name():
+    stock = matcher(StockProcessor)
+    assert matches(stock, "002396")
+    assert matches(stock, "股票 星网锐捷")
+    assert matches(stock, "@呼噜一号 002396", chat_type="group")
+    assert not matches(stock, "002396", chat_type="group")
+
+def test_stock_name_needs_mention():
+    stock = matcher(StockProcessor)
+    assert not matches(stock, "星网锐捷")
+    assert matches(stock, "@呼噜一号 星网锐捷", chat_type="group")
+    assert matches(stock, "@呼噜一号 星网锐捷")
+
+def test_location_queries_reach_intent_stage():
+    location = matcher(LocationProcessor)
+    for text in ("@呼噜一号 定位一下", "@呼噜一号 在干嘛", "@呼噜一号 乔宝在哪"):
+        assert matches(location, text, chat_type="group")
+    assert not matches(location, "乔宝在哪", chat_type="group")
+    assert not matches(location, "@呼噜一号 打开电视", chat_type="group")
@@ -0,0 +1,184 @@
+# traffic_capture.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 批次记录文件和附件文件的名称
+BATCHES_FILE = "batches.jsonl"
+BLOBS_FILE = "blobs.bin"
+
+class TrafficRecorder:
+    """
+    消息流量录制
+
+    把每个 get_next_new_message 返回的消息批次追加写入 batches.jsonl，
+    附件的原始内容追加写入 blobs.bin，相同内容只保存一份（按 sha256 去重）。
+    录制文件只追加不修改，进程重启后继续写入同一个目录。
+
+    batches.jsonl 每行一条记录：
+    - {"kind": "meta", "started_at": ..., "routing": {chat_name: [处理器名称, ...]}}
+    - {"kind": "batch", "t": 相对 started_at 的秒数, "batch": 批次, "blobs": {file_id: [偏移, 大小, sha256]}}
+    """
+
+    def __init__(self, archive_dir: str, routing: Optional[Mapping[str, Any]] = None):
+        """
+        Args:
+            archive_dir (str): 录制目录
+            routing (dict): 录制开始时的路由表，回放时按它重建路由
+        """
+        self._archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self._batches_path = os.path.join(archive_dir, BATCHES_FILE)
+        self._blobs_path = os.path.join(archive_dir, BLOBS_FILE)
+        self._lock = threading.Lock()
+        self._blob_index = {}  # {sha256: (偏移, 大小)}
+        self._stats = {"batches": 0, "messages": 0, "blobs": 0, "blob_bytes": 0, "blob_errors": 0}
+
+        # 继续写入已有的录制时，从记录中恢复附件索引
+        for record in TrafficArchive(archive_dir).records():
+            for offset, size, sha256 in record.get("blobs", {}).values():
+                self._blob_index[sha256] = (offset, size)
+
+        self._started_at = time.time()
+        self._append({
+            "kind": "meta",
+            "started_at": self._started_at,
+            "routing": {name: list(processors) for name, processors in (routing or {}).items()},
+        })
+        logger.info(f"流量录制已开启: {archive_dir}")
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+        with open(self._batches_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _store_blob(self, data: bytes) -> Tuple[int, int, str]:
+        """追加写入附件内容，已存在相同内容时直接返回已有位置"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        existing = self._blob_index.get(sha256)
+        if existing:
+            return existing[0], existing[1], sha256
+        with open(self._blobs_path, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+        self._blob_index[sha256] = (offset, len(data))
+        self._stats["blobs"] += 1
+        self._stats["blob_bytes"] += len(data)
+        return offset, len(data), sha256
+
+    def _fetch_attachment(self, file_id: str, wxauto_client) -> Optional[bytes]:
+        result = wxauto_client.download_bytes(file_id)
+        if not result.get("success"):
+            logger.error(f"录制附件失败 {file_id}: {result.get('error')}")
+            return None
+        if result.get("data") is not None:
+            return result["data"]
+        # 超过内存阈值的附件被写到了临时文件
+        file_path = result.get("file_path")
+        try:
+            with open(file_path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(file_path)
+
+    def record(self, message_batch: Dict[str, Any], wxauto_client=None):
+        """
+        录制一个消息批次，没有新消息的批次不录制
+
+        Args:
+            message_batch (dict): get_next_new_message 的返回值
+            wxauto_client: 用于下载附件的 wxauto 客户端，为 None 时不录制附件
+        """
+        if not message_batch.get("success") or not message_batch.get("has_message"):
+            return
+
+        batch = {key: value for key, value in message_batch.items() if key != "raw_data"}
+        with self._lock:
+            blobs = {}
+            if wxauto_client is not None:
+                for msg in batch.get("messages", []):
+                    file_id = msg.get("file_id")
+                    if not file_id or file_id in blobs:
+                        continue
+                    try:
+                        data = self._fetch_attachment(file_id, wxauto_client)
+                    except Exception as e:
+                        logger.error(f"录制附件出错 {file_id}: {str(e)}")
+                        data = None
+                    if data is None:
+                        self._stats["blob_errors"] += 1
+                        continue
+                    blobs[file_id] = list(self._store_blob(data))
+
+            self._append({
+                "kind": "batch",
+                "t": round(time.time() - self._started_at, 3),
+                "batch": batch,
+                "blobs": blobs,
+            })
+            self._stats["batches"] += 1
+            self._stats["messages"] += len(batch.get("messages", []))
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取录制统计"""
+        with self._lock:
+            return dict(self._stats, archive_dir=self._archive_dir)
+
+class TrafficArchive:
+    """读取 TrafficRecorder 生成的录制目录"""
+
+    def __init__(self, archive_dir: str):
+        self._batches_path = os.path.join(archive_dir, BATCHES_FILE)
+        self._blobs_path = os.path.join(archive_dir, BLOBS_FILE)
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """按写入顺序遍历所有记录，跳过写了一半的最后一行"""
+        if not os.path.exists(self._batches_path):
+            return
+        with open(self._batches_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过无法解析的录制记录: {line[:80]}")
+
+    def routing(self) -> Dict[str, list]:
+        """合并所有录制段的路由表，后面的覆盖前面的"""
+        routing = {}
+        for record in self.records():
+            if record.get("kind") == "meta":
+                routing.update(record.get("routing") or {})
+        return routing
+
+    def batches(self) -> Iterator[Tuple[float, Dict[str, Any], Dict[str, list]]]:
+        """
+        遍历录制的批次
+
+        多次录制的时间戳各自从 0 开始，这里换算成连续的时间线。
+
+        Returns:
+            Iterator[(相对时间秒数, 批次, {file_id: [偏移, 大小, sha256]})]
+        """
+        base = 0.0
+        last = 0.0
+        for record in self.records():
+            if record.get("kind") == "meta":
+                base = last
+            elif record.get("kind") == "batch":
+                last = base + record.get("t", 0)
+                yield last, record["batch"], record.get("blobs", {})
+
+    def read_blob(self, offset: int, size: int) -> bytes:
+        """读取附件内容"""
+        with open(self._blobs_path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
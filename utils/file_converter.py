@@ -10,31 +10,41 @@ class FileConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
-    def convert_image_to_pdf(self, input_file: str, output_dir: str) -> str:
+    def convert_image_to_pdf(self, input_file, output_dir: str, output_name: str = None) -> str:
         """
         将图片转换为PDF
         
         Args:
-            input_file: 输入图片路径
+            input_file: 输入图片路径，或图片内容(bytes)
             output_dir: 输出PDF路径
+            output_name: 输出PDF文件名（不含扩展名），input_file 为图片内容时必须提供
             
         Returns:
             生成的PDF文件路径
         """
-        if not os.path.exists(input_file):
+        is_data = isinstance(input_file, (bytes, bytearray, memoryview))
+        if is_data:
+            if not output_dir or not output_name:
+                raise ValueError("图片内容转换PDF时必须指定输出目录和文件名")
+        elif not os.path.exists(input_file):
             raise FileNotFoundError(f"输入图片不存在: {input_file}")
 
         if output_dir is None:
             output_dir = os.path.dirname(input_file)
 
-        input_name = Path(input_file).stem
+        input_name = output_name or Path(input_file).stem
         output_file = os.path.join(output_dir, f"{input_name}.pdf")
         
         try:
-            # 方法2: 使用文件对象
-            with open(input_file, "rb") as image_file:
+            if is_data:
+                # 图片已经在内存中，直接转换
                 with open(output_file, "wb") as pdf_file:
-                    pdf_file.write(img2pdf.convert(image_file))
+                    pdf_file.write(img2pdf.convert(bytes(input_file)))
+            else:
+                # 方法2: 使用文件对象
+                with open(input_file, "rb") as image_file:
+                    with open(output_file, "wb") as pdf_file:
+                        pdf_file.write(img2pdf.convert(image_file))
             self.logger.info(f"图片转换成功: {input_name} -> {output_file}")
             return output_file
         except Exception as e:
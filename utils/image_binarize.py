@@ -12,7 +12,7 @@ class ImageBinarrize:
         """
         去除阴影并直接调整对比度
         Args:
-            img_path: 输入图像路径
+            img_path: 输入图像路径，或已解码的图像
             kernel_size: 模糊核大小
             contrast: 对比度因子 (1.5-2.5)
             brightness: 亮度调整 (-50 到 50)
@@ -22,7 +22,7 @@ class ImageBinarrize:
             original: 原图
         """
         # 读取图像
-        img = cv2.imread(img_path)
+        img = img_path if isinstance(img_path, np.ndarray) else cv2.imread(img_path)
         if img is None:
             raise ValueError(f"无法读取图像: {img_path}")
             
@@ -136,6 +136,36 @@ class ImageBinarrize:
 
         cv2.imwrite(output_path, final_result)
 
+    def process_image_data(self, image_data, ext=".png"):
+        """
+        在内存中处理图片
+
+        Args:
+            image_data: 图片内容(bytes)
+            ext: 输出图片格式的扩展名
+
+        Returns:
+            bytes: 处理后的图片内容
+        """
+        img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("无法解码图像数据")
+
+        final_result, enhanced = self.process_pipeline(
+            img,
+            kernel_size=601,
+            contrast=2.0,
+            brightness=10,
+            binarize=True,
+            threshold=192,
+            invert=False
+        )
+
+        ok, encoded = cv2.imencode(ext, final_result)
+        if not ok:
+            raise ValueError(f"无法编码图像: {ext}")
+        return encoded.tobytes()
+
 # 主函数
 def main():
     img_path = [
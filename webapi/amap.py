@@ -1,5 +1,6 @@
 # deepseek.py
 import requests
+import io
 import json
 from PIL import Image
 import os
@@ -24,9 +25,9 @@ class AmapAPI:
         else:
             logger.info("AMAP configuration loaded successfully")
 
-    def get_amap_static_image(self, longitude, latitude, zoom=17, size='800*800', markers_style='mid,,A', save_path=None):
+    def get_amap_static_image_bytes(self, longitude, latitude, zoom=17, size='800*800', markers_style='mid,,A'):
         """
-        使用高德地图静态图API获取地图图片
+        使用高德地图静态图API获取地图图片内容，不落盘
         
         Args:
             longitude: 经度
@@ -34,11 +35,9 @@ class AmapAPI:
             zoom: 缩放级别 (1-18)
             size: 图片尺寸，如 '400*400'
             markers_style: 标记样式
-            save_path: 图片保存路径
-            api_key: 高德地图API密钥
         
         Returns:
-            str: 保存的文件路径，失败返回None
+            bytes: PNG 图片内容，失败返回None
         """
         if not self._api_key:
             logger.warning("请提供高德地图API密钥")
@@ -59,29 +58,17 @@ class AmapAPI:
             logger.info(f"地图API状态码: {response.status_code}")
             
             if response.status_code == 200:
-                # 如果没有指定保存路径，生成默认路径
-                if not save_path:
-                    save_path = f"map_{longitude}_{latitude}.png"
-                
-                # 确保目录存在
-                os.makedirs(os.path.dirname(save_path) if os.path.dirname(save_path) else '.', exist_ok=True)
-                
-                # 保存图片
-                with open(save_path, 'wb') as f:
-                    f.write(response.content)
-                
-                logger.info(f"地图图片已保存: {save_path}")
+                image_data = response.content
                 
                 # 验证图片是否有效
                 try:
-                    image = Image.open(save_path)
-                    logger.info(f"图片尺寸: {image.size}")
-                    image.close()
+                    with Image.open(io.BytesIO(image_data)) as image:
+                        logger.info(f"图片尺寸: {image.size}")
                 except Exception as e:
                     logger.info(f"图片验证失败: {e}")
                     return None
                     
-                return save_path
+                return image_data
             else:
                 logger.error(f"请求失败: {response.status_code}")
                 logger.error(f"响应内容: {response.text}")
@@ -90,6 +77,44 @@ class AmapAPI:
         except requests.exceptions.RequestException as e:
             logger.error(f"获取地图图片失败: {e}")
             return None
+        except Exception as e:
+            logger.error(f"获取地图图片失败: {e}")
+            return None
+
+    def get_amap_static_image(self, longitude, latitude, zoom=17, size='800*800', markers_style='mid,,A', save_path=None):
+        """
+        使用高德地图静态图API获取地图图片并保存到文件
+        
+        Args:
+            longitude: 经度
+            latitude: 纬度
+            zoom: 缩放级别 (1-18)
+            size: 图片尺寸，如 '400*400'
+            markers_style: 标记样式
+            save_path: 图片保存路径
+        
+        Returns:
+            str: 保存的文件路径，失败返回None
+        """
+        image_data = self.get_amap_static_image_bytes(longitude, latitude, zoom, size, markers_style)
+        if image_data is None:
+            return None
+
+        try:
+            # 如果没有指定保存路径，生成默认路径
+            if not save_path:
+                save_path = f"map_{longitude}_{latitude}.png"
+            
+            # 确保目录存在
+            os.makedirs(os.path.dirname(save_path) if os.path.dirname(save_path) else '.', exist_ok=True)
+            
+            # 保存图片
+            with open(save_path, 'wb') as f:
+                f.write(image_data)
+            
+            logger.info(f"地图图片已保存: {save_path}")
+            return save_path
+                
         except Exception as e:
             logger.error(f"保存图片失败: {e}")
             return None
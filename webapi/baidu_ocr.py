@@ -25,22 +25,31 @@ class BaiduOCR:
     def _get_file_content_as_base64(self, path, urlencoded=False):
         """
         Get file base64 encoding
-        :param path: file path
+        :param path: file path, or the file content as bytes
         :param urlencoded: whether to urlencode the result
         :return: base64 encoded content
         """
-        with open(path, "rb") as f:
-            content = base64.b64encode(f.read()).decode("utf8")
-            if urlencoded:
-                content = urllib.parse.quote_plus(content)
+        if isinstance(path, (bytes, bytearray, memoryview)):
+            content = base64.b64encode(path).decode("utf8")
+        else:
+            with open(path, "rb") as f:
+                content = base64.b64encode(f.read()).decode("utf8")
+        if urlencoded:
+            content = urllib.parse.quote_plus(content)
         return content
+
+    @staticmethod
+    def _describe_image(image):
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return f"<{len(image)} bytes>"
+        return image
     
     def _process_image(self, image_path, detect_direction=False, probability=False, detect_alteration=False):
         """
         Process single image file with Baidu OCR API using Bearer token
         """
         try:
-            logger.info(f"Processing image: {image_path}")
+            logger.info(f"Processing image: {self._describe_image(image_path)}")
             
             # Get image as base64
             image_base64 = self._get_file_content_as_base64(image_path, False)
@@ -107,14 +116,14 @@ class BaiduOCR:
                 }
                 
         except Exception as e:
-            logger.error(f"Error processing image {image_path}: {str(e)}")
+            logger.error(f"Error processing image {self._describe_image(image_path)}: {str(e)}")
             return {"success": False, "error": str(e)}
     
     def _fake_process_image(self, image_path, detect_direction=False, probability=False, detect_alteration=False):
         """
         Return fake successful OCR response for testing without API calls
         """
-        logger.info(f"Using fake OCR response for: {image_path}")
+        logger.info(f"Using fake OCR response for: {self._describe_image(image_path)}")
         
         fake_response = {
             'success': True, 
@@ -169,6 +178,8 @@ class BaiduOCR:
     def recognize_handwriting(self, image_path, **kwargs):
         """
         Main method for handwriting recognition
+
+        image_path may be a file path or the image content as bytes
         """
         return self._process_image(image_path, **kwargs)
         #return self._fake_process_image(image_path, **kwargs)
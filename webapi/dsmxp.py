@@ -30,7 +30,7 @@ class DSMSmartDoorAPI:
 
         get_log_url = "https://nyuwa.dsmxp.com/nyuwa/dc/lock/log/open/door/type?lockId=2023111816472300760&pageNum=1&pageSize=20&type=1"
 
-        response = requests.get(get_log_url, headers=headers)
+        response = requests.get(get_log_url, headers=headers, timeout=10)
         if not response.status_code == 200:
             msg = f"获取开门记录失败，状态码: {response.status_code}"
             logger.error(msg)
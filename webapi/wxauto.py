@@ -2,30 +2,435 @@
 import requests
 import json
 import os
+import time
+import random
 import logging
+import hashlib
+import tempfile
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from env import EnvConfig
+from metrics import Histogram
 import base64
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Default timeout (seconds) per endpoint, override with WXAUTO_TIMEOUTS=send=15,download=60
+DEFAULT_TIMEOUTS = {
+    "send": 30,
+    "getnextnewmessage": 30,
+    "upload": 30,
+    "sendfile": 30,
+    "delete": 10,
+    "download": 30,
+    "isonline": 30,
+    "login": 30,
+    "qrcode": 30,
+}
+
+# Endpoints that are safe to retry. Polling consumes messages and send/upload/login
+# have side effects, so they are never retried automatically.
+IDEMPOTENT_ENDPOINTS = frozenset(["delete", "download", "isonline", "qrcode"])
+
+# Status codes worth retrying for idempotent endpoints
+RETRY_STATUS_CODES = frozenset([502, 503, 504])
+
+# Connection pool size, shared by main loop, dispatcher workers, detector,
+# webserver and print monitor threads
+DEFAULT_POOL_SIZE = 16
+
+# download_bytes keeps downloads in memory up to this size (bytes), larger ones
+# spill to a temporary file. Override with WXAUTO_SPILL_THRESHOLD
+DEFAULT_SPILL_THRESHOLD = 16 * 1024 * 1024
+
+# sendfile error messages meaning the server no longer has the file_id
+FILE_NOT_FOUND_MESSAGES = ("file not found", "文件不存在")
+
+class SendHandle:
+    """
+    Handle returned by the async send methods, wait() returns the send result
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+
+    def _set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout=None) -> Dict[str, Any]:
+        """
+        Wait for the send to finish
+
+        Returns:
+            dict: Same result as the synchronous send method
+        """
+        if not self._event.wait(timeout):
+            return {"success": False, "error": "Send still pending"}
+        return self._result
+
+class UploadCache:
+    """
+    LRU map from content sha256 to an uploaded server file_id
+
+    Entries expire after ttl seconds. put() and get() return the file_ids that
+    were evicted or expired so the caller can delete them on the server.
+    """
+
+    def __init__(self, max_entries=64, ttl=3600):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()  # {key: (file_id, file_info, stored_at)}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: ((file_id, file_info) or None, [expired file_ids])
+        """
+        with self._lock:
+            expired = self._pop_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, expired
+            self._entries.move_to_end(key)
+            return (entry[0], entry[1]), expired
+
+    def put(self, key, file_id, file_info):
+        """
+        Returns:
+            list: file_ids evicted to make room
+        """
+        with self._lock:
+            evicted = self._pop_expired()
+            old = self._entries.pop(key, None)
+            if old is not None and old[0] != file_id:
+                evicted.append(old[0])
+            self._entries[key] = (file_id, file_info, time.time())
+            while len(self._entries) > self._max_entries:
+                _, (old_id, _, _) = self._entries.popitem(last=False)
+                evicted.append(old_id)
+            return evicted
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def pop_expired(self):
+        """
+        Returns:
+            list: file_ids of entries that have expired
+        """
+        with self._lock:
+            return self._pop_expired()
+
+    def file_ids(self):
+        with self._lock:
+            return set(entry[0] for entry in self._entries.values())
+
+    def _pop_expired(self):
+        now = time.time()
+        expired = []
+        for key in [k for k, (_, _, stored_at) in self._entries.items() if now - stored_at > self._ttl]:
+            expired.append(self._entries.pop(key)[0])
+        return expired
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
 class WXAuto:
-    def __init__(self, env_file=".env"):
+    def __init__(self, env_file=".env", max_retries=2, backoff=0.5, send_workers=2, coalesce_window=1.0,
+                 upload_cache_size=64, upload_cache_ttl=3600, reap_interval=2.0, reconcile_interval=600):
         self._config = EnvConfig(env_file)
         self._api_url = None
         self._token = None
+        self._timeouts = dict(DEFAULT_TIMEOUTS)
+        self._pool_size = DEFAULT_POOL_SIZE
+        self._spill_threshold = DEFAULT_SPILL_THRESHOLD
+        self._max_retries = max_retries
+        self._backoff = backoff
         self._load_config()
+
+        # One keep-alive session for all threads; urllib3's pool is thread-safe
+        # and headers are set once instead of on every call
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({
+            'accept': 'application/json',
+            'Authorization': f'Bearer {self._token}',
+        })
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {}
+
+        # Outbound send queue: one ordered queue per recipient, drained by a small worker pool
+        self._send_workers = send_workers
+        self._coalesce_window = coalesce_window
+        self._send_executor = None
+        self._outbox_cond = threading.Condition()
+        self._outbox = {}            # {who: deque[item]}
+        self._outbox_active = set()  # recipients currently being drained
+        self._send_latency = Histogram()
+        self._send_stats = {"queued": 0, "sent": 0, "failed": 0, "coalesced": 0}
+
+        # Uploaded files are kept on the server and reused for identical content
+        self._upload_cache = UploadCache(upload_cache_size, upload_cache_ttl)
+        self._upload_stats = {"hits": 0, "misses": 0, "stale": 0}
+
+        # Background reaper for server-side files: deletes are queued, batched and retried
+        # off the caller's path, and uploads that were never deleted are reconciled
+        self._reap_interval = reap_interval
+        self._reap_batch_size = 20
+        self._max_delete_attempts = 3
+        self._reconcile_interval = reconcile_interval
+        self._last_reconcile = time.time()
+        self._reaper_cond = threading.Condition()
+        self._reaper_thread = None
+        self._reap_pending = OrderedDict()  # {file_id: failed attempts}
+        self._uploads = {}                  # {file_id: uploaded_at}, uploaded by us and not deleted yet
+        self._reap_stats = {"queued": 0, "deleted": 0, "failed": 0, "retries": 0, "reconciled": 0}
     
     def _load_config(self):
         """Load WXAuto configuration from environment"""
         wxauto_config = self._config.get_wxauto_config()
         self._api_url = wxauto_config.get('api_url')
         self._token = wxauto_config.get('api_key')
+        self._timeouts.update(self._parse_timeouts(wxauto_config.get('timeouts')))
+        if wxauto_config.get('pool_size'):
+            try:
+                self._pool_size = int(wxauto_config.get('pool_size'))
+            except ValueError:
+                logger.warning(f"Invalid WXAUTO_POOL_SIZE: {wxauto_config.get('pool_size')}")
+        if wxauto_config.get('spill_threshold'):
+            try:
+                self._spill_threshold = int(wxauto_config.get('spill_threshold'))
+            except ValueError:
+                logger.warning(f"Invalid WXAUTO_SPILL_THRESHOLD: {wxauto_config.get('spill_threshold')}")
         
         if not self._api_url or not self._token:
             logger.warning("WXAuto API URL or Token not found in environment")
         else:
             logger.info("WXAuto configuration loaded successfully")
+
+    @staticmethod
+    def _parse_timeouts(value):
+        """Parse 'endpoint=seconds,endpoint=seconds' into a dict"""
+        timeouts = {}
+        if not value:
+            return timeouts
+        for item in value.split(","):
+            if "=" not in item:
+                continue
+            endpoint, seconds = item.split("=", 1)
+            try:
+                timeouts[endpoint.strip()] = float(seconds)
+            except ValueError:
+                logger.warning(f"Invalid WXAuto timeout for '{endpoint.strip()}': {seconds}")
+        return timeouts
+
+    def _get_endpoint_metrics(self, endpoint):
+        with self._metrics_lock:
+            metrics = self._metrics.get(endpoint)
+            if metrics is None:
+                metrics = {"requests": 0, "errors": 0, "retries": 0, "latency": Histogram()}
+                self._metrics[endpoint] = metrics
+            return metrics
+
+    def _request(self, endpoint, method, path, timeout=None, **kwargs):
+        """
+        Send a request through the pooled session
+
+        Idempotent endpoints are retried on connection errors, timeouts and
+        502/503/504 with jittered exponential backoff.
+
+        Args:
+            endpoint (str): Endpoint name, used for timeout lookup and metrics
+            method (str): HTTP method
+            path (str): Path relative to the API URL
+            timeout (float): Override the configured timeout (optional)
+
+        Returns:
+            requests.Response: Raises requests.exceptions.RequestException on failure
+        """
+        url = f"{self._api_url}{path}"
+        if timeout is None:
+            timeout = self._timeouts.get(endpoint, 30)
+        retries = self._max_retries if endpoint in IDEMPOTENT_ENDPOINTS else 0
+        metrics = self._get_endpoint_metrics(endpoint)
+
+        attempt = 0
+        while True:
+            started_at = time.time()
+            try:
+                response = self._session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                metrics["latency"].observe(time.time() - started_at)
+                with self._metrics_lock:
+                    metrics["requests"] += 1
+                    metrics["errors"] += 1
+                if attempt >= retries:
+                    raise
+            else:
+                metrics["latency"].observe(time.time() - started_at)
+                with self._metrics_lock:
+                    metrics["requests"] += 1
+                    if response.status_code >= 400:
+                        metrics["errors"] += 1
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                response.close()
+
+            attempt += 1
+            with self._metrics_lock:
+                metrics["retries"] += 1
+            delay = random.uniform(0, self._backoff * (2 ** attempt))
+            logger.warning(f"Retrying WXAuto {endpoint} in {delay:.2f}s (attempt {attempt}/{retries})")
+            time.sleep(delay)
+
+    def send_text_message_async(self, who, msg, wxname="", exact=False, clear=True, at="", coalesce=False):
+        """
+        Queue a text message and return immediately
+
+        Messages to the same recipient are sent in order. With coalesce=True,
+        text queued for the same recipient within coalesce_window seconds is
+        merged into one message, and all callers share the same handle.
+
+        Returns:
+            SendHandle: wait() returns the send_text_message result
+        """
+        kwargs = {"msg": msg, "wxname": wxname, "exact": exact, "clear": clear, "at": at}
+        return self._enqueue_send(who, "text", kwargs, coalesce=coalesce)
+
+    def send_file_message_async(self, who, file_path=None, wxname="", exact=False, description="", uploader="",
+                                delete_after=False, filename=None, content=None):
+        """
+        Queue a file message and return immediately
+
+        Args:
+            file_path (str): Path to the file to send
+            delete_after (bool): Remove the local file once it has been sent (or failed),
+                so callers do not need to wait before cleaning up
+            filename (str): File name shown in WeChat, required with content
+            content: File content as bytes / file-like object, instead of file_path
+
+        Returns:
+            SendHandle: wait() returns the send_file_message result
+        """
+        kwargs = {"file_path": file_path, "wxname": wxname, "exact": exact,
+                  "description": description, "uploader": uploader, "filename": filename, "content": content}
+        return self._enqueue_send(who, "file", kwargs, delete_after=delete_after and file_path is not None)
+
+    def _enqueue_send(self, who, kind, kwargs, coalesce=False, delete_after=False):
+        now = time.time()
+        with self._outbox_cond:
+            queue = self._outbox.setdefault(who, deque())
+
+            if coalesce and queue:
+                last = queue[-1]
+                if (last["kind"] == "text" and last["coalesce"]
+                        and now - last["enqueued_at"] <= self._coalesce_window
+                        and all(last["kwargs"][key] == kwargs[key] for key in ("wxname", "exact", "clear", "at"))):
+                    last["kwargs"]["msg"] += "\n" + kwargs["msg"]
+                    self._send_stats["coalesced"] += 1
+                    return last["handle"]
+
+            handle = SendHandle()
+            queue.append({
+                "kind": kind,
+                "kwargs": kwargs,
+                "handle": handle,
+                "enqueued_at": now,
+                "coalesce": coalesce,
+                "delete_after": delete_after,
+            })
+            self._send_stats["queued"] += 1
+
+            if who not in self._outbox_active:
+                self._outbox_active.add(who)
+                if self._send_executor is None:
+                    self._send_executor = ThreadPoolExecutor(max_workers=self._send_workers,
+                                                             thread_name_prefix="WXAutoSender")
+                self._send_executor.submit(self._drain_outbox, who)
+        return handle
+
+    def _drain_outbox(self, who):
+        """Send everything queued for one recipient, in order"""
+        while True:
+            with self._outbox_cond:
+                queue = self._outbox.get(who)
+                if not queue:
+                    self._outbox_active.discard(who)
+                    self._outbox.pop(who, None)
+                    return
+                item = queue[0]
+                if item["coalesce"]:
+                    # Give later text a chance to be merged before sending
+                    remaining = item["enqueued_at"] + self._coalesce_window - time.time()
+                    if remaining > 0:
+                        self._outbox_cond.wait(remaining)
+                        continue
+                queue.popleft()
+
+            try:
+                if item["kind"] == "text":
+                    result = self.send_text_message(who=who, **item["kwargs"])
+                else:
+                    result = self.send_file_message(who=who, **item["kwargs"])
+            except Exception as e:
+                result = {"success": False, "error": f"Unexpected error: {str(e)}"}
+            finally:
+                if item["delete_after"]:
+                    try:
+                        os.remove(item["kwargs"]["file_path"])
+                    except OSError as e:
+                        logger.warning(f"Failed to remove sent file {item['kwargs']['file_path']}: {str(e)}")
+
+            self._send_latency.observe(time.time() - item["enqueued_at"])
+            with self._outbox_cond:
+                self._send_stats["sent" if result.get("success") else "failed"] += 1
+            item["handle"]._set_result(result)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get per-endpoint request counters, latency histograms and send queue stats
+        """
+        with self._metrics_lock:
+            endpoints = dict(self._metrics)
+            counters = {name: (m["requests"], m["errors"], m["retries"]) for name, m in endpoints.items()}
+        with self._outbox_cond:
+            depths = {who: len(queue) for who, queue in self._outbox.items()}
+            send_stats = dict(self._send_stats)
+        with self._metrics_lock:
+            upload_stats = dict(self._upload_stats)
+        with self._reaper_cond:
+            reaper = dict(self._reap_stats, pending=len(self._reap_pending), tracked_uploads=len(self._uploads))
+        return {
+            "pool_size": self._pool_size,
+            "timeouts": dict(self._timeouts),
+            "send_queue": dict(send_stats, depth=sum(depths.values()), recipients=depths,
+                               latency=self._send_latency.snapshot()),
+            "upload_cache": dict(upload_stats, entries=len(self._upload_cache)),
+            "reaper": reaper,
+            "endpoints": {
+                name: {
+                    "requests": counters[name][0],
+                    "errors": counters[name][1],
+                    "retries": counters[name][2],
+                    "latency": metrics["latency"].snapshot(),
+                }
+                for name, metrics in endpoints.items()
+            },
+        }
     
     def send_text_message(self, who, msg, wxname="", exact=False, clear=True, at=""):
         """
@@ -48,14 +453,6 @@ class WXAuto:
             return {"success": False, "error": error_msg}
         
         try:
-            url = f"{self._api_url}/v1/wechat/send"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname,
                 "who": who,
@@ -67,7 +464,7 @@ class WXAuto:
             
             logger.info(f"Sending message to '{who}': {msg[:50]}...")
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._request("send", "POST", "/v1/wechat/send", json=payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -87,13 +484,14 @@ class WXAuto:
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
         
-    def get_next_new_message(self, wxname="", filter_mute=False, timeout=30):
+    def get_next_new_message(self, wxname="", filter_mute=False, timeout=None):
         """
         Get next new message via WXAuto API
         
         Args:
             wxname (str): WeChat name (optional)
             filter_mute (bool): Whether to filter muted chats
+            timeout (float): Request timeout, defaults to the configured getnextnewmessage timeout
             
         Returns:
             dict: API response with message data
@@ -104,20 +502,13 @@ class WXAuto:
             return {"success": False, "error": error_msg}
         
         try:
-            url = f"{self._api_url}/v1/wechat/getnextnewmessage"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname,
                 "filter_mute": filter_mute
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=timeout)
+            response = self._request("getnextnewmessage", "POST", "/v1/wechat/getnextnewmessage",
+                                     json=payload, timeout=timeout)
             
             if response.status_code == 200:
                 result = response.json()
@@ -164,7 +555,7 @@ class WXAuto:
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
-    def upload_file(self, file_path, description="", uploader=""):
+    def upload_file(self, file_path=None, description="", uploader="", filename=None, content=None):
         """
         Upload file via WXAuto API
         
@@ -172,6 +563,8 @@ class WXAuto:
             file_path (str): Path to the file to upload
             description (str): File description (optional)
             uploader (str): Uploader name (optional)
+            filename (str): File name, required with content
+            content: File content as bytes / file-like object, instead of file_path
             
         Returns:
             dict: API response with file_id
@@ -180,23 +573,33 @@ class WXAuto:
             error_msg = "WXAuto API URL or Token not configured"
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
+
+        if (file_path is None) == (content is None):
+            error_msg = "Exactly one of file_path and content is required"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
         
-        if not os.path.exists(file_path):
+        from_path = file_path is not None
+        if from_path and not os.path.exists(file_path):
             error_msg = f"File not found: {file_path}"
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
+
+        if not from_path and not filename:
+            error_msg = "filename is required when uploading content"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
         
         try:
-            url = f"{self._api_url}/api/v1/files/upload"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-            }
-            
-            files = {
-                'file': (os.path.basename(file_path), open(file_path, 'rb')),
-            }
+            if from_path:
+                files = {
+                    'file': (filename or os.path.basename(file_path), open(file_path, 'rb')),
+                }
+            else:
+                # bytes or file-like object, sent straight from memory
+                files = {
+                    'file': (filename, content),
+                }
             
             data = {}
             if description:
@@ -204,13 +607,16 @@ class WXAuto:
             if uploader:
                 data['uploader'] = uploader
             
-            logger.info(f"Uploading file: {file_path}")
+            logger.info(f"Uploading file: {file_path if from_path else filename}")
             
-            response = requests.post(url, headers=headers, files=files, data=data, timeout=30)
+            response = self._request("upload", "POST", "/api/v1/files/upload", files=files, data=data)
             
             if response.status_code == 200:
                 result = response.json()
                 logger.info(f"File uploaded successfully: {result.get('filename')}, file_id: {result.get('file_id')}")
+                if result.get('file_id'):
+                    with self._reaper_cond:
+                        self._uploads[result.get('file_id')] = time.time()
                 return {"success": True, "data": result}
             else:
                 error_msg = f"File upload failed: {response.status_code} - {response.text}"
@@ -227,10 +633,11 @@ class WXAuto:
             return {"success": False, "error": error_msg}
         finally:
             # Ensure file is closed
-            if 'files' in locals():
+            if from_path and 'files' in locals():
                 files['file'][1].close()
 
-    def send_file_message(self, who, file_path, wxname="", exact=False, description="", uploader=""):
+    def send_file_message(self, who, file_path=None, wxname="", exact=False, description="", uploader="",
+                          filename=None, content=None):
         """
         Send file message via WXAuto API
         
@@ -241,6 +648,8 @@ class WXAuto:
             exact (bool): Whether to match recipient exactly
             description (str): File description for upload (optional)
             uploader (str): Uploader name for upload (optional)
+            filename (str): File name, required with content
+            content: File content as bytes / file-like object, instead of file_path
             
         Returns:
             dict: API response
@@ -249,9 +658,51 @@ class WXAuto:
             error_msg = "WXAuto API URL or Token not configured"
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
-        
-        # Step 1: Upload file
-        upload_result = self.upload_file(file_path, description, uploader)
+
+        if (file_path is None) == (content is None):
+            error_msg = "Exactly one of file_path and content is required"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
+
+        if file_path is not None:
+            file_name = filename or os.path.basename(file_path)
+        elif filename:
+            file_name = filename
+            if hasattr(content, "read"):
+                # Read file-like objects once so the content can be hashed and re-uploaded
+                content = content.read()
+        else:
+            error_msg = "filename is required when sending content"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
+
+        cache_key = self._content_key(file_name, file_path=file_path, content=content)
+
+        # Step 1: Reuse the server copy of identical content if we still have one
+        if cache_key:
+            cached, expired = self._upload_cache.get(cache_key)
+            self._delete_files_async(expired)
+            if cached:
+                file_id, file_info = cached
+                result = self._send_file_id(who, file_id, file_name, wxname, exact)
+                if not result.pop("stale", False):
+                    with self._metrics_lock:
+                        self._upload_stats["hits"] += 1
+                    if result.get("success"):
+                        result["file_info"] = file_info
+                    return result
+
+                # The server no longer has the file, upload it again
+                logger.warning(f"Cached file_id {file_id} rejected by server, uploading again")
+                self._upload_cache.discard(cache_key)
+                with self._metrics_lock:
+                    self._upload_stats["stale"] += 1
+
+        with self._metrics_lock:
+            self._upload_stats["misses"] += 1
+
+        # Step 2: Upload file
+        upload_result = self.upload_file(file_path, description, uploader, filename=file_name, content=content)
         if not upload_result.get("success"):
             return upload_result
         
@@ -261,16 +712,49 @@ class WXAuto:
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
         
-        # Step 2: Send file using file_id
+        # Step 3: Send file using file_id, keep it on the server for reuse
+        result = self._send_file_id(who, file_id, file_name, wxname, exact)
+        result.pop("stale", None)
+        if result.get("success"):
+            if cache_key:
+                self._delete_files_async(self._upload_cache.put(cache_key, file_id, upload_result["data"]))
+            else:
+                self.delete_file_async(file_id)
+            result["file_info"] = upload_result["data"]
+        else:
+            self.delete_file_async(file_id)
+        return result
+
+    def _content_key(self, file_name, file_path=None, content=None):
+        """
+        Cache key for a local file or in-memory content: sha256 of the content plus the file name,
+        the server copy keeps the name it was uploaded with
+        """
+        if content is not None:
+            return f"{hashlib.sha256(content).hexdigest()}:{file_name}"
+        try:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+            return f"{digest.hexdigest()}:{file_name}"
+        except OSError as e:
+            logger.warning(f"Failed to hash file {file_path}: {str(e)}")
+            return None
+
+    def _delete_files_async(self, file_ids):
+        for file_id in file_ids:
+            self.delete_file_async(file_id)
+
+    def _send_file_id(self, who, file_id, file_name, wxname="", exact=False):
+        """
+        Send an already uploaded file
+
+        Returns:
+            dict: API response, with "stale" set only when the server reported that the file_id
+            does not exist. Any other failure may have been delivered and must not be resent
+        """
         try:
-            url = f"{self._api_url}/v1/wechat/sendfile"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname,
                 "who": who,
@@ -278,26 +762,25 @@ class WXAuto:
                 "file_id": file_id
             }
             
-            logger.info(f"Sending file to '{who}': {os.path.basename(file_path)}")
+            logger.info(f"Sending file to '{who}': {file_name}")
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._request("sendfile", "POST", "/v1/wechat/sendfile", json=payload)
             
             if response.status_code == 200:
                 result = response.json()
                 if result.get("success"):
-                    logger.info(f"File sent successfully to '{who}': {os.path.basename(file_path)}")
-                    self.delete_file(file_id)
-                    return {"success": True, "data": result, "file_info": upload_result["data"]}
+                    logger.info(f"File sent successfully to '{who}': {file_name}")
+                    return {"success": True, "data": result}
                 else:
                     error_msg = result.get("message", "Unknown error in send file")
                     logger.error(f"Send file failed: {error_msg}")
-                    self.delete_file(file_id)
-                    return {"success": False, "error": error_msg, "raw_data": result}
+                    stale = any(text in str(error_msg).lower() for text in FILE_NOT_FOUND_MESSAGES)
+                    return {"success": False, "error": error_msg, "raw_data": result, "stale": stale}
             else:
                 error_msg = f"Send file API request failed: {response.status_code} - {response.text}"
                 logger.error(error_msg)
-                self.delete_file(file_id)
-                return {"success": False, "error": error_msg, "status_code": response.status_code}
+                return {"success": False, "error": error_msg, "status_code": response.status_code,
+                        "stale": response.status_code == 404}
         except requests.exceptions.RequestException as e:
             error_msg = f"Network error during file send: {str(e)}"
             logger.error(error_msg)
@@ -318,19 +801,14 @@ class WXAuto:
             dict: Delete operation result
         """
         try:
-            url = f"{self._api_url}/api/v1/files/{file_id}"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}'
-            }
-            
-            response = requests.delete(url, headers=headers, timeout=10)
+            response = self._request("delete", "DELETE", f"/api/v1/files/{file_id}")
             
             if response.status_code == 200:
                 result = response.json()
                 if result.get("message") == "文件删除成功":
                     logger.info(f"File deleted successfully: {file_id}")
+                    with self._reaper_cond:
+                        self._uploads.pop(file_id, None)
                     return {"success": True}
                 else:
                     error_msg = result.get("message", "Unknown deletion error")
@@ -339,7 +817,7 @@ class WXAuto:
             else:
                 error_msg = f"Delete file API request failed: {response.status_code} - {response.text}"
                 logger.error(error_msg)
-                return {"success": False, "error": error_msg}
+                return {"success": False, "error": error_msg, "status_code": response.status_code}
                 
         except requests.exceptions.RequestException as e:
             error_msg = f"Network error during file deletion: {str(e)}"
@@ -350,6 +828,83 @@ class WXAuto:
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
+    def delete_file_async(self, file_id):
+        """
+        Queue a server-side file for deletion by the background reaper
+
+        Args:
+            file_id (str): File ID to delete
+        """
+        if not file_id:
+            return
+        with self._reaper_cond:
+            if file_id not in self._reap_pending:
+                self._reap_pending[file_id] = 0
+                self._reap_stats["queued"] += 1
+            if self._reaper_thread is None:
+                self._reaper_thread = threading.Thread(target=self._reaper_loop, daemon=True, name="WXAutoReaper")
+                self._reaper_thread.start()
+            if len(self._reap_pending) >= self._reap_batch_size:
+                self._reaper_cond.notify()
+
+    def _reaper_loop(self):
+        """Delete queued files in batches, retry failures and periodically reconcile uploads"""
+        while True:
+            with self._reaper_cond:
+                if len(self._reap_pending) < self._reap_batch_size:
+                    self._reaper_cond.wait(self._reap_interval)
+                batch = list(self._reap_pending.items())[:self._reap_batch_size]
+
+            for file_id, attempts in batch:
+                result = self.delete_file(file_id)
+                # 404 means the server no longer has it, nothing left to do
+                gone = result.get("success") or result.get("status_code") == 404
+                with self._reaper_cond:
+                    if gone:
+                        self._reap_pending.pop(file_id, None)
+                        self._uploads.pop(file_id, None)
+                        self._reap_stats["deleted"] += 1
+                    elif attempts + 1 >= self._max_delete_attempts:
+                        self._reap_pending.pop(file_id, None)
+                        self._reap_stats["failed"] += 1
+                        logger.error(f"Giving up deleting file {file_id} after {attempts + 1} attempts")
+                    else:
+                        # Move to the back so other files are not blocked by this one
+                        self._reap_pending.pop(file_id, None)
+                        self._reap_pending[file_id] = attempts + 1
+                        self._reap_stats["retries"] += 1
+
+            if time.time() - self._last_reconcile >= self._reconcile_interval:
+                try:
+                    self.reconcile_uploads()
+                except Exception as e:
+                    logger.error(f"Error reconciling uploads: {str(e)}")
+
+    def reconcile_uploads(self):
+        """
+        Queue deletion of expired cache entries and of uploads that were never deleted,
+        e.g. after a failed send or a lost delete request
+
+        Returns:
+            int: Number of files queued for deletion
+        """
+        self._last_reconcile = time.time()
+        expired = self._upload_cache.pop_expired()
+        cached = self._upload_cache.file_ids()
+        now = time.time()
+        with self._reaper_cond:
+            leaked = [
+                file_id for file_id, uploaded_at in self._uploads.items()
+                if now - uploaded_at > self._reconcile_interval
+                and file_id not in cached and file_id not in self._reap_pending
+            ]
+            self._reap_stats["reconciled"] += len(leaked)
+
+        if leaked:
+            logger.warning(f"Reconciling {len(leaked)} leaked uploads")
+        self._delete_files_async(expired + leaked)
+        return len(expired) + len(leaked)
+
     def download_file(self, file_id, file_path):
         """
         Download file by file_id
@@ -362,14 +917,7 @@ class WXAuto:
             dict: Download operation result
         """
         try:
-            url = f"{self._api_url}/api/v1/files/{file_id}/download"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30, stream=True)
+            response = self._request("download", "GET", f"/api/v1/files/{file_id}/download", stream=True)
             
             if response.status_code == 200:
                 # 确保目录存在
@@ -377,7 +925,7 @@ class WXAuto:
                 
                 # 流式下载文件
                 with open(file_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+                    for chunk in response.iter_content(chunk_size=65536):
                         if chunk:
                             f.write(chunk)
                 
@@ -416,6 +964,89 @@ class WXAuto:
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
+    def download_bytes(self, file_id, spill_threshold=None, spill_dir=None):
+        """
+        Download file by file_id into memory
+
+        Downloads larger than spill_threshold are written to a temporary file
+        instead; the caller is then responsible for removing "file_path".
+
+        Args:
+            file_id (str): File ID to download
+            spill_threshold (int): Max bytes kept in memory, defaults to WXAUTO_SPILL_THRESHOLD
+            spill_dir (str): Directory for the spill file (optional)
+
+        Returns:
+            dict: {"success": True, "data": bytes, "file_size": n}, or with
+                  "data": None and "file_path" when spilled to disk
+        """
+        if spill_threshold is None:
+            spill_threshold = self._spill_threshold
+
+        spill_file = None
+        try:
+            response = self._request("download", "GET", f"/api/v1/files/{file_id}/download", stream=True)
+
+            if response.status_code == 200:
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if spill_file is None and size > spill_threshold:
+                        spill_file = tempfile.NamedTemporaryFile(prefix="wxauto_", dir=spill_dir, delete=False)
+                        for buffered in chunks:
+                            spill_file.write(buffered)
+                        chunks = []
+                    if spill_file is not None:
+                        spill_file.write(chunk)
+                    else:
+                        chunks.append(chunk)
+
+                if size == 0:
+                    error_msg = "Downloaded file is empty"
+                    logger.error(error_msg)
+                    return {"success": False, "error": error_msg}
+
+                if spill_file is not None:
+                    spill_file.close()
+                    logger.info(f"File downloaded to disk ({size} bytes > {spill_threshold}): {file_id} -> {spill_file.name}")
+                    return {"success": True, "data": None, "file_path": spill_file.name, "file_size": size}
+
+                logger.info(f"File downloaded into memory: {file_id}, {size} bytes")
+                return {"success": True, "data": b"".join(chunks), "file_size": size}
+
+            elif response.status_code == 404:
+                error_msg = f"File not found: {file_id}"
+                logger.error(error_msg)
+                return {"success": False, "error": error_msg}
+            else:
+                error_msg = f"Download file API request failed: {response.status_code} - {response.text}"
+                logger.error(error_msg)
+                return {"success": False, "error": error_msg}
+
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Network error during file download: {str(e)}"
+            logger.error(error_msg)
+            self._remove_spill_file(spill_file)
+            return {"success": False, "error": error_msg}
+        except Exception as e:
+            error_msg = f"Unexpected error during file download: {str(e)}"
+            logger.error(error_msg)
+            self._remove_spill_file(spill_file)
+            return {"success": False, "error": error_msg}
+
+    @staticmethod
+    def _remove_spill_file(spill_file):
+        if spill_file is None:
+            return
+        try:
+            spill_file.close()
+            os.remove(spill_file.name)
+        except OSError:
+            pass
+
     def is_online(self, wxname="") -> Dict[str, Any]:
         """
         Check if WeChat is online (wxautox specific)
@@ -427,19 +1058,11 @@ class WXAuto:
             dict: Online status result
         """
         try:
-            url = f"{self._api_url}/v1/wechat/isonline"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._request("isonline", "POST", "/v1/wechat/isonline", json=payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -479,19 +1102,11 @@ class WXAuto:
             dict: Login operation result
         """
         try:
-            url = f"{self._api_url}/v1/wechat/login"
-            
-            headers = {
-                'accept': 'application/json',
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._request("login", "POST", "/v1/wechat/login", json=payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -526,19 +1141,13 @@ class WXAuto:
             dict: QR code operation result with base64 image data
         """
         try:
-            url = f"{self._api_url}/v1/wechat/qrcode"
-            
-            headers = {
-                'accept': 'image/png',  # 期望接收图片
-                'Authorization': f'Bearer {self._token}',
-                'Content-Type': 'application/json'
-            }
-            
             payload = {
                 "wxname": wxname
             }
             
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            # 期望接收图片
+            response = self._request("qrcode", "POST", "/v1/wechat/qrcode", json=payload,
+                                     headers={'accept': 'image/png'})
             
             if response.status_code == 200:
                 # 直接获取图片二进制数据
@@ -67,7 +67,7 @@ class ZhixueAPI:
 
         # 发送POST请求
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = requests.post(url, headers=headers, data=data, timeout=10)
             
             # 输出响应信息
             logging.info(f"状态码: {response.status_code}")
@@ -124,7 +124,7 @@ class ZhixueAPI:
         }
         
         try:
-            response = requests.post(url, headers=headers, data=data)
+            response = requests.post(url, headers=headers, data=data, timeout=10)
             
             # 输出响应信息
             logging.info(f"状态码: {response.status_code}")
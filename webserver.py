@@ -1,13 +1,18 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from config import ConfigManager
 from env import EnvConfig
 from webapi.wxauto import WXAuto
 import os
+import hmac
+import time
+import asyncio
+import functools
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -29,12 +34,78 @@ class UpdateRemindersRequest(BaseModel):
     minute: Optional[int] = None
     enabled: Optional[bool] = None
 
+class CachedCall:
+    """
+    带 TTL 的单飞（single-flight）缓存，只在事件循环线程中使用
+
+    缓存过期后第一个请求发起刷新，刷新期间到达的请求等待同一个结果，
+    同一时间最多只有一个调用在执行。失败的结果按 error_ttl 缓存，避免 wxauto
+    不可用时每个请求都去等超时。
+    """
+
+    def __init__(self, func: Callable[[], Any], run: Callable, ttl: float, error_ttl: float = 2.0):
+        """
+        Args:
+            func: 阻塞的调用，返回 {"success": bool, ...}
+            run: 把阻塞调用放到线程池执行的协程函数
+            ttl (float): 成功结果的缓存秒数
+            error_ttl (float): 失败结果的缓存秒数
+        """
+        self._func = func
+        self._run = run
+        self._ttl = ttl
+        self._error_ttl = error_ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._inflight = None
+
+    def invalidate(self):
+        """丢弃缓存，下一次请求重新调用"""
+        self._expires_at = 0.0
+
+    async def get(self) -> Any:
+        if self._value is not None and time.monotonic() < self._expires_at:
+            return self._value
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+        # shield: 某个请求被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self) -> Any:
+        try:
+            value = await self._run(self._func)
+            ttl = self._ttl if isinstance(value, dict) and value.get("success") else self._error_ttl
+            self._value = value
+            self._expires_at = time.monotonic() + ttl
+            return value
+        finally:
+            self._inflight = None
+
 class WebServer:
-    def __init__(self, wxauto_client, detector_loop, env_file=".env"):
+    def __init__(self, wxauto_client, detector_loop, env_file=".env", main_loop=None,
+                 max_workers: int = 4, max_pending: int = 32, status_ttl: float = 5.0, qrcode_ttl: float = 10.0):
+        """
+        Args:
+            max_workers (int): 执行阻塞调用（wxauto、数据库）的线程数
+            max_pending (int): 最多同时排队和执行的阻塞调用数，超过后返回 503
+            status_ttl (float): 微信在线状态的缓存秒数
+            qrcode_ttl (float): 登录二维码的缓存秒数
+        """
         self.wxauto_client = wxauto_client
         self.detector_loop = detector_loop
+        self.main_loop = main_loop
         self._config = EnvConfig(env_file)
         self._env_file = env_file
+        self._ingest_api_key = self._config.get_ingest_config().get('api_key')
+        # 所有接口共用一个 ConfigManager，不再每个请求打开一个新的数据库连接
+        self._config_manager = ConfigManager(env_file)
+        # 阻塞调用都放到有界线程池中执行，慢的 wxauto 调用不会卡住事件循环
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="WebWorker")
+        self._max_pending = max_pending
+        self._pending = 0
+        self._status_cache = CachedCall(self.wxauto_client.is_online, self._run_blocking, status_ttl)
+        self._qrcode_cache = CachedCall(self.wxauto_client.get_qrcode, self._run_blocking, qrcode_ttl)
         self._app = FastAPI()
         self._server = None
         self._setup_routes()
@@ -78,6 +149,17 @@ class WebServer:
         else:
             print(f"警告: 前端构建目录不存在: {frontend_dist_path}")
 
+    async def _run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行阻塞调用，排队的调用过多时返回 503"""
+        if self._pending >= self._max_pending:
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
     @property
     def app(self):
         """提供对 FastAPI 应用的访问"""
@@ -89,7 +171,7 @@ class WebServer:
         ## 微信状态
         @self._app.get("/api/wechat_status")
         async def get_wechat_status():
-            result = self.wxauto_client.is_online()
+            result = await self._status_cache.get()
             if result["success"]:
                 return {
                     "status": "success",
@@ -103,7 +185,10 @@ class WebServer:
 
         @self._app.post("/api/wechat_login")
         async def get_wechat_status():
-            result = self.wxauto_client.login()
+            result = await self._run_blocking(self.wxauto_client.login)
+            # 登录状态和二维码都可能变化
+            self._status_cache.invalidate()
+            self._qrcode_cache.invalidate()
             if result["success"]:
                 return {
                     "status": "success",
@@ -117,7 +202,7 @@ class WebServer:
 
         @self._app.get("/api/wechat_qrcode")
         async def get_wechat_qrcode():
-            result = self.wxauto_client.get_qrcode()
+            result = await self._qrcode_cache.get()
             if result["success"]:
                 return {
                     "status": "success",
@@ -132,12 +217,12 @@ class WebServer:
         ## 处理器
         @self._app.get("/api/processors")
         async def list_processors():
-            return ConfigManager(self._env_file).get_all_processors()
+            return await self._run_blocking(self._config_manager.get_all_processors)
 
         ## 聊天列表对应的处理器
         @self._app.get("/api/chatname_processors")
         async def list_chatname_processors():
-            return ConfigManager(self._env_file).get_all_chatname_processors()
+            return await self._run_blocking(self._config_manager.get_all_chatname_processors)
 
         @self._app.post("/api/chatname_processors")
         async def add_chatname_processor(request: dict):
@@ -149,7 +234,7 @@ class WebServer:
                     "message": "chat_name 不能为空"
                 }
 
-            success, message = ConfigManager(self._env_file).add_chatname(chat_name)
+            success, message = await self._run_blocking(self._config_manager.add_chatname, chat_name)
             
             if success:
                 return {
@@ -165,7 +250,8 @@ class WebServer:
         @self._app.put("/api/chatname_processors/{chat_name}")
         async def update_chatname_processor(chat_name: str, request: dict):
             """更新 chatname_processor"""
-            success, message = ConfigManager(self._env_file).update_chatname(chat_name, request.get('processors', []))
+            success, message = await self._run_blocking(self._config_manager.update_chatname, chat_name,
+                                                         request.get('processors', []))
             
             if success:
                 return {
@@ -182,7 +268,7 @@ class WebServer:
         @self._app.delete("/api/chatname_processors/{chat_name}")
         async def delete_chatname_processor(chat_name: str):
             """删除 chatname_processor"""
-            success, message = ConfigManager(self._env_file).del_chatname(chat_name)
+            success, message = await self._run_blocking(self._config_manager.del_chatname, chat_name)
             
             if success:
                 return {
@@ -199,7 +285,7 @@ class WebServer:
         @self._app.get("/api/reminders")
         async def list_reminders():
             """获取所有提醒"""
-            reminders = ConfigManager(self._env_file).get_all_reminders()
+            reminders = await self._run_blocking(self._config_manager.get_all_reminders)
             print(reminders)
             return {
                 "status": "success",
@@ -209,7 +295,7 @@ class WebServer:
         @self._app.post("/api/reminders")
         async def add_reminder(request: dict):
             """添加提醒"""
-            success, message = ConfigManager(self._env_file).add_reminder(request)
+            success, message = await self._run_blocking(self._config_manager.add_reminder, request)
             if success:
                 return {
                     "status": "success",
@@ -224,7 +310,7 @@ class WebServer:
         @self._app.put("/api/reminders/{reminder_id}")
         async def update_reminder(reminder_id: int, request: dict):
             """更新提醒"""
-            success, message = ConfigManager(self._env_file).update_reminder(reminder_id, request)
+            success, message = await self._run_blocking(self._config_manager.update_reminder, reminder_id, request)
             if success:
                 return {
                     "status": "success",
@@ -239,7 +325,7 @@ class WebServer:
         @self._app.delete("/api/reminders/{reminder_id}")
         async def delete_reminder(reminder_id: int):
             """删除提醒"""
-            success, message = ConfigManager(self._env_file).delete_reminder(reminder_id)
+            success, message = await self._run_blocking(self._config_manager.delete_reminder, reminder_id)
             
             if success:
                 return {
@@ -259,6 +345,61 @@ class WebServer:
             return {
                 "status": "success",
             }
+
+        ## 消息推送入口
+        @self._app.post("/api/ingest")
+        async def ingest_message(request: dict, authorization: Optional[str] = Header(None)):
+            """接收 wxauto 端推送的消息批次，结构与 get_next_new_message 返回值相同"""
+            # 常量时间比较，按字节比较避免非 ASCII 的请求头抛出异常
+            if not self._ingest_api_key or not hmac.compare_digest(
+                    (authorization or "").encode(), f"Bearer {self._ingest_api_key}".encode()):
+                raise HTTPException(status_code=401, detail="未授权")
+
+            if not self.main_loop:
+                return {
+                    "status": "failed",
+                    "message": "主循环未启动"
+                }
+
+            if not request.get("chat_name") or not isinstance(request.get("messages"), list):
+                return {
+                    "status": "failed",
+                    "message": "chat_name 和 messages 不能为空"
+                }
+
+            message_batch = dict(request)
+            message_batch.setdefault("success", True)
+            message_batch.setdefault("has_message", bool(request["messages"]))
+
+            # 队列满时不等待，由推送端稍后重试，避免阻塞事件循环
+            result = await self._run_blocking(self.main_loop.ingestor.ingest, message_batch, source="push", timeout=0)
+            if result["accepted"] + result["duplicates"] < len(request["messages"]):
+                raise HTTPException(status_code=429, detail="消息队列已满，请稍后重试")
+
+            return {
+                "status": "success",
+                "data": result
+            }
+
+        ## 运行指标
+        @self._app.get("/api/metrics")
+        async def get_metrics():
+            """获取主循环运行指标"""
+            if not self.main_loop:
+                return {
+                    "status": "failed",
+                    "message": "主循环未启动"
+                }
+            def collect():
+                metrics = self.main_loop.get_metrics()
+                if self.detector_loop:
+                    metrics["detectors"] = self.detector_loop.get_metrics()
+                return metrics
+
+            return {
+                "status": "success",
+                "data": await self._run_blocking(collect)
+            }
             
     async def start(self):
         """异步启动服务器"""